@@ -0,0 +1,211 @@
+"""Measures the decoding throughput and latency of catalog models with random
+weights and synthetic vocabularies.
+
+Each model runs in a separate process on CPU. For each beam width and source
+length, the prediction graph is built once and the decoding of each batch size
+is timed over several runs. The maximum decoding length is set to the source
+length so that the amount of work scales with it.
+
+Example:
+
+  python benchmarks/decoding_throughput.py --models NMTSmall Transformer \\
+      --beam_widths 1 4 --batch_sizes 1 16 --lengths 20 50 \\
+      --json_output decoding.json
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import six
+
+
+_MODELS = ["NMTSmall", "NMTMedium", "NMTBig", "Transformer", "TransformerBig"]
+
+
+def _write_vocabulary(path, size):
+  from opennmt import constants
+  with open(path, "w") as vocab_file:
+    for token in (constants.PADDING_TOKEN,
+                  constants.START_OF_SENTENCE_TOKEN,
+                  constants.END_OF_SENTENCE_TOKEN):
+      vocab_file.write("%s\n" % token)
+    for i in range(size):
+      vocab_file.write("w%d\n" % i)
+
+def _decoded_tokens(predictions):
+  length = np.asarray(predictions["length"])
+  if length.ndim > 1:
+    length = length[:, 0]  # Only count the best hypothesis.
+  return int(np.sum(length))
+
+def _time_decoding(args, model_name, beam_width, length, vocabulary, metadata):
+  import tensorflow as tf
+  from opennmt.config import load_model_from_catalog
+
+  results = []
+  graph = tf.Graph()
+  with graph.as_default():
+    tf.set_random_seed(1234)
+    model = load_model_from_catalog(model_name)
+    receiver = model.serving_input_fn(metadata)()
+    params = {
+        "beam_width": beam_width,
+        "maximum_iterations": length
+    }
+    spec = model.model_fn()(
+        receiver.features, None, params, tf.estimator.ModeKeys.PREDICT, None)
+    predictions = spec.predictions
+    initializers = [
+        tf.global_variables_initializer(),
+        tf.local_variables_initializer(),
+        tf.tables_initializer()]
+
+  session_config = tf.ConfigProto(
+      device_count={"GPU": 0},
+      intra_op_parallelism_threads=args.intra_op_threads,
+      inter_op_parallelism_threads=args.inter_op_threads)
+  with tf.Session(graph=graph, config=session_config) as sess:
+    sess.run(initializers)
+    for batch_size in args.batch_sizes:
+      tokens = np.random.choice(vocabulary, size=(batch_size, length))
+      feed_dict = {
+          receiver.receiver_tensors["tokens"]: tokens,
+          receiver.receiver_tensors["length"]: np.full([batch_size], length, dtype=np.int32)
+      }
+      for _ in range(args.warmup_steps):
+        sess.run(predictions, feed_dict=feed_dict)
+      latencies = []
+      num_tokens = 0
+      for _ in range(args.steps):
+        start = time.time()
+        outputs = sess.run(predictions, feed_dict=feed_dict)
+        latencies.append(time.time() - start)
+        num_tokens += _decoded_tokens(outputs)
+      latencies_ms = np.array(latencies) * 1000.0
+      results.append({
+          "model": model_name,
+          "beam_width": beam_width,
+          "length": length,
+          "batch_size": batch_size,
+          "tokens_per_sec": num_tokens / sum(latencies),
+          "sentences_per_sec": batch_size * args.steps / sum(latencies),
+          "latency_ms": {
+              "mean": float(np.mean(latencies_ms)),
+              "p50": float(np.percentile(latencies_ms, 50)),
+              "p90": float(np.percentile(latencies_ms, 90)),
+              "p99": float(np.percentile(latencies_ms, 99))
+          }
+      })
+  return results
+
+def _run(args, model_name, queue):
+  np.random.seed(1234)
+  vocab_dir = tempfile.mkdtemp()
+  try:
+    vocab_path = os.path.join(vocab_dir, "vocab.txt")
+    _write_vocabulary(vocab_path, args.vocab_size)
+    metadata = {
+        "source_words_vocabulary": vocab_path,
+        "target_words_vocabulary": vocab_path
+    }
+    vocabulary = ["w%d" % i for i in range(args.vocab_size)]
+    results = []
+    for beam_width in args.beam_widths:
+      for length in args.lengths:
+        results.extend(_time_decoding(
+            args, model_name, beam_width, length, vocabulary, metadata))
+  finally:
+    shutil.rmtree(vocab_dir)
+  queue.put(results)
+
+def _wait_for_results(process, queue):
+  """Returns the results of :obj:`process` or ``None`` if it exited without
+  sending them (e.g. it crashed)."""
+  while True:
+    try:
+      return queue.get(timeout=1)
+    except six.moves.queue.Empty:
+      if not process.is_alive():
+        break
+  # The results could be sent just before the process exited.
+  try:
+    return queue.get(timeout=1)
+  except six.moves.queue.Empty:
+    return None
+
+
+def main():
+  parser = argparse.ArgumentParser(
+      description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--models", nargs="+", default=["NMTSmall", "Transformer"],
+                      choices=_MODELS,
+                      help="Catalog models to benchmark.")
+  parser.add_argument("--beam_widths", nargs="+", type=int, default=[1, 4],
+                      help="Beam widths to benchmark (1 for greedy decoding).")
+  parser.add_argument("--batch_sizes", nargs="+", type=int, default=[1, 8, 32],
+                      help="Number of sentences per batch.")
+  parser.add_argument("--lengths", nargs="+", type=int, default=[20, 50],
+                      help="Source lengths, also used as maximum decoding lengths.")
+  parser.add_argument("--vocab_size", type=int, default=8000,
+                      help="Size of the synthetic source and target vocabularies.")
+  parser.add_argument("--steps", type=int, default=20,
+                      help="Number of timed decoding runs per configuration.")
+  parser.add_argument("--warmup_steps", type=int, default=2,
+                      help="Number of decoding runs before timing.")
+  parser.add_argument("--intra_op_threads", type=int, default=0,
+                      help="Number of threads used within an operation (0 to let "
+                           "TensorFlow decide).")
+  parser.add_argument("--inter_op_threads", type=int, default=0,
+                      help="Number of operations to run in parallel (0 to let "
+                           "TensorFlow decide).")
+  parser.add_argument("--json_output", default=None,
+                      help="If set, also write the results to this JSON file.")
+  args = parser.parse_args()
+
+  results = []
+  failures = []
+  for model_name in args.models:
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_run, args=(args, model_name, queue))
+    process.start()
+    model_results = _wait_for_results(process, queue)
+    process.join()
+    if model_results is None:
+      print("The benchmark of {} failed with exit code {}".format(model_name, process.exitcode),
+            file=sys.stderr)
+      failures.append(model_name)
+    else:
+      results.extend(model_results)
+
+  print("{:>15} {:>5} {:>7} {:>6} {:>11} {:>9} {:>9} {:>9}".format(
+      "model", "beam", "length", "batch", "tokens/sec", "p50 (ms)", "p90 (ms)", "p99 (ms)"))
+  for result in results:
+    print("{:>15} {:>5d} {:>7d} {:>6d} {:>11.1f} {:>9.1f} {:>9.1f} {:>9.1f}".format(
+        result["model"],
+        result["beam_width"],
+        result["length"],
+        result["batch_size"],
+        result["tokens_per_sec"],
+        result["latency_ms"]["p50"],
+        result["latency_ms"]["p90"],
+        result["latency_ms"]["p99"]))
+
+  if args.json_output:
+    with open(args.json_output, "w") as json_file:
+      json.dump({"config": vars(args), "results": results}, json_file, indent=2)
+
+  if failures:
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,203 @@
+"""Measures the throughput of the training input pipeline on a generated
+parallel corpus, without building the model.
+
+The benchmark sweeps over all combinations of the given values and reports
+the number of examples and tokens (source and target) produced per second by
+``Model.input_fn``. A bucket width of 0 disables bucketing, which is only
+benchmarked with the "examples" batch type.
+
+Example:
+
+  python benchmarks/input_pipeline.py --num_threads 1 4 8 \\
+      --prefetch_buffer_size 0 1 --bucket_width 0 5 \\
+      --tokenizers SpaceTokenizer CharacterTokenizer --json_output input.json
+"""
+
+from __future__ import print_function
+
+import argparse
+import itertools
+import json
+import os
+import shutil
+import string
+import tempfile
+import time
+
+import numpy as np
+import tensorflow as tf
+
+import opennmt as onmt
+
+
+def _generate_corpus(directory, num_examples, vocab_size, max_length):
+  """Writes a random parallel corpus and its vocabulary."""
+  letters = np.array(list(string.ascii_lowercase))
+  words = set()
+  while len(words) < vocab_size:
+    words.add("".join(np.random.choice(letters, size=np.random.randint(2, 10))))
+  words = sorted(words)
+
+  # Sentence lengths and word frequencies roughly follow the shape of real data.
+  frequencies = 1.0 / np.arange(1, vocab_size + 1)
+  frequencies /= np.sum(frequencies)
+  paths = {}
+  for side in ("source", "target"):
+    lengths = np.clip(
+        np.random.lognormal(mean=3.0, sigma=0.5, size=num_examples).astype(np.int64),
+        1, max_length)
+    ids = np.random.choice(vocab_size, size=np.sum(lengths), p=frequencies)
+    path = os.path.join(directory, "%s.txt" % side)
+    with open(path, "w") as corpus_file:
+      for sentence_ids in np.split(ids, np.cumsum(lengths)[:-1]):
+        corpus_file.write("%s\n" % " ".join(words[i] for i in sentence_ids))
+    paths[side] = path
+
+  # Include the letters so that the character tokenization is also in vocabulary.
+  paths["vocabulary"] = os.path.join(directory, "vocab.txt")
+  with open(paths["vocabulary"], "w") as vocab_file:
+    for token in [onmt.constants.PADDING_TOKEN,
+                  onmt.constants.START_OF_SENTENCE_TOKEN,
+                  onmt.constants.END_OF_SENTENCE_TOKEN] + list(letters) + words:
+      vocab_file.write("%s\n" % token)
+  return paths
+
+def _build_model(tokenizer_name):
+  source_inputter = onmt.inputters.WordEmbedder(
+      vocabulary_file_key="source_words_vocabulary",
+      embedding_size=32,
+      tokenizer=getattr(onmt.tokenizers, tokenizer_name)())
+  target_inputter = onmt.inputters.WordEmbedder(
+      vocabulary_file_key="target_words_vocabulary",
+      embedding_size=32,
+      tokenizer=getattr(onmt.tokenizers, tokenizer_name)())
+  # The encoder and the decoder are not used by the input pipeline.
+  return onmt.models.SequenceToSequence(source_inputter, target_inputter, None, None)
+
+def _run(args, paths, setting):
+  batch_size = args.batch_size if setting["batch_type"] == "examples" else args.tokens_batch_size
+  graph = tf.Graph()
+  with graph.as_default():
+    tf.set_random_seed(1234)
+    model = _build_model(setting["tokenizer"])
+    features, labels = model.input_fn(
+        tf.estimator.ModeKeys.TRAIN,
+        batch_size,
+        {"source_words_vocabulary": paths["vocabulary"],
+         "target_words_vocabulary": paths["vocabulary"]},
+        paths["source"],
+        labels_file=paths["target"],
+        batch_type=setting["batch_type"],
+        bucket_width=setting["bucket_width"] or None,
+        num_threads=setting["num_threads"],
+        sample_buffer_size=setting["sample_buffer_size"],
+        prefetch_buffer_size=setting["prefetch_buffer_size"],
+        maximum_features_length=args.maximum_length,
+        maximum_labels_length=args.maximum_length)()
+    num_examples = tf.shape(features["length"])[0]
+    num_tokens = tf.reduce_sum(features["length"]) + tf.reduce_sum(labels["length"])
+    initializers = [tf.tables_initializer()]
+
+  session_config = tf.ConfigProto(device_count={"GPU": 0})
+  with tf.Session(graph=graph, config=session_config) as sess:
+    sess.run(initializers)
+    for _ in range(args.warmup_steps):
+      sess.run(num_examples)
+    total_examples = 0
+    total_tokens = 0
+    start = time.time()
+    for _ in range(args.steps):
+      examples, tokens = sess.run([num_examples, num_tokens])
+      total_examples += examples
+      total_tokens += tokens
+    elapsed = time.time() - start
+
+  result = dict(setting)
+  result.update({
+      "batch_size": batch_size,
+      "examples_per_sec": float(total_examples) / elapsed,
+      "tokens_per_sec": float(total_tokens) / elapsed
+  })
+  return result
+
+
+def main():
+  parser = argparse.ArgumentParser(
+      description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--num_threads", nargs="+", type=int, default=[1, 4],
+                      help="Number of examples processed in parallel.")
+  parser.add_argument("--prefetch_buffer_size", nargs="+", type=int, default=[0, 1],
+                      help="Number of batches to prefetch.")
+  parser.add_argument("--bucket_width", nargs="+", type=int, default=[0, 1, 5],
+                      help="Length bucket widths (0 to disable bucketing).")
+  parser.add_argument("--batch_type", nargs="+", default=["examples", "tokens"],
+                      choices=["examples", "tokens"],
+                      help="Batching strategies.")
+  parser.add_argument("--tokenizers", nargs="+", default=["SpaceTokenizer"],
+                      help="Tokenizer class names from opennmt.tokenizers.")
+  parser.add_argument("--sample_buffer_size", nargs="+", type=int, default=[0, 10000],
+                      help="Shuffle buffer sizes (0 to disable shuffling, -1 for the "
+                           "full corpus).")
+  parser.add_argument("--batch_size", type=int, default=64,
+                      help="Batch size for the \"examples\" batch type.")
+  parser.add_argument("--tokens_batch_size", type=int, default=3072,
+                      help="Batch size for the \"tokens\" batch type.")
+  parser.add_argument("--num_examples", type=int, default=100000,
+                      help="Number of generated parallel sentences.")
+  parser.add_argument("--vocab_size", type=int, default=30000,
+                      help="Number of generated words.")
+  parser.add_argument("--maximum_length", type=int, default=None,
+                      help="If set, filter out examples longer than this number of "
+                           "tokens.")
+  parser.add_argument("--steps", type=int, default=200,
+                      help="Number of timed batches per setting.")
+  parser.add_argument("--warmup_steps", type=int, default=20,
+                      help="Number of batches to produce before timing.")
+  parser.add_argument("--json_output", default=None,
+                      help="If set, also write the results to this JSON file.")
+  args = parser.parse_args()
+
+  for tokenizer_name in args.tokenizers:
+    if not hasattr(onmt.tokenizers, tokenizer_name):
+      parser.error("Unknown or unavailable tokenizer: {}".format(tokenizer_name))
+
+  tf.logging.set_verbosity(tf.logging.WARN)
+  np.random.seed(1234)
+  corpus_dir = tempfile.mkdtemp()
+  try:
+    paths = _generate_corpus(corpus_dir, args.num_examples, args.vocab_size, 200)
+    keys = ["tokenizer", "batch_type", "bucket_width", "num_threads",
+            "prefetch_buffer_size", "sample_buffer_size"]
+    values = itertools.product(
+        args.tokenizers, args.batch_type, args.bucket_width, args.num_threads,
+        args.prefetch_buffer_size, args.sample_buffer_size)
+    results = []
+    for setting_values in values:
+      setting = dict(zip(keys, setting_values))
+      if setting["batch_type"] == "tokens" and not setting["bucket_width"]:
+        continue  # Token batches are only formed when bucketing is enabled.
+      results.append(_run(args, paths, setting))
+  finally:
+    shutil.rmtree(corpus_dir)
+
+  print("{:>20} {:>8} {:>6} {:>7} {:>8} {:>8} {:>13} {:>11}".format(
+      "tokenizer", "batch", "bucket", "threads", "prefetch", "shuffle",
+      "examples/sec", "tokens/sec"))
+  for result in results:
+    print("{:>20} {:>8} {:>6d} {:>7d} {:>8d} {:>8d} {:>13.1f} {:>11.1f}".format(
+        result["tokenizer"],
+        result["batch_type"],
+        result["bucket_width"],
+        result["num_threads"],
+        result["prefetch_buffer_size"],
+        result["sample_buffer_size"],
+        result["examples_per_sec"],
+        result["tokens_per_sec"]))
+
+  if args.json_output:
+    with open(args.json_output, "w") as json_file:
+      json.dump({"config": vars(args), "results": results}, json_file, indent=2)
+
+
+if __name__ == "__main__":
+  main()
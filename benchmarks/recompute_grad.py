@@ -0,0 +1,135 @@
+"""Compares the training step time and the peak memory usage of a
+self-attention encoder with and without activations recomputation.
+
+Each configuration runs in a separate process on CPU so that the reported
+peak resident set size is not shared between configurations.
+
+Example:
+
+  python benchmarks/recompute_grad.py --num_layers 12 --batch_size 32
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import multiprocessing
+import resource
+import sys
+import time
+
+import numpy as np
+import six
+
+
+def _peak_memory_mb():
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  if sys.platform == "darwin":
+    return peak / (1024.0 * 1024.0)  # Bytes on macOS.
+  return peak / 1024.0  # Kilobytes on Linux.
+
+
+def _run(args, recompute_activations, queue):
+  import tensorflow as tf
+  from opennmt.encoders.self_attention_encoder import SelfAttentionEncoder
+
+  tf.set_random_seed(1234)
+  inputs = tf.constant(
+      np.random.randn(
+          args.batch_size, args.length, args.num_units).astype(np.float32))
+  sequence_length = tf.fill([args.batch_size], args.length)
+
+  encoder = SelfAttentionEncoder(
+      args.num_layers,
+      num_units=args.num_units,
+      num_heads=args.num_heads,
+      ffn_inner_dim=args.ffn_inner_dim,
+      recompute_activations=recompute_activations)
+  outputs, _, _ = encoder.encode(
+      inputs, sequence_length=sequence_length, mode=tf.estimator.ModeKeys.TRAIN)
+  loss = tf.reduce_mean(tf.square(outputs))
+  train_op = tf.train.GradientDescentOptimizer(0.1).minimize(loss)
+
+  session_config = tf.ConfigProto(device_count={"GPU": 0})
+  with tf.Session(config=session_config) as sess:
+    sess.run(tf.global_variables_initializer())
+    for _ in range(args.warmup_steps):
+      sess.run(train_op)
+    start = time.time()
+    for _ in range(args.steps):
+      sess.run(train_op)
+    step_time = (time.time() - start) / args.steps
+
+  queue.put({
+      "recompute_activations": recompute_activations,
+      "step_time_sec": step_time,
+      "peak_memory_mb": _peak_memory_mb()
+  })
+
+
+def _wait_for_result(process, queue):
+  """Returns the result of :obj:`process` or ``None`` if it exited without
+  sending it (e.g. it ran out of memory)."""
+  while True:
+    try:
+      return queue.get(timeout=1)
+    except six.moves.queue.Empty:
+      if not process.is_alive():
+        break
+  # The result could be sent just before the process exited.
+  try:
+    return queue.get(timeout=1)
+  except six.moves.queue.Empty:
+    return None
+
+def main():
+  parser = argparse.ArgumentParser(
+      description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--num_layers", type=int, default=6,
+                      help="Number of encoder layers.")
+  parser.add_argument("--num_units", type=int, default=512,
+                      help="Number of hidden units.")
+  parser.add_argument("--num_heads", type=int, default=8,
+                      help="Number of attention heads.")
+  parser.add_argument("--ffn_inner_dim", type=int, default=2048,
+                      help="Inner dimension of the feed forward layers.")
+  parser.add_argument("--batch_size", type=int, default=16,
+                      help="Number of sequences per batch.")
+  parser.add_argument("--length", type=int, default=64,
+                      help="Length of the sequences.")
+  parser.add_argument("--steps", type=int, default=10,
+                      help="Number of timed training steps.")
+  parser.add_argument("--warmup_steps", type=int, default=2,
+                      help="Number of training steps to run before timing.")
+  parser.add_argument("--json_output", default=None,
+                      help="If set, also write the results to this JSON file.")
+  args = parser.parse_args()
+
+  results = []
+  for recompute_activations in (False, True):
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=_run, args=(args, recompute_activations, queue))
+    process.start()
+    result = _wait_for_result(process, queue)
+    process.join()
+    if result is None:
+      print("The configuration recompute_activations={} failed with exit code {}".format(
+          recompute_activations, process.exitcode), file=sys.stderr)
+      continue
+    results.append(result)
+
+  print("{:>10} {:>15} {:>16}".format("recompute", "step time (s)", "peak memory (MB)"))
+  for result in results:
+    print("{:>10} {:>15.4f} {:>16.1f}".format(
+        str(result["recompute_activations"]),
+        result["step_time_sec"],
+        result["peak_memory_mb"]))
+
+  if args.json_output:
+    with open(args.json_output, "w") as json_file:
+      json.dump({"config": vars(args), "results": results}, json_file, indent=2)
+
+
+if __name__ == "__main__":
+  main()
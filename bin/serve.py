@@ -0,0 +1,3 @@
+if __name__ == "__main__":
+  from opennmt.bin import serve
+  serve.main()
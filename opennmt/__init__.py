@@ -8,3 +8,4 @@ from opennmt import models
 from opennmt import tokenizers
 
 from opennmt.runner import Runner
+from opennmt.translator import Translator
@@ -20,10 +20,10 @@
 
 import os
 import argparse
-import six
 
 import tensorflow as tf
-import numpy as np
+
+from opennmt.utils import checkpoint
 
 
 def main():
@@ -36,51 +36,43 @@ def main():
                       help="The output directory where the averaged checkpoint will be saved.")
   parser.add_argument("--max_count", type=int, default=8,
                       help="The maximal number of checkpoints to average.")
+  parser.add_argument("--min_step", type=int, default=None,
+                      help="Ignore checkpoints saved before this step.")
+  parser.add_argument("--max_step", type=int, default=None,
+                      help="Ignore checkpoints saved after this step.")
+  parser.add_argument("--weights", type=float, nargs="+", default=None,
+                      help="The weight of each checkpoint, from the oldest to the latest.")
+  parser.add_argument("--ema_decay", type=float, default=None,
+                      help="If set, compute an exponential moving average of the checkpoints "
+                           "with this decay instead of a uniform average.")
   args = parser.parse_args()
 
   if args.model_dir == args.output_dir:
     raise ValueError("Model and output directory must be different")
-
-  checkpoints_path = tf.train.get_checkpoint_state(args.model_dir).all_model_checkpoint_paths
-  if len(checkpoints_path) > args.max_count:
-    checkpoints_path = checkpoints_path[-args.max_count:]
+  if args.weights is not None and args.ema_decay is not None:
+    raise ValueError("--weights and --ema_decay are mutually exclusive")
+
+  checkpoints_path = checkpoint.select_checkpoints(
+      args.model_dir,
+      max_count=args.max_count,
+      min_step=args.min_step,
+      max_step=args.max_step)
   num_checkpoints = len(checkpoints_path)
 
-  tf.logging.info("Averaging %d checkpoints..." % num_checkpoints)
-  tf.logging.info("Listing variables...")
-
-  var_list = tf.train.list_variables(checkpoints_path[0])
-  avg_values = {}
-  for name, shape in var_list:
-    if not name.startswith("global_step"):
-      avg_values[name] = np.zeros(shape)
+  weights = args.weights
+  if args.ema_decay is not None:
+    weights = checkpoint.exponential_weights(num_checkpoints, args.ema_decay)
 
+  tf.logging.info("Averaging %d checkpoints..." % num_checkpoints)
   for checkpoint_path in checkpoints_path:
-    tf.logging.info("Loading checkpoint %s" % checkpoint_path)
-    reader = tf.train.load_checkpoint(checkpoint_path)
-    for name in avg_values:
-      avg_values[name] += reader.get_tensor(name) / num_checkpoints
-
-  tf_vars = []
-  for name, value in six.iteritems(avg_values):
-    tf_vars.append(tf.get_variable(name, shape=value.shape))
-  placeholders = [tf.placeholder(v.dtype, shape=v.shape) for v in tf_vars]
-  assign_ops = [tf.assign(v, p) for (v, p) in zip(tf_vars, placeholders)]
+    tf.logging.info("  %s" % checkpoint_path)
 
-  latest_step = int(checkpoints_path[-1].split("-")[-1])
+  latest_step = checkpoint.get_checkpoint_step(checkpoints_path[-1])
   out_base_file = os.path.join(args.output_dir, "model.ckpt")
-  global_step = tf.get_variable(
-      "global_step",
-      initializer=tf.constant(latest_step, dtype=tf.int64),
-      trainable=False)
-  saver = tf.train.Saver(tf.global_variables())
-
-  with tf.Session() as sess:
-    sess.run(tf.global_variables_initializer())
-    for p, assign_op, (name, value) in zip(placeholders, assign_ops, six.iteritems(avg_values)):
-      sess.run(assign_op, {p: value})
-    tf.logging.info("Saving averaged checkpoint to %s-%d" % (out_base_file, latest_step))
-    saver.save(sess, out_base_file, global_step=global_step)
+  if latest_step is not None:
+    out_base_file = "%s-%d" % (out_base_file, latest_step)
+  tf.logging.info("Saving averaged checkpoint to %s" % out_base_file)
+  checkpoint.average_checkpoints(checkpoints_path, out_base_file, weights=weights)
 
 
 if __name__ == "__main__":
@@ -35,9 +35,20 @@ def _prefix_paths(prefix, paths):
     else:
       return path
 
+def _parse_memory_size(size):
+  """Converts a memory size such as ``512M`` or ``8G`` to bytes."""
+  units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+  size = size.strip().upper().rstrip("B")
+  if size and size[-1] in units:
+    return int(float(size[:-1]) * units[size[-1]])
+  return int(size)
+
 def main():
   parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-  parser.add_argument("run", choices=["train_and_eval", "train", "eval", "infer", "export"],
+  parser.add_argument("run",
+                      choices=["train_and_eval", "train", "eval", "continuous_eval",
+                               "infer", "export", "find_batch_size", "benchmark",
+                               "convert_checkpoint"],
                       help="Run type.")
   parser.add_argument("--config", required=True, nargs="+",
                       help="List of configuration files.")
@@ -50,15 +61,32 @@ def main():
   parser.add_argument("--data_dir", default="",
                       help="If set, data files are expected to be relative to this location.")
   parser.add_argument("--features_file", default=[], nargs="+",
-                      help="Run inference on this file.")
+                      help="Run inference on this file (use - to read from the standard input).")
   parser.add_argument("--predictions_file", default="",
                       help=("File used to save predictions. If not set, predictions are printed "
                             "on the standard output."))
-  parser.add_argument("--checkpoint_path", default=None,
-                      help=("Checkpoint or directory to use for inference or export "
-                            "(when a directory is set, the latest checkpoint is used)."))
+  parser.add_argument("--checkpoint_path", default=None, nargs="+",
+                      help=("Checkpoint or directory to use for inference, export, or conversion "
+                            "(when a directory is set, the latest checkpoint is used). "
+                            "Several checkpoints can be set for ensemble inference."))
   parser.add_argument("--num_gpus", type=int, default=1,
                       help="Number of GPUs to use for in-graph replication.")
+  parser.add_argument("--all_reduce", default=None, choices=["ring", "hierarchical"],
+                      help=("Sum the gradients of the replicas with this all-reduce algorithm "
+                            "instead of on the variables device. Without GPUs, --num_gpus "
+                            "CPU devices are used."))
+  parser.add_argument("--memory_budget", default=None,
+                      help=("For find_batch_size, the memory budget of the training steps, "
+                            "e.g. 512M or 8G."))
+  parser.add_argument("--optim_config", default=[], nargs="+",
+                      help=("For benchmark, configuration files of the optimizers to compare "
+                            "(e.g. config/optim/*.yml). If not set, the configured optimizer "
+                            "is benchmarked."))
+  parser.add_argument("--benchmark_steps", type=int, default=20,
+                      help="For benchmark, the number of timed training steps (at least 1).")
+  parser.add_argument("--output_dir", default=None,
+                      help=("For convert_checkpoint, the directory where the converted "
+                            "checkpoint will be saved."))
   parser.add_argument("--chief_host", default="",
                       help="hostname:port of the chief worker (for distributed training).")
   parser.add_argument("--worker_hosts", default="",
@@ -79,8 +107,18 @@ def main():
                       help="Random seed.")
   parser.add_argument("--gpu_allow_growth", default=False, action="store_true",
                       help="Allocate GPU memory dynamically.")
+  parser.add_argument("--cpu_only", default=False, action="store_true",
+                      help="Hide the GPUs (e.g. to evaluate next to the training).")
+  parser.add_argument("--eval_timeout", type=float, default=None,
+                      help=("For continuous_eval, stop when no new checkpoint is saved "
+                            "within this many seconds."))
   args = parser.parse_args()
 
+  if args.checkpoint_path is not None and len(args.checkpoint_path) == 1:
+    args.checkpoint_path = args.checkpoint_path[0]
+  elif args.checkpoint_path is not None and args.run != "infer":
+    parser.error("multiple checkpoints are only supported for inference.")
+
   tf.logging.set_verbosity(getattr(tf.logging, args.log_level))
 
   # Setup cluster if defined.
@@ -114,7 +152,9 @@ def main():
       config,
       seed=args.seed,
       num_devices=args.num_gpus,
-      gpu_allow_growth=args.gpu_allow_growth)
+      gpu_allow_growth=args.gpu_allow_growth,
+      cpu_only=args.cpu_only,
+      all_reduce=args.all_reduce)
 
   if args.run == "train_and_eval":
     runner.train_and_evaluate()
@@ -122,6 +162,8 @@ def main():
     runner.train()
   elif args.run == "eval":
     runner.evaluate(checkpoint_path=args.checkpoint_path)
+  elif args.run == "continuous_eval":
+    runner.continuous_evaluate(timeout=args.eval_timeout)
   elif args.run == "infer":
     if not args.features_file:
       parser.error("--features_file is required for inference.")
@@ -133,6 +175,27 @@ def main():
         checkpoint_path=args.checkpoint_path)
   elif args.run == "export":
     runner.export(checkpoint_path=args.checkpoint_path)
+  elif args.run == "find_batch_size":
+    if not args.memory_budget:
+      parser.error("--memory_budget is required to find the batch size.")
+    batch_size = runner.find_max_batch_size(_parse_memory_size(args.memory_budget))
+    if batch_size is None:
+      tf.logging.error("The smallest token batch size does not fit in the memory budget.")
+    else:
+      print(batch_size)
+  elif args.run == "benchmark":
+    optimizer_params = None
+    if args.optim_config:
+      optimizer_params = {
+          os.path.splitext(os.path.basename(path))[0]: load_config([path]).get("params", {})
+          for path in args.optim_config}
+    results = runner.benchmark(
+        num_steps=args.benchmark_steps, optimizer_params=optimizer_params)
+    print(json.dumps(results, indent=2))
+  elif args.run == "convert_checkpoint":
+    if not args.output_dir:
+      parser.error("--output_dir is required to convert a checkpoint.")
+    runner.convert_checkpoint(args.output_dir, checkpoint_path=args.checkpoint_path)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,59 @@
+"""Local HTTP translation server with dynamic batching."""
+
+import argparse
+
+import tensorflow as tf
+
+from opennmt.translator import Translator
+from opennmt.config import load_model, load_config
+from opennmt.utils.serving import DynamicBatcher, make_server
+
+
+def main():
+  parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument("--config", required=True, nargs="+",
+                      help="List of configuration files.")
+  parser.add_argument("--checkpoint_path", default=None,
+                      help=("Checkpoint or directory to serve (when a directory is set, "
+                            "the latest checkpoint is used)."))
+  parser.add_argument("--host", default="localhost",
+                      help="Host to bind.")
+  parser.add_argument("--port", type=int, default=5000,
+                      help="Port to bind.")
+  parser.add_argument("--max_batch_size", type=int, default=32,
+                      help="Maximum number of sentences in a batch.")
+  parser.add_argument("--max_latency", type=float, default=0.01,
+                      help="Maximum time in seconds a sentence waits to be batched.")
+  parser.add_argument("--bucket_width", type=int, default=10,
+                      help="Only batch together sentences with lengths in the same bucket.")
+  parser.add_argument("--log_level", default="INFO",
+                      choices=["DEBUG", "ERROR", "FATAL", "INFO", "WARN"],
+                      help="Logs verbosity.")
+  args = parser.parse_args()
+
+  tf.logging.set_verbosity(getattr(tf.logging, args.log_level))
+
+  config = load_config(args.config)
+  model = load_model(config["model_dir"])
+  translator = Translator(model, config, checkpoint_path=args.checkpoint_path)
+  batcher = DynamicBatcher(
+      translator.translate_batch,
+      max_batch_size=args.max_batch_size,
+      max_latency=args.max_latency,
+      bucket_width=args.bucket_width,
+      length_fn=lambda text: len(model.source_inputter.tokenizer.tokenize(text)))
+  server = make_server(batcher, host=args.host, port=args.port)
+
+  tf.logging.info("Serving on http://%s:%d/translate", args.host, server.server_address[1])
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    server.server_close()
+    batcher.stop()
+    translator.close()
+
+
+if __name__ == "__main__":
+  main()
@@ -5,7 +5,7 @@ import six
 
 import tensorflow as tf
 
-from opennmt.layers.common import embedding_lookup
+from opennmt.layers.common import embedding_lookup, Dense
 
 def logits_to_cum_log_probs(logits, sequence_length):
   """Returns the cumulated log probabilities of sequences.
@@ -49,7 +49,9 @@ def build_output_layer(num_units, vocab_size, dtype=None, reuse=False):
     num_units: The layer input depth.
     vocab_size: The layer output depth.
     dtype: The layer dtype.
-    reuse: If True reuse the embedding parameters
+    reuse: If ``True``, reuse the embedding matrix ``kernel`` of the current
+      variable scope as the projection weight (i.e. tie the target embeddings
+      and the output layer).
 
   Returns:
     A ``tf.layers.Dense`` instance.
@@ -60,13 +62,18 @@ def build_output_layer(num_units, vocab_size, dtype=None, reuse=False):
   if vocab_size is None:
     raise ValueError("vocab_size must be set to build the output layer")
 
-  # define bias to be reused in Dense layer
-  scope = tf.get_variable_scope() if reuse else "projection"
-
-  bias = tf.get_variable("bias", shape=[vocab_size], dtype=dtype)
-  layer = tf.layers.Dense(vocab_size, use_bias=True, dtype=dtype,
-                          _reuse=reuse, _scope=scope)
-
+  weight = None
+  if reuse:
+    with tf.variable_scope(tf.get_variable_scope(), reuse=True):
+      weight = tf.get_variable("kernel", shape=[vocab_size, num_units], dtype=dtype)
+
+  layer = Dense(
+      vocab_size,
+      weight=weight,
+      transpose=True,
+      use_bias=True,
+      dtype=dtype,
+      _scope="projection")
   layer.build([None, num_units])
   return layer
 
@@ -3,6 +3,7 @@
 import tensorflow as tf
 
 from opennmt.layers import transformer
+from opennmt.layers.common import recompute_grad
 from opennmt.utils import beam_search
 
 from opennmt.decoders.decoder import Decoder, get_embedding_fn, build_output_layer
@@ -22,7 +23,8 @@ class SelfAttentionDecoder(Decoder):
                dropout=0.1,
                attention_dropout=0.1,
                relu_dropout=0.1,
-               position_encoder=SinusoidalPositionEncoder()):
+               position_encoder=SinusoidalPositionEncoder(),
+               recompute_activations=False):
     """Initializes the parameters of the decoder.
 
     Args:
@@ -37,6 +39,9 @@ class SelfAttentionDecoder(Decoder):
         the feed forward layer.
       position_encoder: A :class:`opennmt.layers.position.PositionEncoder` to
         apply on inputs or ``None``.
+      recompute_activations: If ``True``, the activations of each layer are
+        recomputed in the backward pass instead of being kept in memory
+        during training.
     """
     self.num_layers = num_layers
     self.num_units = num_units
@@ -46,6 +51,7 @@ class SelfAttentionDecoder(Decoder):
     self.attention_dropout = attention_dropout
     self.relu_dropout = relu_dropout
     self.position_encoder = position_encoder
+    self.recompute_activations = recompute_activations
 
   def _build_memory_mask(self, memory, memory_sequence_length=None):
     if memory_sequence_length is None:
@@ -126,59 +132,97 @@ class SelfAttentionDecoder(Decoder):
         memory_mask = self._build_memory_mask(
             memory, memory_sequence_length=memory_sequence_length)
 
+    recompute = (self.recompute_activations
+                 and mode == tf.estimator.ModeKeys.TRAIN
+                 and cache is None)
+    optional_inputs = [decoder_mask, memory, memory_mask]
+
+    def _recomputed_layer(inputs, *args):
+      args = list(args)
+      decoder_mask, memory, memory_mask = [
+          args.pop(0) if x is not None else None for x in optional_inputs]
+      return self._decoder_layer(
+          inputs,
+          mode,
+          decoder_mask=decoder_mask,
+          memory=memory,
+          memory_mask=memory_mask)
+
     for l in range(self.num_layers):
       layer_name = "layer_{}".format(l)
       layer_cache = cache[layer_name] if cache is not None else None
       with tf.variable_scope(layer_name):
-        with tf.variable_scope("masked_multi_head"):
-          encoded = transformer.multi_head_attention(
-              self.num_heads,
-              transformer.norm(inputs),
-              None,
-              mode,
-              num_units=self.num_units,
-              mask=decoder_mask,
-              cache=layer_cache,
-              dropout=self.attention_dropout)
-          encoded = transformer.drop_and_add(
+        if recompute:
+          inputs = recompute_grad(
+              _recomputed_layer,
+              [inputs] + [x for x in optional_inputs if x is not None])
+        else:
+          inputs = self._decoder_layer(
               inputs,
-              encoded,
               mode,
-              dropout=self.dropout)
-
-        if memory is not None:
-          with tf.variable_scope("multi_head"):
-            context = transformer.multi_head_attention(
-                self.num_heads,
-                transformer.norm(encoded),
-                memory,
-                mode,
-                mask=memory_mask,
-                cache=layer_cache,
-                dropout=self.attention_dropout)
-            context = transformer.drop_and_add(
-                encoded,
-                context,
-                mode,
-                dropout=self.dropout)
-
-        with tf.variable_scope("ffn"):
-          transformed = transformer.feed_forward(
-              transformer.norm(context),
-              self.ffn_inner_dim,
-              mode,
-              dropout=self.relu_dropout)
-          transformed = transformer.drop_and_add(
-              context,
-              transformed,
-              mode,
-              dropout=self.dropout)
-
-        inputs = transformed
+              decoder_mask=decoder_mask,
+              memory=memory,
+              memory_mask=memory_mask,
+              cache=layer_cache)
 
     outputs = transformer.norm(inputs)
     return outputs
 
+  def _decoder_layer(self,
+                     inputs,
+                     mode,
+                     decoder_mask=None,
+                     memory=None,
+                     memory_mask=None,
+                     cache=None):
+    """Applies one decoder layer."""
+    with tf.variable_scope("masked_multi_head"):
+      encoded = transformer.multi_head_attention(
+          self.num_heads,
+          transformer.norm(inputs),
+          None,
+          mode,
+          num_units=self.num_units,
+          mask=decoder_mask,
+          cache=cache,
+          dropout=self.attention_dropout)
+      encoded = transformer.drop_and_add(
+          inputs,
+          encoded,
+          mode,
+          dropout=self.dropout)
+
+    context = encoded
+    if memory is not None:
+      with tf.variable_scope("multi_head"):
+        context = transformer.multi_head_attention(
+            self.num_heads,
+            transformer.norm(encoded),
+            memory,
+            mode,
+            mask=memory_mask,
+            cache=cache,
+            dropout=self.attention_dropout)
+        context = transformer.drop_and_add(
+            encoded,
+            context,
+            mode,
+            dropout=self.dropout)
+
+    with tf.variable_scope("ffn"):
+      transformed = transformer.feed_forward(
+          transformer.norm(context),
+          self.ffn_inner_dim,
+          mode,
+          dropout=self.relu_dropout)
+      transformed = transformer.drop_and_add(
+          context,
+          transformed,
+          mode,
+          dropout=self.dropout)
+
+    return transformed
+
   def decode(self,
              inputs,
              sequence_length,
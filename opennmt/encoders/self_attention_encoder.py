@@ -3,6 +3,7 @@
 import tensorflow as tf
 
 from opennmt.layers import transformer
+from opennmt.layers.common import recompute_grad
 
 from opennmt.encoders.encoder import Encoder
 from opennmt.layers.position import SinusoidalPositionEncoder
@@ -21,7 +22,8 @@ class SelfAttentionEncoder(Encoder):
                dropout=0.1,
                attention_dropout=0.1,
                relu_dropout=0.1,
-               position_encoder=SinusoidalPositionEncoder()):
+               position_encoder=SinusoidalPositionEncoder(),
+               recompute_activations=False):
     """Initializes the parameters of the encoder.
 
     Args:
@@ -36,6 +38,9 @@ class SelfAttentionEncoder(Encoder):
         the feed forward layer.
       position_encoder: The :class:`opennmt.layers.position.PositionEncoder` to
         apply on inputs or ``None``.
+      recompute_activations: If ``True``, the activations of each layer are
+        recomputed in the backward pass instead of being kept in memory
+        during training.
     """
     self.num_layers = num_layers
     self.num_units = num_units
@@ -45,6 +50,7 @@ class SelfAttentionEncoder(Encoder):
     self.attention_dropout = attention_dropout
     self.relu_dropout = relu_dropout
     self.position_encoder = position_encoder
+    self.recompute_activations = recompute_activations
 
   def encode(self, inputs, sequence_length=None, mode=tf.estimator.ModeKeys.TRAIN):
     inputs *= self.num_units**0.5
@@ -65,35 +71,43 @@ class SelfAttentionEncoder(Encoder):
 
     for l in range(self.num_layers):
       with tf.variable_scope("layer_{}".format(l)):
-        with tf.variable_scope("multi_head"):
-          context = transformer.multi_head_attention(
-              self.num_heads,
-              transformer.norm(inputs),
-              None,
-              mode,
-              num_units=self.num_units,
-              mask=mask,
-              dropout=self.attention_dropout)
-          context = transformer.drop_and_add(
-              inputs,
-              context,
-              mode,
-              dropout=self.dropout)
-
-        with tf.variable_scope("ffn"):
-          transformed = transformer.feed_forward(
-              transformer.norm(context),
-              self.ffn_inner_dim,
-              mode,
-              dropout=self.relu_dropout)
-          transformed = transformer.drop_and_add(
-              context,
-              transformed,
-              mode,
-              dropout=self.dropout)
-
-        inputs = transformed
+        if self.recompute_activations and mode == tf.estimator.ModeKeys.TRAIN:
+          inputs = recompute_grad(
+              lambda x, m: self._encoder_layer(x, m, mode), [inputs, mask])
+        else:
+          inputs = self._encoder_layer(inputs, mask, mode)
         state += (tf.reduce_mean(inputs, axis=1),)
 
     outputs = transformer.norm(inputs)
     return (outputs, state, sequence_length)
+
+  def _encoder_layer(self, inputs, mask, mode):
+    """Applies one encoder layer."""
+    with tf.variable_scope("multi_head"):
+      context = transformer.multi_head_attention(
+          self.num_heads,
+          transformer.norm(inputs),
+          None,
+          mode,
+          num_units=self.num_units,
+          mask=mask,
+          dropout=self.attention_dropout)
+      context = transformer.drop_and_add(
+          inputs,
+          context,
+          mode,
+          dropout=self.dropout)
+
+    with tf.variable_scope("ffn"):
+      transformed = transformer.feed_forward(
+          transformer.norm(context),
+          self.ffn_inner_dim,
+          mode,
+          dropout=self.relu_dropout)
+      transformed = transformer.drop_and_add(
+          context,
+          transformed,
+          mode,
+          dropout=self.dropout)
+
+    return transformed
@@ -374,12 +374,10 @@ class WordEmbedder(TextInputter):
             case_insensitive_embeddings=self.case_insensitive_embeddings)
         self.embedding_size = pretrained.shape[-1]
 
-        shape = [self.embedding_size, self.vocabulary_size]
+        shape = [self.vocabulary_size, self.embedding_size]
         initializer = tf.constant_initializer(pretrained.astype(self.dtype.as_numpy_dtype()))
       else:
-        # the shape is transposed in order to let to set tie embeddings,
-        # the embedding matrix is transposed before to be passed to embedding lookup
-        shape = [self.embedding_size, self.vocabulary_size]
+        shape = [self.vocabulary_size, self.embedding_size]
         initializer = None
 
       embeddings = tf.get_variable(
@@ -389,7 +387,7 @@ class WordEmbedder(TextInputter):
           initializer=initializer,
           trainable=self.trainable)
 
-    outputs = embedding_lookup(tf.transpose(embeddings), inputs)
+    outputs = embedding_lookup(embeddings, inputs)
 
     outputs = tf.layers.dropout(
         outputs,
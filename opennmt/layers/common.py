@@ -1,23 +1,19 @@
 """Defines common layers."""
 
+import itertools
+
 import tensorflow as tf
 
 from tensorflow.python.framework import function
 
 
-@function.Defun(
-    python_grad_func=lambda x, dy: tf.convert_to_tensor(dy),
-    shape_func=lambda op: [op.inputs[0].get_shape()])
-def convert_gradient_to_tensor(x):
-  """Wraps :obj:`x` to convert its gradient to a tensor."""
-  return x
-
-
 def embedding_lookup(params, ids):
   """Wrapper around ``tf.nn.embedding_lookup``.
 
-  This converts gradients of the embedding variable to tensors which allows
-  to use of optimizers that don't support sparse gradients (e.g. Adafactor).
+  The embedding matrix is expected to have the shape
+  ``[vocabulary_size, embedding_size]`` so that the gradients of
+  :obj:`params` are ``tf.IndexedSlices`` that only contain the rows selected
+  by :obj:`ids`. Optimizers can then update these rows only.
 
   Args:
     params: The embedding tensor.
@@ -26,5 +22,164 @@ def embedding_lookup(params, ids):
   Returns:
     A ``tf.Tensor``, the embeddings that correspond to :obj:`ids`.
   """
-  params = convert_gradient_to_tensor(params)
   return tf.nn.embedding_lookup(params, ids)
+
+
+class Dense(tf.layers.Dense):
+  """Small ``tf.layers.Dense`` extension that can reuse an existing weight
+  matrix, possibly transposed (e.g. to tie the embeddings and the output
+  projection).
+  """
+
+  def __init__(self, units, weight=None, transpose=False, **kwargs):
+    """Initializes the layer.
+
+    Args:
+      units: Positive integer, dimensionality of the output space.
+      weight: The weight to reuse as the kernel. If ``None``, a new kernel is
+        created.
+      transpose: If ``True``, :obj:`weight` is used transposed (i.e. it has
+        the shape ``[units, input_depth]``).
+      kwargs: Additional arguments to pass to ``tf.layers.Dense``.
+    """
+    super(Dense, self).__init__(units, **kwargs)
+    self.weight = weight
+    self.transpose = transpose
+
+  def build(self, input_shape):
+    if self.weight is None:
+      super(Dense, self).build(input_shape)
+      return
+    self.kernel = self.weight
+    if self.use_bias:
+      self.bias = self.add_variable(
+          "bias",
+          shape=[self.units],
+          initializer=self.bias_initializer,
+          dtype=self.dtype,
+          trainable=True)
+    else:
+      self.bias = None
+    self.built = True
+
+  def call(self, inputs):
+    if self.weight is None:
+      return super(Dense, self).call(inputs)
+    static_shape = inputs.get_shape()
+    shape = tf.shape(inputs)
+    rank = static_shape.ndims
+    if rank > 2:
+      inputs = tf.reshape(inputs, [-1, shape[-1]])
+    outputs = tf.matmul(inputs, self.kernel, transpose_b=self.transpose)
+    if self.use_bias:
+      outputs = tf.nn.bias_add(outputs, self.bias)
+    if self.activation is not None:
+      outputs = self.activation(outputs)
+    if rank > 2:
+      outputs = tf.reshape(outputs, tf.concat([shape[:-1], [self.units]], 0))
+      outputs.set_shape(static_shape[:-1].concatenate(self.units))
+    return outputs
+
+
+_dropout_seeds = []
+_recompute_ids = itertools.count()
+
+
+def dropout(inputs, rate, training=False):
+  """Wrapper around ``tf.layers.dropout``.
+
+  Within :func:`opennmt.layers.common.recompute_grad`, the dropout mask is
+  generated from a seed so that the same mask is used when the activations are
+  recomputed in the backward pass.
+
+  Args:
+    inputs: The tensor to apply dropout on.
+    rate: The probability to drop units.
+    training: If ``True``, apply dropout.
+
+  Returns:
+    The tensor after dropout.
+  """
+  if not _dropout_seeds:
+    return tf.layers.dropout(inputs, rate=rate, training=training)
+  if not training or rate == 0:
+    return inputs
+
+  scope = _dropout_seeds[-1]
+  seed = scope["seed"] + tf.constant([0, scope["count"]], dtype=tf.int64)
+  scope["count"] += 1
+  keep_prob = 1.0 - rate
+  noise = tf.contrib.stateless.stateless_random_uniform(tf.shape(inputs), seed)
+  mask = tf.floor(keep_prob + noise) / keep_prob
+  return inputs * tf.cast(mask, inputs.dtype)
+
+
+def _call_and_collect_variables(fn, inputs, seed, scope=None, reuse=None):
+  """Calls :obj:`fn` and returns its outputs and the variables it read."""
+  variables = []
+
+  def _collect(getter, *args, **kwargs):
+    variable = getter(*args, **kwargs)
+    if not any(variable is v for v in variables):
+      variables.append(variable)
+    return variable
+
+  _dropout_seeds.append({"seed": seed, "count": 0})
+  try:
+    with tf.variable_scope(
+        scope or tf.get_variable_scope(), reuse=reuse, custom_getter=_collect):
+      outputs = fn(*inputs)
+  finally:
+    _dropout_seeds.pop()
+  return outputs, variables
+
+
+def recompute_grad(fn, inputs):
+  """Calls :obj:`fn` without keeping its intermediate activations for the
+  backward pass.
+
+  The activations are instead recomputed when the gradients are computed,
+  which trades computation for memory. Random masks generated with
+  :func:`opennmt.layers.common.dropout` are identical in both passes.
+
+  Args:
+    fn: A callable taking :obj:`inputs` as arguments and returning a
+      ``tf.Tensor``. Its variables must be created with ``tf.get_variable``.
+    inputs: A list of ``tf.Tensor``.
+
+  Returns:
+    The output of :obj:`fn`.
+  """
+  inputs = list(inputs)
+  scope = tf.get_variable_scope()
+  seed = tf.random_uniform([2], maxval=2**31 - 1, dtype=tf.int64)
+  output, variables = _call_and_collect_variables(fn, inputs, seed)
+
+  num_inputs = len(inputs)
+  num_variables = len(variables)
+
+  def _grad_fn(op, grad):
+    op_inputs = list(op.inputs)
+    fn_inputs = op_inputs[:num_inputs]
+    fn_seed = op_inputs[num_inputs]
+    with tf.control_dependencies([grad]):
+      fn_inputs = [tf.identity(x) for x in fn_inputs]
+    recomputed, fn_variables = _call_and_collect_variables(
+        fn, fn_inputs, fn_seed, scope=scope, reuse=True)
+    grads = tf.gradients(recomputed, fn_inputs + fn_variables, grad_ys=[grad])
+    # No gradients for the seed and for the original output.
+    return tuple(grads[:num_inputs] + [None] + grads[num_inputs:] + [None])
+
+  in_types = [x.dtype.base_dtype for x in inputs + [seed] + variables + [output]]
+
+  @function.Defun(
+      *in_types,
+      func_name="recompute_grad_{}".format(next(_recompute_ids)),
+      python_grad_func=_grad_fn,
+      shape_func=lambda op: [output.get_shape()])
+  def _identity(*args):
+    return tf.identity(args[-1])
+
+  outputs = _identity(*(inputs + [seed] + variables + [output]))
+  outputs.set_shape(output.get_shape())
+  return outputs
@@ -2,6 +2,8 @@
 
 import tensorflow as tf
 
+from opennmt.layers import common
+
 
 def tile_sequence_length(sequence_length, num_heads):
   """Tiles lengths :obj:`num_heads` times.
@@ -149,7 +151,7 @@ def dot_product_attention(queries,
 
   # Compute attention weights.
   attn = tf.nn.softmax(dot)
-  attn = tf.layers.dropout(
+  attn = common.dropout(
       attn,
       rate=dropout,
       training=mode == tf.estimator.ModeKeys.TRAIN)
@@ -252,7 +254,7 @@ def feed_forward(x, inner_dim, mode, dropout=0.0):
   input_dim = x.get_shape().as_list()[-1]
 
   inner = tf.layers.conv1d(x, inner_dim, 1, activation=tf.nn.relu)
-  inner = tf.layers.dropout(
+  inner = common.dropout(
       inner,
       rate=dropout,
       training=mode == tf.estimator.ModeKeys.TRAIN)
@@ -279,7 +281,7 @@ def drop_and_add(inputs,
   Returns:
     The residual and normalized output.
   """
-  outputs = tf.layers.dropout(
+  outputs = common.dropout(
       outputs,
       rate=dropout,
       training=mode == tf.estimator.ModeKeys.TRAIN)
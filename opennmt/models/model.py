@@ -3,13 +3,14 @@
 from __future__ import print_function
 
 import abc
+import time
 import six
 
 import tensorflow as tf
 
 from opennmt.utils import data
-from opennmt.utils.optim import optimize
-from opennmt.utils.hooks import add_counter
+from opennmt.utils.optim import optimize, float32_variable_storage_getter, moving_average_saver
+from opennmt.utils.hooks import add_counter, add_profiling_tensor
 from opennmt.utils.misc import add_dict_to_collection, item_or_tuple
 from opennmt.utils.parallel import GraphDispatcher
 
@@ -33,23 +34,30 @@ class Model(object):
     else:
       self.dtype = dtype or tf.float32
 
-  def model_fn(self, num_devices=1):
+  def model_fn(self, num_devices=1, all_reduce=None):
     """Returns the model function.
 
     Args:
       num_devices: The number of devices used for training.
+      all_reduce: If set, the gradients are computed on each device and summed
+        with this all-reduce algorithm (``"ring"`` or ``"hierarchical"``)
+        instead of being aggregated on the variables device. Replicas are
+        placed on CPU devices when no GPU is visible.
 
     See Also:
       ``tf.estimator.Estimator`` 's ``model_fn`` argument for more details about
       arguments and the returned value.
     """
     dispatcher = GraphDispatcher(
-        num_devices, daisy_chain_variables=self.daisy_chain_variables)
+        num_devices,
+        daisy_chain_variables=self.daisy_chain_variables and all_reduce is None,
+        cpu_fallback=all_reduce is not None)
 
     def _loss_op(features, labels, params, mode, config):
       """Single callable to compute the loss."""
       logits, _ = self._build(features, labels, params, mode, config=config)
-      return self._compute_loss(features, labels, logits, params, mode)
+      with tf.name_scope("loss"):
+        return self._compute_loss(features, labels, logits, params, mode)
 
     def _normalize_loss(num, den=None):
       """Normalizes the loss."""
@@ -75,28 +83,59 @@ class Model(object):
       tf.summary.scalar("loss", tboard_loss)
       return actual_loss
 
+    def _replica_losses(loss):
+      """Returns the contribution of each replica to the normalized loss."""
+      if not isinstance(loss, tuple):
+        num, den = loss, None
+      else:
+        num, den = loss[0], loss[1]
+      if den is not None:
+        total_den = tf.add_n(den)
+      replica_losses = []
+      for replica_num, device in zip(num, dispatcher.devices):
+        with tf.device(device):
+          if den is not None:
+            replica_losses.append(replica_num / total_den)
+          else:
+            replica_losses.append(replica_num / len(num))
+      return replica_losses
+
     def _model_fn(features, labels, params, mode, config):
       """model_fn implementation."""
       if mode == tf.estimator.ModeKeys.TRAIN:
         self._register_word_counters(features, labels)
+        self._register_padding_ratios(features, labels)
 
         features_shards = dispatcher.shard(features)
         labels_shards = dispatcher.shard(labels)
 
-        with tf.variable_scope(self.name, initializer=self._initializer(params)):
+        with tf.variable_scope(
+            self.name,
+            initializer=self._initializer(params),
+            custom_getter=self._custom_getter()):
           losses_shards = dispatcher(
               _loss_op, features_shards, labels_shards, params, mode, config)
 
         loss = _extract_loss(losses_shards)
-        train_op = optimize(loss, params)
+        if all_reduce is not None:
+          train_op = optimize(
+              loss,
+              params,
+              mixed_precision=self.dtype == tf.float16,
+              replica_losses=_replica_losses(losses_shards),
+              devices=dispatcher.devices,
+              all_reduce=all_reduce)
+        else:
+          train_op = optimize(loss, params, mixed_precision=self.dtype == tf.float16)
         return tf.estimator.EstimatorSpec(
             mode,
             loss=loss,
             train_op=train_op)
       elif mode == tf.estimator.ModeKeys.EVAL:
-        with tf.variable_scope(self.name):
+        with tf.variable_scope(self.name, custom_getter=self._custom_getter()):
           logits, predictions = self._build(features, labels, params, mode, config=config)
-          loss = self._compute_loss(features, labels, logits, params, mode)
+          with tf.name_scope("loss"):
+            loss = self._compute_loss(features, labels, logits, params, mode)
 
         loss = _extract_loss(loss)
         eval_metric_ops = self._compute_metrics(features, labels, predictions)
@@ -107,9 +146,10 @@ class Model(object):
         return tf.estimator.EstimatorSpec(
             mode,
             loss=loss,
-            eval_metric_ops=eval_metric_ops)
+            eval_metric_ops=eval_metric_ops,
+            scaffold=tf.train.Scaffold(saver=moving_average_saver(params)))
       elif mode == tf.estimator.ModeKeys.PREDICT:
-        with tf.variable_scope(self.name):
+        with tf.variable_scope(self.name, custom_getter=self._custom_getter()):
           _, predictions = self._build(features, labels, params, mode, config=config)
 
         export_outputs = {}
@@ -119,12 +159,25 @@ class Model(object):
         return tf.estimator.EstimatorSpec(
             mode,
             predictions=predictions,
-            export_outputs=export_outputs)
+            export_outputs=export_outputs,
+            scaffold=tf.train.Scaffold(saver=moving_average_saver(params)))
       else:
         raise RuntimeError("Invalid mode")
 
     return _model_fn
 
+  def _custom_getter(self):
+    """Returns the custom variable getter for this model.
+
+    In float16, trainable variables are stored in float32 and cast when read.
+
+    Returns:
+      A custom getter or ``None``.
+    """
+    if self.dtype == tf.float16:
+      return float32_variable_storage_getter
+    return None
+
   def _initializer(self, params):
     """Returns the global initializer for this model.
 
@@ -195,6 +248,39 @@ class Model(object):
       if labels_length is not None:
         add_counter("labels", tf.reduce_sum(labels_length))
 
+  def _register_padding_ratios(self, features, labels):
+    """Registers the ratio of padding positions in the batches of sequences
+    (if any) of :obj:`features` and :obj:`labels` for profiling.
+    """
+    def _padding_ratio(length):
+      length = tf.cast(length, tf.float32)
+      num_positions = tf.cast(tf.size(length), tf.float32) * tf.reduce_max(length)
+      return 1.0 - tf.reduce_sum(length) / tf.maximum(num_positions, 1.0)
+
+    features_length = self._get_features_length(features)
+    labels_length = self._get_labels_length(labels)
+    if features_length is not None and not isinstance(features_length, list):
+      add_profiling_tensor("padding_ratio/features", _padding_ratio(features_length))
+    if labels_length is not None:
+      add_profiling_tensor("padding_ratio/labels", _padding_ratio(labels_length))
+
+  def _register_input_statistics(self, outputs, produced_batches, dropped_examples):
+    """Registers the input pipeline statistics for profiling and returns
+    :obj:`outputs` that should be consumed by the model.
+    """
+    flat_outputs = tf.contrib.framework.nest.flatten(outputs)
+    consumed_batches = data.StatisticsCounter()
+    start_time = tf.py_func(time.time, [], tf.float64, stateful=True)
+    with tf.control_dependencies(flat_outputs):
+      end_time = tf.py_func(time.time, [], tf.float64, stateful=True)
+      consumed_count = consumed_batches.increment_op()
+    add_profiling_tensor("input_wait_time", end_time - start_time)
+    add_profiling_tensor(
+        "prefetch_queue_depth", produced_batches.read_op() - consumed_count)
+    add_profiling_tensor("dropped_examples", dropped_examples.read_op(reset=True))
+    with tf.control_dependencies([end_time, consumed_count]):
+      return tf.contrib.framework.nest.map_structure(tf.identity, outputs)
+
   def _initialize(self, metadata):
     """Runs model specific initialization (e.g. vocabularies loading).
 
@@ -301,9 +387,13 @@ class Model(object):
                      sample_buffer_size=None,
                      prefetch_buffer_size=None,
                      maximum_features_length=None,
-                     maximum_labels_length=None):
+                     maximum_labels_length=None,
+                     collect_input_statistics=False):
     """See ``input_fn``."""
     self._initialize(metadata)
+    collect_input_statistics = collect_input_statistics and mode == tf.estimator.ModeKeys.TRAIN
+    produced_batches = data.StatisticsCounter() if collect_input_statistics else None
+    dropped_examples = data.StatisticsCounter() if collect_input_statistics else None
 
     feat_dataset, feat_process_fn = self._get_features_builder(features_file)
 
@@ -336,7 +426,8 @@ class Model(object):
           maximum_features_length=maximum_features_length,
           maximum_labels_length=maximum_labels_length,
           features_length_fn=self._get_features_length,
-          labels_length_fn=self._get_labels_length))
+          labels_length_fn=self._get_labels_length,
+          dropped_counter=dropped_examples))
       dataset = dataset.apply(data.batch_parallel_dataset(
           batch_size,
           batch_type=batch_type,
@@ -353,6 +444,8 @@ class Model(object):
           num_parallel_calls=num_threads or 1)
       dataset = dataset.apply(data.batch_parallel_dataset(batch_size))
 
+    if collect_input_statistics:
+      dataset = dataset.apply(data.count_batches(produced_batches))
     if prefetch_buffer_size:
       dataset = dataset.prefetch(prefetch_buffer_size)
 
@@ -361,7 +454,10 @@ class Model(object):
     # Add the initializer to a standard collection for it to be initialized.
     tf.add_to_collection(tf.GraphKeys.TABLE_INITIALIZERS, iterator.initializer)
 
-    return iterator.get_next()
+    outputs = iterator.get_next()
+    if collect_input_statistics:
+      outputs = self._register_input_statistics(outputs, produced_batches, dropped_examples)
+    return outputs
 
   def input_fn(self,
                mode,
@@ -377,7 +473,8 @@ class Model(object):
                sample_buffer_size=None,
                prefetch_buffer_size=None,
                maximum_features_length=None,
-               maximum_labels_length=None):
+               maximum_labels_length=None,
+               collect_input_statistics=False):
     """Returns an input function.
 
     Args:
@@ -401,6 +498,11 @@ class Model(object):
         the features sequence(s). ``None`` to not constrain the length.
       maximum_labels_length: The maximum length of the labels sequence.
         ``None`` to not constrain the length.
+      collect_input_statistics: In training, register the input wait time, the
+        number of batches in the prefetch buffer, and the number of examples
+        dropped by the length filter for
+        :class:`opennmt.utils.hooks.ThroughputProfilerHook`. This adds Python
+        calls to the input pipeline.
 
     Returns:
       A callable that returns the next element.
@@ -429,7 +531,8 @@ class Model(object):
         sample_buffer_size=sample_buffer_size,
         prefetch_buffer_size=prefetch_buffer_size,
         maximum_features_length=maximum_features_length,
-        maximum_labels_length=maximum_labels_length)
+        maximum_labels_length=maximum_labels_length,
+        collect_input_statistics=collect_input_statistics)
 
   def _serving_input_fn_impl(self, metadata):
     """See ``serving_input_fn``."""
@@ -458,3 +561,25 @@ class Model(object):
     """
     _ = params
     print(prediction, file=stream)
+
+  def print_predictions(self, predictions, params=None, stream=None):
+    """Prints a batch of model predictions.
+
+    The default implementation calls :meth:`print_prediction` on each
+    prediction. Models can override it to process the batch at once.
+
+    Args:
+      predictions: An iterable of evaluated predictions.
+      params: (optional) Dictionary of formatting parameters.
+      stream: (optional) The stream to print to.
+    """
+    for prediction in predictions:
+      self.print_prediction(prediction, params=params, stream=stream)
+
+  def close(self):
+    """Releases the resources used to print the predictions (e.g. the
+    detokenization processes).
+
+    The model can still be used afterwards.
+    """
+    return
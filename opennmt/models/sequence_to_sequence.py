@@ -6,9 +6,11 @@ import opennmt.constants as constants
 import opennmt.inputters as inputters
 
 from opennmt.models.model import Model
-from opennmt.utils.losses import cross_entropy_sequence_loss
+from opennmt.utils.losses import cross_entropy_sequence_loss, sampled_softmax_sequence_loss
+from opennmt.utils import beam_search
 from opennmt.utils.misc import print_bytes
-from opennmt.decoders.decoder import get_sampling_probability
+from opennmt.decoders.decoder import get_sampling_probability, build_output_layer
+from opennmt.decoders.self_attention_decoder import SelfAttentionDecoder
 
 
 def shift_target_sequence(inputter, data):
@@ -44,6 +46,15 @@ def shift_target_sequence(inputter, data):
   return data
 
 
+def _get_projection_weights(output_layer):
+  """Returns the weights of the output projection with shape
+  ``[vocab_size, num_units]``.
+  """
+  if output_layer.weight is not None and output_layer.transpose:
+    return output_layer.kernel
+  return tf.transpose(output_layer.kernel)
+
+
 class SequenceToSequence(Model):
   """A sequence to sequence model."""
 
@@ -103,20 +114,41 @@ class SequenceToSequence(Model):
           return self.target_inputter.transform(ids, mode=mode)
     return _target_embedding_fn
 
-  def _build(self, features, labels, params, mode, config=None):
-    features_length = self._get_features_length(features)
-    log_dir = config.model_dir if config is not None else None
+  def _encode(self, features, mode, log_dir=None):
+    """Encodes the source features.
 
+    Returns:
+      A tuple ``(encoder_outputs, encoder_state, encoder_sequence_length)``.
+    """
     with tf.variable_scope("encoder"):
       source_inputs = self.source_inputter.transform_data(
           features,
           mode=mode,
           log_dir=log_dir)
-      encoder_outputs, encoder_state, encoder_sequence_length = self.encoder.encode(
+      return self.encoder.encode(
           source_inputs,
-          sequence_length=features_length,
+          sequence_length=self._get_features_length(features),
           mode=mode)
 
+  def _build_predictions(self, sampled_ids, sampled_length, log_probs):
+    """Maps the decoded ids to target tokens and returns the predictions dict."""
+    target_vocab_rev = tf.contrib.lookup.index_to_string_table_from_file(
+        self.target_inputter.vocabulary_file,
+        vocab_size=self.target_inputter.vocabulary_size - self.target_inputter.num_oov_buckets,
+        default_value=constants.UNKNOWN_TOKEN)
+
+    return {
+        "tokens": target_vocab_rev.lookup(tf.cast(sampled_ids, tf.int64)),
+        "length": sampled_length,
+        "log_probs": log_probs
+    }
+
+  def _build(self, features, labels, params, mode, config=None):
+    log_dir = config.model_dir if config is not None else None
+
+    encoder_outputs, encoder_state, encoder_sequence_length = self._encode(
+        features, mode, log_dir=log_dir)
+
     target_vocab_size = self.target_inputter.vocabulary_size
     target_dtype = self.target_inputter.dtype
 
@@ -132,6 +164,20 @@ class SequenceToSequence(Model):
             labels,
             mode=mode,
             log_dir=log_dir)
+
+        output_layer = None
+        sampled_softmax = (
+            mode == tf.estimator.ModeKeys.TRAIN
+            and params.get("sampled_softmax_num_samples"))
+        if sampled_softmax:
+          if sampling_probability is not None:
+            raise ValueError("Sampled softmax is not compatible with scheduled sampling")
+          output_layer = build_output_layer(
+              self.decoder.num_units,
+              target_vocab_size,
+              dtype=target_dtype,
+              reuse=getattr(self.decoder, "tie_embeddings", False))
+
         logits, _, _ = self.decoder.decode(
             target_inputs,
             self._get_labels_length(labels),
@@ -139,9 +185,18 @@ class SequenceToSequence(Model):
             initial_state=encoder_state,
             sampling_probability=sampling_probability,
             embedding=self._scoped_target_embedding_fn(mode, decoder_scope),
+            output_layer=(lambda outputs: outputs) if sampled_softmax else None,
             mode=mode,
             memory=encoder_outputs,
             memory_sequence_length=encoder_sequence_length)
+
+        if sampled_softmax:
+          # Defer the projection to the loss computation.
+          logits = {
+              "outputs": logits,
+              "weights": _get_projection_weights(output_layer),
+              "biases": output_layer.bias
+          }
       else:
         logits = None
 
@@ -181,22 +236,95 @@ class SequenceToSequence(Model):
               memory_sequence_length=encoder_sequence_length,
               dtype=target_dtype)
 
-      target_vocab_rev = tf.contrib.lookup.index_to_string_table_from_file(
-          self.target_inputter.vocabulary_file,
-          vocab_size=target_vocab_size - self.target_inputter.num_oov_buckets,
-          default_value=constants.UNKNOWN_TOKEN)
-
-      predictions = {
-          "tokens": target_vocab_rev.lookup(tf.cast(sampled_ids, tf.int64)),
-          "length": sampled_length,
-          "log_probs": log_probs
-      }
+      predictions = self._build_predictions(sampled_ids, sampled_length, log_probs)
     else:
       predictions = None
 
     return logits, predictions
 
+  def build_ensemble_predictions(self, features, params, scopes):
+    """Builds one instance of this model per scope and decodes with their
+    ensemble.
+
+    All members share the input features and the vocabularies. At each decoding
+    step, the log probabilities of the members are averaged before being passed
+    to the beam search.
+
+    Args:
+      features: The dict of features ``tf.Tensor``.
+      params: A dictionary of hyperparameters.
+      scopes: The variable scope of each ensemble member. The variables of a
+        member are created under ``<scope>/<name>/``.
+
+    Returns:
+      The predictions dict.
+
+    Raises:
+      ValueError: if the decoder does not support ensemble decoding.
+    """
+    if not isinstance(self.decoder, SelfAttentionDecoder):
+      raise ValueError("Ensemble decoding is only supported with SelfAttentionDecoder")
+
+    mode = tf.estimator.ModeKeys.PREDICT
+    target_vocab_size = self.target_inputter.vocabulary_size
+    target_dtype = self.target_inputter.dtype
+
+    # pylint: disable=protected-access
+    members = []
+    states = {}
+    for i, scope in enumerate(scopes):
+      with tf.variable_scope(scope), tf.variable_scope(
+          self.name, custom_getter=self._custom_getter()):
+        encoder_outputs, _, encoder_sequence_length = self._encode(features, mode)
+        with tf.variable_scope("decoder") as decoder_scope:
+          key = "member_{}".format(i)
+          states[key] = self.decoder._init_cache(
+              encoder_outputs, memory_sequence_length=encoder_sequence_length)
+          symbols_to_logits_fn = self.decoder._symbols_to_logits_fn(
+              self._scoped_target_embedding_fn(mode, decoder_scope),
+              target_vocab_size,
+              mode,
+              dtype=target_dtype)
+          members.append((key, decoder_scope, symbols_to_logits_fn))
+
+    def _ensemble_symbols_to_logits_fn(ids, step, states):
+      new_states = {}
+      log_probs = []
+      for key, decoder_scope, symbols_to_logits_fn in members:
+        with tf.variable_scope(decoder_scope, reuse=tf.AUTO_REUSE):
+          logits, new_states[key] = symbols_to_logits_fn(ids, step, states[key])
+        log_probs.append(tf.nn.log_softmax(logits))
+      return tf.add_n(log_probs) / len(log_probs), new_states
+
+    batch_size = tf.shape(encoder_sequence_length)[0]
+    start_tokens = tf.fill([batch_size], constants.START_OF_SENTENCE_ID)
+
+    sampled_ids, log_probs = beam_search.beam_search(
+        _ensemble_symbols_to_logits_fn,
+        start_tokens,
+        max(params.get("beam_width", 1), 1),
+        params.get("maximum_iterations", 250),
+        target_vocab_size,
+        params.get("length_penalty", 0),
+        states=states,
+        eos_id=constants.END_OF_SENTENCE_ID)
+    sampled_ids = tf.slice(sampled_ids, [0, 0, 1], [-1, -1, -1]) # Ignore <s>.
+    sampled_length = tf.reduce_sum(tf.cast(tf.not_equal(sampled_ids, 0), tf.int32), axis=-1)
+
+    return self._build_predictions(sampled_ids, sampled_length, log_probs)
+
   def _compute_loss(self, features, labels, outputs, params, mode):
+    if isinstance(outputs, dict):
+      if params.get("label_smoothing", 0.0) > 0.0:
+        tf.logging.warning("Label smoothing is ignored when using sampled softmax")
+      return sampled_softmax_sequence_loss(
+          outputs["outputs"],
+          outputs["weights"],
+          outputs["biases"],
+          labels["ids_out"],
+          self._get_labels_length(labels),
+          params["sampled_softmax_num_samples"],
+          average_in_time=params.get("average_loss_in_time", False))
     return cross_entropy_sequence_loss(
         outputs,
         labels["ids_out"],
@@ -206,13 +334,24 @@ class SequenceToSequence(Model):
         mode=mode)
 
   def print_prediction(self, prediction, params=None, stream=None):
+    self.print_predictions([prediction], params=params, stream=stream)
+
+  def print_predictions(self, predictions, params=None, stream=None):
     n_best = params and params.get("n_best")
     n_best = n_best or 1
 
-    if n_best > len(prediction["tokens"]):
-      raise ValueError("n_best cannot be greater than beam_width")
-
-    for i in range(n_best):
-      tokens = prediction["tokens"][i][:prediction["length"][i] - 1] # Ignore </s>.
-      sentence = self.target_inputter.tokenizer.detokenize(tokens)
-      print_bytes(tf.compat.as_bytes(sentence), stream=stream)
+    tokens_batch = []
+    for prediction in predictions:
+      if n_best > len(prediction["tokens"]):
+        raise ValueError("n_best cannot be greater than beam_width")
+      for i in range(n_best):
+        tokens_batch.append(prediction["tokens"][i][:prediction["length"][i] - 1]) # Ignore </s>.
+    if not tokens_batch:
+      return
+
+    sentences = self.target_inputter.tokenizer.detokenize_batch(
+        tokens_batch, num_processes=params and params.get("detokenization_processes"))
+    print_bytes(tf.compat.as_bytes("\n".join(sentences)), stream=stream)
+
+  def close(self):
+    self.target_inputter.tokenizer.close()
@@ -24,6 +24,7 @@ class Transformer(SequenceToSequence):
                attention_dropout=0.1,
                relu_dropout=0.1,
                position_encoder=SinusoidalPositionEncoder(),
+               recompute_activations=False,
                name="transformer"):
     """Initializes a Transformer model.
 
@@ -43,6 +44,8 @@ class Transformer(SequenceToSequence):
         the feed forward layer.
       position_encoder: A :class:`opennmt.layers.position.PositionEncoder` to
         apply on the inputs.
+      recompute_activations: If ``True``, recompute the activations of each
+        layer in the backward pass to reduce the memory usage during training.
       name: The name of this model.
     """
     encoder = SelfAttentionEncoder(
@@ -53,7 +56,8 @@ class Transformer(SequenceToSequence):
         dropout=dropout,
         attention_dropout=attention_dropout,
         relu_dropout=relu_dropout,
-        position_encoder=position_encoder)
+        position_encoder=position_encoder,
+        recompute_activations=recompute_activations)
     decoder = SelfAttentionDecoder(
         num_layers,
         num_units=num_units,
@@ -62,7 +66,8 @@ class Transformer(SequenceToSequence):
         dropout=dropout,
         attention_dropout=attention_dropout,
         relu_dropout=relu_dropout,
-        position_encoder=position_encoder)
+        position_encoder=position_encoder,
+        recompute_activations=recompute_activations)
 
     super(Transformer, self).__init__(
         source_inputter,
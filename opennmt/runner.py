@@ -1,17 +1,29 @@
 """Main library entrypoint."""
 
+import heapq
 import io
+import json
 import os
+import shutil
 import sys
 import random
+import tempfile
+import time
 
 import numpy as np
+import six
 import tensorflow as tf
 
 from tensorflow.python.estimator.util import fn_args
 
+from opennmt.utils import checkpoint
 from opennmt.utils import hooks
+from opennmt.utils import misc
+from opennmt.utils import profiler
+from opennmt.translator import Translator
 from opennmt.utils.evaluator import external_evaluation_fn
+from opennmt.utils.serving import stream_batches
+from opennmt.utils.writer import PredictionWriter
 
 
 class Runner(object):
@@ -27,7 +39,8 @@ class Runner(object):
                gpu_allow_growth=False,
                per_process_gpu_memory_fraction=None,
                cpu_only=False,
-               num_threads=2):
+               num_threads=2,
+               all_reduce=None):
     """Initializes the runner parameters.
 
     Args:
@@ -36,10 +49,14 @@ class Runner(object):
       seed: The random seed to set.
       num_devices: The number of devices (GPUs) to use for training.
       gpu_allow_growth: Allow GPU memory to grow dynamically.
+      all_reduce: If set, sum the gradients of the replicas with this
+        all-reduce algorithm (``"ring"`` or ``"hierarchical"``). Without GPUs,
+        :obj:`num_devices` CPU devices are used.
     """
     self._model = model
     self._config = config
     self._num_devices = num_devices
+    self._all_reduce = all_reduce
 
     if cpu_only:
         gpu_options = tf.GPUOptions()
@@ -55,6 +72,10 @@ class Runner(object):
         gpu_options=gpu_options)#,
         #intra_op_parallelism_threads=num_threads,
         #inter_op_parallelism_threads=num_threads)
+    if all_reduce is not None:
+      # Expose multiple CPU devices to replicate the model when no GPU is visible.
+      session_config.device_count["CPU"] = num_devices
+    self._session_config = session_config
     run_config = tf.estimator.RunConfig(
         model_dir=self._config["model_dir"],
         session_config=session_config,
@@ -81,16 +102,62 @@ class Runner(object):
             keep_checkpoint_max=self._config["train"]["keep_checkpoint_max"])
 
     self._estimator = tf.estimator.Estimator(
-        self._model.model_fn(num_devices=self._num_devices),
+        self._model.model_fn(num_devices=self._num_devices, all_reduce=self._all_reduce),
         config=run_config,
         params=self._config["params"])
 
+  def _build_profiler_hooks(self, mode):
+    """Returns the hooks configured by the ``profile_steps`` and
+    ``memory_report_steps`` options of the :obj:`mode` configuration section.
+    """
+    section = self._config.get(mode, {})
+    use_global_step = mode == tf.estimator.ModeKeys.TRAIN
+    profiler_hooks = []
+    profile_steps = section.get("profile_steps")
+    if profile_steps:
+      if not isinstance(profile_steps, list):
+        profile_steps = [profile_steps]
+      profiler_hooks.append(hooks.StepProfilerHook(
+          os.path.join(self._estimator.model_dir, "profile", mode),
+          profile_steps,
+          use_global_step=use_global_step))
+    memory_report_steps = section.get("memory_report_steps")
+    if memory_report_steps:
+      profiler_hooks.append(hooks.MemoryReportHook(
+          every_n_steps=memory_report_steps,
+          use_global_step=use_global_step,
+          output_dir=self._estimator.model_dir))
+    return profiler_hooks
+
   def _build_train_spec(self):
     train_hooks = [
         hooks.LogParametersCountHook(),
         hooks.CountersHook(
             every_n_steps=self._estimator.config.save_summary_steps,
             output_dir=self._estimator.model_dir)]
+    if self._num_devices > 1:
+      train_hooks.append(hooks.ScalingEfficiencyHook(
+          self._num_devices,
+          single_device_throughput=self._config["train"].get("single_device_throughput"),
+          every_n_steps=self._estimator.config.save_summary_steps,
+          output_dir=self._estimator.model_dir))
+
+    train_hooks.extend(self._build_profiler_hooks(tf.estimator.ModeKeys.TRAIN))
+
+    profile_throughput = self._config["train"].get("profile_throughput", False)
+    if profile_throughput:
+      # Insert first so that the after_run of the other hooks counts as hooks time.
+      train_hooks.insert(0, hooks.ThroughputProfilerHook(
+          every_n_steps=self._estimator.config.save_summary_steps,
+          output_dir=self._estimator.model_dir))
+
+    if self._config["train"].get("async_checkpoint", False):
+      run_config = self._estimator.config
+      train_hooks.append(hooks.AsyncCheckpointSaverHook(
+          self._estimator.model_dir,
+          save_secs=run_config.save_checkpoints_secs,
+          save_steps=run_config.save_checkpoints_steps,
+          keep_checkpoint_max=run_config.keep_checkpoint_max))
 
     train_spec = tf.estimator.TrainSpec(
         input_fn=self._model.input_fn(
@@ -107,22 +174,25 @@ class Runner(object):
             sample_buffer_size=self._config["train"].get("sample_buffer_size", 500000),
             prefetch_buffer_size=self._config["train"].get("prefetch_buffer_size", 1),
             maximum_features_length=self._config["train"].get("maximum_features_length"),
-            maximum_labels_length=self._config["train"].get("maximum_labels_length")),
+            maximum_labels_length=self._config["train"].get("maximum_labels_length"),
+            collect_input_statistics=profile_throughput),
         max_steps=self._config["train"].get("train_steps"),
         hooks=train_hooks)
     return train_spec
 
-  def _build_eval_spec(self, mode):
+  def _build_eval_spec(self, mode, checkpoint_dir=None):
     if "eval" not in self._config:
       self._config["eval"] = {}
-    eval_hooks = []
+    eval_hooks = self._build_profiler_hooks(tf.estimator.ModeKeys.EVAL)
     if (self._config["eval"].get("save_eval_predictions", False)
         or self._config["eval"].get("external_evaluators") is not None):
       save_path = os.path.join(self._estimator.model_dir, "eval")
       if not os.path.isdir(save_path):
         os.makedirs(save_path)
 
-      if self._config["eval"].get("save_models", False):
+      # Best models are only saved for the evaluations run during the training:
+      # the standalone evaluations may not evaluate a checkpoint of model_dir.
+      if self._config["eval"].get("save_models", False) and mode == tf.estimator.ModeKeys.TRAIN:
           save_model_path = save_path
       else:
           save_model_path = None
@@ -131,11 +201,14 @@ class Runner(object):
           os.path.join(save_path, "predictions.txt"),
           mode=mode,
           best_models_dir=save_model_path,
+          checkpoint_dir=checkpoint_dir or self._estimator.model_dir,
+          params=self._config["eval"],
           post_evaluation_fn=external_evaluation_fn(
               self._config["eval"].get("external_evaluators"),
               self._config["data"]["eval_labels_file"],
               postprocess_script=self._config["eval"].get("postprocess_script", None),
-              output_dir=self._estimator.model_dir)))
+              output_dir=self._estimator.model_dir,
+              num_processes=self._config["eval"].get("external_evaluators_processes", 1))))
 
     eval_spec = tf.estimator.EvalSpec(
         input_fn=self._model.input_fn(
@@ -168,26 +241,426 @@ class Runner(object):
 
   def evaluate(self, checkpoint_path=None):
     """Runs evaluation."""
-    if checkpoint_path is not None and os.path.isdir(checkpoint_path):
-      checkpoint_path = tf.train.latest_checkpoint(checkpoint_path)
+    checkpoint_path = _resolve_checkpoint_path(checkpoint_path)
     mode = tf.estimator.ModeKeys.EVAL
     eval_spec = self._build_eval_spec(mode)
     self._estimator.evaluate(
         eval_spec.input_fn, hooks=eval_spec.hooks, checkpoint_path=checkpoint_path)
 
+  def continuous_evaluate(self, timeout=None):
+    """Evaluates each new checkpoint saved in the model directory.
+
+    This is meant to run in a separate process, e.g. on its own GPU or on CPU,
+    so that the training never pauses for evaluation. Each checkpoint is
+    evaluated, scored by the external evaluators, and exported. The best
+    checkpoint according to the ``eval.best_metric`` metric is copied in
+    ``model_dir/eval/best`` and described in
+    ``model_dir/eval/best_checkpoint.json``.
+
+    Args:
+      timeout: The maximum number of seconds to wait for a new checkpoint. If
+        ``None``, wait until the checkpoint of the last training step is
+        evaluated.
+
+    Returns:
+      The metadata of the best checkpoint or ``None`` if no checkpoints were
+      evaluated.
+    """
+    model_dir = self._estimator.model_dir
+    eval_dir = os.path.join(model_dir, "eval")
+    current_dir = os.path.join(eval_dir, "current")
+    best_dir = os.path.join(eval_dir, "best")
+    metadata_path = os.path.join(eval_dir, "best_checkpoint.json")
+
+    eval_spec = self._build_eval_spec(tf.estimator.ModeKeys.EVAL, checkpoint_dir=current_dir)
+    prediction_hooks = [
+        hook for hook in eval_spec.hooks
+        if isinstance(hook, hooks.SaveEvaluationPredictionHook)]
+    best_metric = self._config["eval"].get("best_metric", "loss")
+    max_steps = self._config.get("train", {}).get("train_steps")
+
+    best = None
+    if os.path.exists(metadata_path):
+      with io.open(metadata_path, encoding="utf-8") as metadata_file:
+        best = json.load(metadata_file)
+
+    for checkpoint_path in tf.contrib.training.checkpoints_iterator(model_dir, timeout=timeout):
+      step = checkpoint.get_checkpoint_step(checkpoint_path)
+      # Work on a copy of the checkpoint as the training may remove it in the meantime.
+      current_path = os.path.join(current_dir, os.path.basename(checkpoint_path))
+      try:
+        current_path = checkpoint.copy_checkpoint(checkpoint_path, current_path)
+      except (IOError, OSError):
+        checkpoint.remove_checkpoint(current_path)
+        current_path = None
+      if current_path is None:
+        tf.logging.warning("Checkpoint %s was removed before its evaluation", checkpoint_path)
+        continue
+
+      try:
+        metrics = self._estimator.evaluate(
+            eval_spec.input_fn, hooks=eval_spec.hooks, checkpoint_path=current_path)
+        export_dir = None
+        for exporter in eval_spec.exporters:
+          export_dir = exporter.export(
+              self._estimator,
+              os.path.join(model_dir, "export", exporter.name),
+              current_path,
+              metrics,
+              False)
+
+        metrics = {
+            name: float(value) for name, value in six.iteritems(metrics)
+            if name != tf.GraphKeys.GLOBAL_STEP}
+        higher_is_better = {}
+        for hook in prediction_hooks:
+          for name, (score, higher) in six.iteritems(hook.latest_scores):
+            metrics[name] = float(score)
+            higher_is_better[name] = higher
+
+        value = metrics.get(best_metric)
+        if value is None:
+          tf.logging.warning("Metric %s is not available to select the best checkpoint", best_metric)
+        elif (best is None
+              or best["metric"] != best_metric
+              or _is_better(
+                  value, best["value"], higher_is_better.get(best_metric, best_metric != "loss"))):
+          if best is not None:
+            checkpoint.remove_checkpoint(best["checkpoint_path"])
+          best = {
+              "step": step,
+              "checkpoint_path": checkpoint.copy_checkpoint(
+                  current_path, os.path.join(best_dir, os.path.basename(checkpoint_path))),
+              "export_dir": tf.compat.as_text(export_dir) if export_dir else None,
+              "metric": best_metric,
+              "value": value,
+              "metrics": metrics
+          }
+          _write_json(metadata_path, best)
+          tf.logging.info(
+              "New best checkpoint %s with %s %f", best["checkpoint_path"], best_metric, value)
+      finally:
+        checkpoint.remove_checkpoint(current_path)
+
+      if max_steps is not None and step is not None and step >= max_steps:
+        break
+
+    return best
+
+  def find_max_batch_size(self,
+                          memory_budget,
+                          min_batch_size=256,
+                          max_batch_size=65536,
+                          tolerance=0.05,
+                          num_steps=2):
+    """Searches the largest token batch size for which the training steps fit
+    in a memory budget.
+
+    Each candidate batch size is dry run for a few training steps on batches of
+    the longest training examples, and the peak memory usage of the allocators
+    (see :func:`opennmt.utils.profiler.peak_memory_by_device`) is compared to
+    the budget. Nothing is saved in the model directory. With
+    ``cpu_only``, the search runs on CPU.
+
+    Args:
+      memory_budget: The memory budget in bytes.
+      min_batch_size: The smallest token batch size to try.
+      max_batch_size: The largest token batch size to try.
+      tolerance: Stop the search when the interval of candidates is smaller
+        than this fraction of the largest batch size that fits.
+      num_steps: The number of training steps to run for each candidate.
+
+    Returns:
+      The token batch size or ``None`` if :obj:`min_batch_size` does not fit.
+
+    Raises:
+      RuntimeError: if the dry run batches are much smaller than the candidate
+        batch size or if the memory usage is not reported.
+    """
+    tmp_dir = tempfile.mkdtemp()
+    try:
+      features_file, labels_file = self._write_longest_examples(
+          tmp_dir, max_batch_size * (num_steps + 1))
+
+      def _fits(batch_size):
+        peak_bytes = self._dry_run(batch_size, features_file, labels_file, num_steps)
+        fits = peak_bytes is not None and peak_bytes <= memory_budget
+        tf.logging.info(
+            "Batch size %d: %s", batch_size,
+            "out of memory" if peak_bytes is None else "peak memory %.2f MB (%s)" % (
+                peak_bytes / (1024.0 * 1024.0), "fits" if fits else "does not fit"))
+        return fits
+
+      if not _fits(min_batch_size):
+        return None
+      low, high = min_batch_size, None
+      # Double the batch size until it does not fit, then bisect.
+      while high is None:
+        candidate = min(low * 2, max_batch_size)
+        if candidate == low:
+          return low
+        if _fits(candidate):
+          low = candidate
+        else:
+          high = candidate
+      while high - low > max(1, int(low * tolerance)):
+        middle = (low + high) // 2
+        if _fits(middle):
+          low = middle
+        else:
+          high = middle
+      return low
+    finally:
+      shutil.rmtree(tmp_dir)
+
+  def _write_longest_examples(self, output_dir, num_tokens, num_examples=100):
+    """Writes the longest training examples that satisfy the length constraints.
+
+    The examples are repeated so that each length bucket can form batches of
+    :obj:`num_tokens` tokens before the end of the file: the batches are
+    formed before the dataset is repeated, so the last batch of each bucket is
+    incomplete.
+    """
+    features_path = self._config["data"]["train_features_file"]
+    labels_path = self._config["data"]["train_labels_file"]
+    if not isinstance(features_path, six.string_types):
+      raise ValueError("Batch size search only supports a single features file")
+    maximum_features_length = self._config["train"].get("maximum_features_length")
+    maximum_labels_length = self._config["train"].get("maximum_labels_length")
+    bucket_width = self._config["train"].get("bucket_width", 5)
+
+    def _examples():
+      with io.open(features_path, encoding="utf-8") as features_file, \
+           io.open(labels_path, encoding="utf-8") as labels_file:
+        for features, labels in six.moves.zip(features_file, labels_file):
+          features_length = len(features.split())
+          labels_length = len(labels.split())
+          if isinstance(maximum_features_length, int) and features_length > maximum_features_length:
+            continue
+          if isinstance(maximum_labels_length, int) and labels_length > maximum_labels_length:
+            continue
+          # Token batches are formed on the longest side of the examples.
+          yield max(features_length, labels_length), features, labels
+
+    longest_examples = heapq.nlargest(num_examples, _examples(), key=lambda example: example[0])
+    if not longest_examples:
+      raise ValueError("No training examples satisfy the length constraints")
+    num_buckets = len(set(length // bucket_width for length, _, _ in longest_examples))
+    total_length = sum(length for length, _, _ in longest_examples)
+    num_copies = max(1, -(-num_tokens * num_buckets // max(total_length, 1)))
+    features_file = os.path.join(output_dir, "features.txt")
+    labels_file = os.path.join(output_dir, "labels.txt")
+    with io.open(features_file, encoding="utf-8", mode="w") as features_stream, \
+         io.open(labels_file, encoding="utf-8", mode="w") as labels_stream:
+      for _ in range(num_copies):
+        for _, features, labels in longest_examples:
+          features_stream.write(u"{}\n".format(features.rstrip("\n")))
+          labels_stream.write(u"{}\n".format(labels.rstrip("\n")))
+    return features_file, labels_file
+
+  def _dry_run(self, batch_size, features_file, labels_file, num_steps):
+    """Runs training steps and returns the peak memory usage in bytes, or
+    ``None`` if the steps ran out of memory.
+
+    Raises:
+      RuntimeError: if a batch contains less than half of :obj:`batch_size`
+        tokens or if the memory usage is not reported.
+    """
+    input_fn = self._dry_run_input_fn(batch_size, features_file, labels_file)
+    model_fn = self._model.model_fn()
+    with tf.Graph().as_default():
+      tf.train.create_global_step()
+      features, labels = input_fn()
+      batch_tokens = _count_batch_tokens(features, labels)
+      spec = model_fn(
+          features, labels, self._config["params"], tf.estimator.ModeKeys.TRAIN,
+          self._estimator.config)
+      with tf.Session(config=self._session_config) as sess:
+        sess.run(tf.global_variables_initializer())
+        sess.run(tf.local_variables_initializer())
+        sess.run(tf.tables_initializer())
+        peak_bytes = 0
+        for _ in range(num_steps):
+          run_metadata = tf.RunMetadata()
+          try:
+            _, tokens = sess.run(
+                [spec.train_op, batch_tokens],
+                options=tf.RunOptions(trace_level=tf.RunOptions.SOFTWARE_TRACE),
+                run_metadata=run_metadata)
+          except tf.errors.ResourceExhaustedError:
+            return None
+          if tokens < batch_size // 2:
+            raise RuntimeError(
+                "The dry run batch only contains {} tokens for the batch size {}".format(
+                    tokens, batch_size))
+          peaks = profiler.peak_memory_by_device(run_metadata.step_stats)
+          if not peaks:
+            raise RuntimeError("The memory usage is not reported by this TensorFlow version")
+          peak_bytes = max([peak_bytes] + list(six.itervalues(peaks)))
+    return peak_bytes
+
+  def _dry_run_input_fn(self, batch_size, features_file, labels_file):
+    return self._model.input_fn(
+        tf.estimator.ModeKeys.TRAIN,
+        batch_size,
+        self._config["data"],
+        features_file,
+        labels_file=labels_file,
+        batch_type="tokens",
+        bucket_width=self._config["train"].get("bucket_width", 5),
+        sample_buffer_size=0)
+
+  def benchmark(self, num_steps=20, warmup_steps=5, optimizer_params=None):
+    """Measures the training speed without the input pipeline.
+
+    For each number of replicas (1, 2, 4, ... up to ``num_devices``), a
+    training batch is read once and the training steps are run on this
+    in-memory batch. Each replica processes a batch of the configured size. The
+    scaling efficiency is the throughput divided by the throughput of a single
+    device times the number of replicas. Without GPUs, the replicas are placed
+    on CPU devices. Nothing is saved in the model directory.
+
+    Args:
+      num_steps: The number of timed training steps.
+      warmup_steps: The number of training steps to run before timing.
+      optimizer_params: (optional) A dictionary mapping names to
+        hyperparameters that update the ``params`` configuration (e.g. the
+        files in ``config/optim``). If ``None``, only the configured
+        hyperparameters are benchmarked under the name ``config``.
+
+    Returns:
+      A list of dictionaries with the keys ``optimizer``, ``num_devices``,
+      ``step_time_sec``, ``tokens_per_sec``, and ``scaling_efficiency``. The
+      scaling efficiency is ``None`` when the single device throughput is 0.
+
+    Raises:
+      ValueError: if :obj:`num_steps` is lower than 1 or :obj:`warmup_steps` is
+        negative.
+    """
+    if num_steps < 1:
+      raise ValueError("The number of benchmark steps should be at least 1, got %d" % num_steps)
+    if warmup_steps < 0:
+      raise ValueError("The number of warmup steps should not be negative, got %d" % warmup_steps)
+    if optimizer_params is None:
+      optimizer_params = {"config": {}}
+    device_counts = [1]
+    while device_counts[-1] * 2 <= self._num_devices:
+      device_counts.append(device_counts[-1] * 2)
+    if device_counts[-1] != self._num_devices:
+      device_counts.append(self._num_devices)
+    all_reduce = self._all_reduce
+    if all_reduce is None and self._num_devices > 1 and not tf.test.is_gpu_available():
+      # Replicas are only placed on CPU devices when the gradients are all-reduced.
+      all_reduce = "ring"
+
+    batches = {}
+    results = []
+    for name, overrides in sorted(six.iteritems(optimizer_params)):
+      params = dict(self._config["params"])
+      if overrides.get("optimizer", params.get("optimizer")) != params.get("optimizer"):
+        params.pop("optimizer_params", None)
+      params.update(overrides)
+      single_device_throughput = None
+      for num_devices in device_counts:
+        if num_devices not in batches:
+          batches[num_devices] = self._read_training_batch(num_devices)
+        step_time, throughput = self._time_training_steps(
+            batches[num_devices], params, num_devices, all_reduce, num_steps, warmup_steps)
+        if num_devices == 1:
+          single_device_throughput = throughput
+        if single_device_throughput:
+          scaling_efficiency = throughput / (num_devices * single_device_throughput)
+        else:
+          scaling_efficiency = None
+        result = {
+            "optimizer": name,
+            "num_devices": num_devices,
+            "step_time_sec": step_time,
+            "tokens_per_sec": throughput,
+            "scaling_efficiency": scaling_efficiency
+        }
+        tf.logging.info(
+            "%s on %d device(s): %.4f s/step, %.1f tokens/s, scaling efficiency %s",
+            name, num_devices, step_time, throughput,
+            "%.3f" % scaling_efficiency if scaling_efficiency is not None else "n/a")
+        results.append(result)
+    return results
+
+  def _read_training_batch(self, batch_multiplier):
+    """Reads a training batch of :obj:`batch_multiplier` replica batches as
+    Numpy arrays.
+    """
+    input_fn = self._model.input_fn(
+        tf.estimator.ModeKeys.TRAIN,
+        self._config["train"]["batch_size"],
+        self._config["data"],
+        self._config["data"]["train_features_file"],
+        labels_file=self._config["data"]["train_labels_file"],
+        batch_type=self._config["train"].get("batch_type", "examples"),
+        batch_multiplier=batch_multiplier,
+        bucket_width=self._config["train"].get("bucket_width", 5),
+        sample_buffer_size=0,
+        maximum_features_length=self._config["train"].get("maximum_features_length"),
+        maximum_labels_length=self._config["train"].get("maximum_labels_length"))
+    with tf.Graph().as_default():
+      features, labels = input_fn()
+      with tf.Session(config=self._session_config) as sess:
+        sess.run(tf.tables_initializer())
+        return sess.run((features, labels))
+
+  def _time_training_steps(self, batch, params, num_devices, all_reduce, num_steps, warmup_steps):
+    """Runs training steps on a constant batch and returns the step time and
+    the number of tokens processed per second.
+    """
+    model_fn = self._model.model_fn(num_devices=num_devices, all_reduce=all_reduce)
+    session_config = tf.ConfigProto()
+    session_config.CopyFrom(self._session_config)
+    session_config.device_count["CPU"] = max(
+        num_devices, session_config.device_count.get("CPU", 1))
+    with tf.Graph().as_default():
+      tf.train.create_global_step()
+      features, labels = tf.contrib.framework.nest.map_structure(tf.constant, batch)
+      spec = model_fn(
+          features, labels, params, tf.estimator.ModeKeys.TRAIN, self._estimator.config)
+      counters = hooks.get_counters()
+      with tf.Session(config=session_config) as sess:
+        sess.run(tf.global_variables_initializer())
+        sess.run(tf.local_variables_initializer())
+        start_counts = [0 for _ in counters]
+        for _ in range(warmup_steps):
+          _, start_counts = sess.run([spec.train_op, counters])
+        start = time.time()
+        for _ in range(num_steps):
+          _, counts = sess.run([spec.train_op, counters])
+        elapsed = time.time() - start
+    num_tokens = sum(counts) - sum(start_counts)
+    return elapsed / num_steps, num_tokens / elapsed
+
   def infer(self, features_file, predictions_file=None, checkpoint_path=None):
     """Runs inference.
 
     Args:
-      features_file: The file(s) to infer from.
+      features_file: The file(s) to infer from. If ``-``, the lines are read
+        from the standard input and each prediction is written as soon as its
+        batch is decoded.
       predictions_file: If set, predictions are saved in this file.
       checkpoint_path: Path of a specific checkpoint to predict. If ``None``,
-        the latest is used.
+        the latest is used. If a list of paths is set, the predictions are
+        generated by the ensemble of these checkpoints.
     """
     if "infer" not in self._config:
       self._config["infer"] = {}
-    if checkpoint_path is not None and os.path.isdir(checkpoint_path):
-      checkpoint_path = tf.train.latest_checkpoint(checkpoint_path)
+    if isinstance(checkpoint_path, (list, tuple)):
+      checkpoint_path = [_resolve_checkpoint_path(path) for path in checkpoint_path]
+      if len(checkpoint_path) == 1:
+        checkpoint_path = checkpoint_path[0]
+    else:
+      checkpoint_path = _resolve_checkpoint_path(checkpoint_path)
+
+    if features_file == "-":
+      self._infer_stream(
+          sys.stdin, predictions_file=predictions_file, checkpoint_path=checkpoint_path)
+      return
 
     batch_size = self._config["infer"].get("batch_size", 1)
     input_fn = self._model.input_fn(
@@ -203,12 +676,113 @@ class Runner(object):
     else:
       stream = sys.stdout
 
-    for prediction in self._estimator.predict(input_fn=input_fn, checkpoint_path=checkpoint_path):
-      self._model.print_prediction(prediction, params=self._config["infer"], stream=stream)
+    if isinstance(checkpoint_path, list):
+      predictions = self._predict_ensemble(input_fn, checkpoint_path)
+    else:
+      predictions = self._estimator.predict(
+          input_fn=input_fn,
+          checkpoint_path=checkpoint_path,
+          hooks=self._build_profiler_hooks(tf.estimator.ModeKeys.PREDICT))
+
+    # Chunks are formatted by batch, which lets the target tokenizer distribute
+    # the detokenization over infer.detokenization_processes processes.
+    with PredictionWriter(
+        self._model,
+        stream,
+        params=self._config["infer"],
+        chunk_size=max(batch_size, 32)) as writer:
+      for prediction in predictions:
+        writer.write(prediction)
+    self._model.close()
+
+    if predictions_file:
+      stream.close()
+
+  def _infer_stream(self, input_stream, predictions_file=None, checkpoint_path=None):
+    """Runs inference on lines as they arrive on :obj:`input_stream`."""
+    if isinstance(checkpoint_path, list):
+      raise ValueError("Ensemble decoding is not supported when reading from a stream")
+
+    if predictions_file:
+      stream = io.open(predictions_file, encoding="utf-8", mode="w")
+    else:
+      stream = sys.stdout
+
+    with Translator(
+        self._model,
+        self._config,
+        checkpoint_path=checkpoint_path,
+        session_config=self._session_config) as translator:
+      for batch in stream_batches(
+          input_stream,
+          self._config["infer"].get("batch_size", 1),
+          max_latency=self._config["infer"].get("max_latency", 0.1)):
+        self._model.print_predictions(
+            translator.predict_batch(batch), params=self._config["infer"], stream=stream)
+        stream.flush()
+    self._model.close()
 
     if predictions_file:
       stream.close()
 
+  def _predict_ensemble(self, input_fn, checkpoint_paths):
+    """Generates predictions from the ensemble of several checkpoints.
+
+    Each checkpoint is restored in its own variable scope within a single graph
+    and the members are decoded jointly.
+
+    Args:
+      input_fn: The input function.
+      checkpoint_paths: The list of checkpoints to ensemble.
+
+    Returns:
+      A generator over the predictions.
+
+    Raises:
+      ValueError: if the model does not support ensemble decoding.
+    """
+    if not hasattr(self._model, "build_ensemble_predictions"):
+      raise ValueError("Ensemble decoding is not supported by this model")
+
+    scopes = ["ensemble_{}".format(i) for i in range(len(checkpoint_paths))]
+
+    with tf.Graph().as_default():
+      features = input_fn()
+      predictions = self._model.build_ensemble_predictions(
+          features, self._config["params"], scopes)
+
+      moving_average_decay = self._config["params"].get("moving_average_decay")
+      if moving_average_decay is not None:
+        moving_average = tf.train.ExponentialMovingAverage(moving_average_decay)
+      trainable_variables = set(tf.trainable_variables())
+
+      savers = []
+      for scope in scopes:
+        prefix = scope + "/"
+        var_list = {}
+        for variable in tf.global_variables():
+          if not variable.op.name.startswith(prefix):
+            continue
+          if moving_average_decay is not None and variable in trainable_variables:
+            name = moving_average.average_name(variable)
+          else:
+            name = variable.op.name
+          var_list[name[len(prefix):]] = variable
+        savers.append(tf.train.Saver(var_list=var_list))
+
+      with tf.Session(config=self._session_config) as sess:
+        sess.run(tf.tables_initializer())
+        for saver, checkpoint_path in zip(savers, checkpoint_paths):
+          tf.logging.info("Restoring ensemble member from %s", checkpoint_path)
+          saver.restore(sess, checkpoint_path)
+        while True:
+          try:
+            batch = sess.run(predictions)
+          except tf.errors.OutOfRangeError:
+            break
+          for prediction in misc.extract_batches(batch):
+            yield prediction
+
   def export(self, checkpoint_path=None):
     """Exports a model.
 
@@ -218,8 +792,7 @@ class Runner(object):
     Returns:
       The string path to the exported directory.
     """
-    if checkpoint_path is not None and os.path.isdir(checkpoint_path):
-      checkpoint_path = tf.train.latest_checkpoint(checkpoint_path)
+    checkpoint_path = _resolve_checkpoint_path(checkpoint_path)
 
     export_dir = os.path.join(self._estimator.model_dir, "export")
     if not os.path.isdir(export_dir):
@@ -236,3 +809,60 @@ class Runner(object):
         self._model.serving_input_fn(self._config["data"]),
         checkpoint_path=checkpoint_path,
         **kwargs)
+
+  def convert_checkpoint(self, output_dir, checkpoint_path=None):
+    """Converts a checkpoint saved by a previous version to the variables
+    layout of the model.
+
+    See :func:`opennmt.utils.checkpoint.convert_checkpoint`.
+
+    Args:
+      output_dir: The directory of the converted checkpoint.
+      checkpoint_path: The checkpoint to convert. If ``None``, the latest is used.
+
+    Returns:
+      The path to the converted checkpoint.
+
+    Raises:
+      ValueError: if no checkpoint is found.
+    """
+    checkpoint_path = _resolve_checkpoint_path(checkpoint_path)
+    if checkpoint_path is None:
+      checkpoint_path = tf.train.latest_checkpoint(self._estimator.model_dir)
+    if checkpoint_path is None:
+      raise ValueError("No checkpoint found in {}".format(self._estimator.model_dir))
+
+    with tf.Graph().as_default():
+      receiver = self._model.serving_input_fn(self._config["data"])()
+      self._model.model_fn()(
+          receiver.features, None, self._config["params"], tf.estimator.ModeKeys.PREDICT, None)
+      variables = {
+          var.op.name: var.get_shape().as_list() for var in tf.global_variables()}
+
+    output_prefix = os.path.join(output_dir, os.path.basename(checkpoint_path))
+    tf.logging.info("Converting %s to %s", checkpoint_path, output_prefix)
+    return checkpoint.convert_checkpoint(checkpoint_path, output_prefix, variables)
+
+
+def _resolve_checkpoint_path(checkpoint_path):
+  """Returns the latest checkpoint if :obj:`checkpoint_path` is a directory."""
+  if checkpoint_path is not None and os.path.isdir(checkpoint_path):
+    return tf.train.latest_checkpoint(checkpoint_path)
+  return checkpoint_path
+
+def _count_batch_tokens(features, labels):
+  """Returns the number of padded tokens of the longest side of a batch, as
+  counted by the token batching."""
+  return tf.shape(labels["length"])[0] * tf.maximum(
+      tf.reduce_max(features["length"]), tf.reduce_max(labels["length"]))
+
+def _is_better(value, reference, higher_is_better):
+  """Returns ``True`` if :obj:`value` is better than :obj:`reference`."""
+  return value > reference if higher_is_better else value < reference
+
+def _write_json(path, data):
+  """Atomically replaces the JSON file :obj:`path`."""
+  tmp_path = "{}.tmp".format(path)
+  with io.open(tmp_path, encoding="utf-8", mode="w") as json_file:
+    json_file.write(six.text_type(json.dumps(data, indent=2, sort_keys=True)))
+  tf.gfile.Rename(tmp_path, path, overwrite=True)
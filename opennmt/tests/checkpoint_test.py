@@ -0,0 +1,103 @@
+import os
+
+import tensorflow as tf
+import numpy as np
+
+from opennmt.utils import checkpoint
+
+
+class CheckpointTest(tf.test.TestCase):
+
+  def _saveCheckpoints(self, model_dir, values):
+    with tf.Graph().as_default():
+      weight = tf.Variable(tf.zeros([2], dtype=tf.float16), name="weight")
+      global_step = tf.train.get_or_create_global_step()
+      placeholder = tf.placeholder(tf.float16, shape=[2])
+      assign_op = tf.assign(weight, placeholder)
+      saver = tf.train.Saver()
+      with self.test_session() as sess:
+        sess.run(tf.global_variables_initializer())
+        for step, value in values:
+          sess.run(assign_op, feed_dict={placeholder: value})
+          sess.run(tf.assign(global_step, step))
+          saver.save(sess, os.path.join(model_dir, "model.ckpt"), global_step=step)
+
+  def testSelectCheckpoints(self):
+    model_dir = os.path.join(self.get_temp_dir(), "select")
+    self._saveCheckpoints(model_dir, [(step, [0, 0]) for step in (10, 20, 30, 40)])
+    checkpoints_path = checkpoint.select_checkpoints(model_dir, min_step=20, max_step=30)
+    self.assertEqual([20, 30], [checkpoint.get_checkpoint_step(p) for p in checkpoints_path])
+    checkpoints_path = checkpoint.select_checkpoints(model_dir, max_count=1)
+    self.assertEqual([40], [checkpoint.get_checkpoint_step(p) for p in checkpoints_path])
+
+  def testAverageCheckpoints(self):
+    model_dir = os.path.join(self.get_temp_dir(), "average")
+    self._saveCheckpoints(model_dir, [(10, [1, 2]), (20, [3, 6])])
+    checkpoints_path = checkpoint.select_checkpoints(model_dir)
+    output_prefix = os.path.join(self.get_temp_dir(), "average_output", "model.ckpt-20")
+
+    checkpoint.average_checkpoints(checkpoints_path, output_prefix)
+    reader = tf.train.load_checkpoint(output_prefix)
+    weight = reader.get_tensor("weight")
+    self.assertEqual(np.float16, weight.dtype)
+    self.assertAllClose([2, 4], weight)
+    self.assertEqual(20, reader.get_tensor("global_step"))
+
+    checkpoint.average_checkpoints(checkpoints_path, output_prefix, weights=[1, 3])
+    reader = tf.train.load_checkpoint(output_prefix)
+    self.assertAllClose([2.5, 5], reader.get_tensor("weight"))
+
+  def testCopyCheckpoint(self):
+    model_dir = os.path.join(self.get_temp_dir(), "copy")
+    self._saveCheckpoints(model_dir, [(10, [1, 2])])
+    checkpoint_path = os.path.join(model_dir, "model.ckpt-10")
+    output_prefix = os.path.join(self.get_temp_dir(), "copy_output", "model.ckpt-10")
+    self.assertEqual(output_prefix, checkpoint.copy_checkpoint(checkpoint_path, output_prefix))
+    checkpoint.remove_checkpoint(checkpoint_path)
+    self.assertFalse(tf.gfile.Glob("{}.*".format(checkpoint_path)))
+    reader = tf.train.load_checkpoint(output_prefix)
+    self.assertAllClose([1, 2], reader.get_tensor("weight"))
+    self.assertIsNone(checkpoint.copy_checkpoint(checkpoint_path, output_prefix))
+
+  def testExponentialWeights(self):
+    weights = checkpoint.exponential_weights(3, 0.5)
+    self.assertAllClose([1.0 / 7, 2.0 / 7, 4.0 / 7], weights)
+
+  def testConvertCheckpoint(self):
+    writer = checkpoint.CheckpointWriter()
+    checkpoint_path = os.path.join(self.get_temp_dir(), "convert", "model.ckpt-10")
+    embeddings = np.arange(12, dtype=np.float32).reshape(3, 4)
+    writer.save(checkpoint_path, [
+        ("decoder/kernel", embeddings),
+        ("decoder/kernel/Adam", embeddings * 2),
+        ("decoder/kernel/Adafactor", np.zeros([3], dtype=np.float32)),
+        ("decoder/kernel/Adafactor_1", np.ones([4], dtype=np.float32)),
+        ("decoder/bias", np.ones([4], dtype=np.float32)),
+        ("decoder/bias/Adam", np.zeros([4], dtype=np.float32)),
+        ("encoder/dense/kernel", embeddings),
+        ("global_step", np.int64(10))])
+    writer.close()
+
+    variables = {
+        "decoder/kernel": [4, 3],
+        "decoder/projection/bias": [4],
+        "encoder/dense/kernel": [3, 4],
+        "global_step": []
+    }
+    output_prefix = os.path.join(self.get_temp_dir(), "convert_output", "model.ckpt-10")
+    self.assertEqual(
+        output_prefix, checkpoint.convert_checkpoint(checkpoint_path, output_prefix, variables))
+    reader = tf.train.load_checkpoint(output_prefix)
+    self.assertAllEqual(embeddings.T, reader.get_tensor("decoder/kernel"))
+    self.assertAllEqual(embeddings.T * 2, reader.get_tensor("decoder/kernel/Adam"))
+    self.assertAllEqual([1, 1, 1, 1], reader.get_tensor("decoder/kernel/Adafactor"))
+    self.assertAllEqual([0, 0, 0], reader.get_tensor("decoder/kernel/Adafactor_1"))
+    self.assertAllEqual([1, 1, 1, 1], reader.get_tensor("decoder/projection/bias"))
+    self.assertAllEqual([0, 0, 0, 0], reader.get_tensor("decoder/projection/bias/Adam"))
+    self.assertFalse(reader.has_tensor("decoder/bias"))
+    self.assertAllEqual(embeddings, reader.get_tensor("encoder/dense/kernel"))
+    self.assertEqual(10, reader.get_tensor("global_step"))
+
+
+if __name__ == "__main__":
+  tf.test.main()
@@ -0,0 +1,40 @@
+import tensorflow as tf
+import numpy as np
+
+from opennmt.layers import common
+
+
+def _dropout_layer(x):
+  kernel = tf.get_variable("kernel", shape=[6, 6])
+  x = common.dropout(tf.tanh(tf.matmul(x, kernel)), 0.5, training=True)
+  return common.dropout(tf.matmul(x, kernel), 0.3, training=True)
+
+
+class CommonTest(tf.test.TestCase):
+
+  def testRecomputeGradWithDropout(self):
+    inputs = tf.constant(np.random.randn(4, 6).astype(np.float32))
+    with tf.variable_scope("layer"):
+      outputs = common.recompute_grad(_dropout_layer, [inputs])
+    kernel = tf.trainable_variables()[0]
+    gradients = tf.gradients(tf.reduce_sum(outputs), [inputs, kernel])
+
+    # Reference graph that keeps the activations and uses the same dropout seed.
+    seed = outputs.op.inputs[1]
+    with tf.variable_scope("layer", reuse=True):
+      ref_outputs, _ = common._call_and_collect_variables(  # pylint: disable=protected-access
+          _dropout_layer, [inputs], seed)
+    ref_gradients = tf.gradients(tf.reduce_sum(ref_outputs), [inputs, kernel])
+
+    with self.test_session() as sess:
+      sess.run(tf.global_variables_initializer())
+      outputs, gradients, ref_outputs, ref_gradients = sess.run(
+          [outputs, gradients, ref_outputs, ref_gradients])
+      self.assertTrue((outputs == 0).any())
+      self.assertAllClose(ref_outputs, outputs)
+      for ref_gradient, gradient in zip(ref_gradients, gradients):
+        self.assertAllClose(ref_gradient, gradient, atol=1e-5)
+
+
+if __name__ == "__main__":
+  tf.test.main()
@@ -89,6 +89,30 @@ class DataTest(tf.test.TestCase):
     self._testFilterByLength(
         [1, 2], 1, maximum_features_length=[1, 1], maximum_labels_length=1, filtered=True)
 
+  def testInputStatisticsCounters(self):
+    dropped_counter = data.StatisticsCounter()
+    batch_counter = data.StatisticsCounter()
+    dataset = tf.data.Dataset.zip((
+        tf.data.Dataset.range(1, 11), tf.data.Dataset.range(1, 11)))
+    dataset = dataset.apply(data.filter_examples_by_length(
+        maximum_features_length=6,
+        features_length_fn=lambda x: x,
+        labels_length_fn=lambda x: x,
+        dropped_counter=dropped_counter))
+    dataset = dataset.batch(2)
+    dataset = dataset.apply(data.count_batches(batch_counter))
+    next_element = dataset.make_one_shot_iterator().get_next()
+    dropped_examples = dropped_counter.read_op(reset=True)
+
+    with self.test_session() as sess:
+      for _ in range(3):
+        sess.run(next_element)
+      with self.assertRaises(tf.errors.OutOfRangeError):
+        sess.run(next_element)
+      self.assertEqual(3, batch_counter.read())
+      self.assertEqual(4, sess.run(dropped_examples))
+      self.assertEqual(0, sess.run(dropped_examples))
+
   def _testBatchTrainDataset(self, check_fn, batch_size, **kwargs):
     num_examples = 1000
     features = tf.random_normal([num_examples], mean=12, stddev=6, seed=42)
@@ -41,6 +41,14 @@ class DecoderTest(tf.test.TestCase):
       self.assertAlmostEqual(
           1.0 - (1.0 / (1.0 + math.exp(5.0 / 1.0))), sess.run(inv_sig_sample_prob))
 
+  def testTiedOutputLayer(self):
+    embedding = tf.get_variable("kernel", shape=[7, 4])
+    layer = decoder.build_output_layer(4, 7, reuse=True)
+    outputs = layer(tf.ones([2, 3, 4]))
+    self.assertAllEqual([2, 3, 7], outputs.get_shape().as_list())
+    self.assertIs(embedding, layer.kernel)
+    self.assertEqual(2, len(tf.trainable_variables()))
+
 
 if __name__ == "__main__":
   tf.test.main()
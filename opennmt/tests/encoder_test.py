@@ -31,6 +31,40 @@ class EncoderTest(tf.test.TestCase):
       self.assertAllEqual([3, 21, 36], outputs.shape)
       self.assertAllEqual(sequence_length, encoded_length)
 
+  def testSelfAttentionEncoderRecomputeActivations(self):
+    sequence_length = [17, 21, 20]
+    inputs = _build_dummy_sequences(sequence_length, depth=12)
+    encoder = encoders.SelfAttentionEncoder(
+        2,
+        num_units=12,
+        num_heads=4,
+        ffn_inner_dim=20,
+        dropout=0,
+        attention_dropout=0,
+        relu_dropout=0,
+        recompute_activations=True)
+
+    def _encode_and_differentiate(reuse=None):
+      with tf.variable_scope("encoder", reuse=reuse):
+        outputs, _, _ = encoder.encode(
+            inputs, sequence_length=tf.constant(sequence_length))
+      variables = tf.trainable_variables()
+      gradients = tf.gradients(tf.reduce_sum(outputs), [inputs] + variables)
+      return outputs, gradients
+
+    outputs, gradients = _encode_and_differentiate()
+    encoder.recompute_activations = False
+    ref_outputs, ref_gradients = _encode_and_differentiate(reuse=True)
+    self.assertEqual(len(ref_gradients), len(gradients))
+
+    with self.test_session() as sess:
+      sess.run(tf.global_variables_initializer())
+      outputs, gradients, ref_outputs, ref_gradients = sess.run(
+          [outputs, gradients, ref_outputs, ref_gradients])
+      self.assertAllClose(ref_outputs, outputs)
+      for ref_gradient, gradient in zip(ref_gradients, gradients):
+        self.assertAllClose(ref_gradient, gradient, atol=1e-5)
+
   def testConvEncoder(self):
     sequence_length = [17, 21, 20]
     inputs = _build_dummy_sequences(sequence_length)
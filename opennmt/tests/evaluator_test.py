@@ -1,6 +1,7 @@
 import tensorflow as tf
 
 from opennmt.utils import evaluator
+from opennmt.utils import scoring
 
 
 class EvaluatorTest(tf.test.TestCase):
@@ -15,6 +16,35 @@ class EvaluatorTest(tf.test.TestCase):
     score = bleu_evaluator.score("data/toy-ende/tgt-val.txt", "data/toy-ende/tgt-val.txt")
     self.assertEqual(100.0, score)
 
+  def testChrFEvaluator(self):
+    chrf_evaluator = evaluator.ChrFEvaluator()
+    score = chrf_evaluator.score("data/toy-ende/tgt-val.txt", "data/toy-ende/tgt-val.txt")
+    self.assertEqual(100.0, score)
+
+  def testTEREvaluator(self):
+    ter_evaluator = evaluator.TEREvaluator()
+    self.assertFalse(ter_evaluator.higher_is_better)
+    score = ter_evaluator.score_lines(["c d e a b", "the cat sat on the mat"],
+                                      ["a b c d e", "the cat sat"])
+    # One shift in the first sentence and 3 deletions in the second one.
+    self.assertEqual(round(100 * 4.0 / 11, 2), score)
+
+  def testBLEUScore(self):
+    references = ["the cat is on the mat", "there is a cat on the mat"]
+    hypotheses = ["the cat is on the mat", "a cat is on the mat"]
+    self.assertEqual(
+        scoring.bleu(hypotheses, references),
+        scoring.bleu(hypotheses * 600, references * 600, num_processes=2))
+
+  def testScoreLineCountMismatch(self):
+    with self.assertRaises(ValueError):
+      scoring.bleu(["the cat", "a cat"], ["the cat"])
+
+  def testTokenize13a(self):
+    self.assertEqual(
+        "Hello , world . It costs 3.5 - 4 $ !",
+        scoring.tokenize_13a("Hello, world. It costs 3.5-4 $!"))
+
 
 if __name__ == "__main__":
   tf.test.main()
@@ -1,3 +1,6 @@
+import os
+import time
+
 import tensorflow as tf
 
 from opennmt.utils import hooks
@@ -8,13 +11,87 @@ class HooksTest(tf.test.TestCase):
   def testAddCounter(self):
     a = tf.placeholder(tf.int64, shape=[])
     hooks.add_counter("sum_a", a)
-    sum_a = tf.get_collection(hooks._DEFAULT_COUNTERS_COLLECTION)
+    sum_a = hooks.get_counters()
     self.assertIsNotNone(sum_a)
     with self.test_session() as sess:
       sess.run(tf.global_variables_initializer())
       self.assertEqual([6], sess.run(sum_a, feed_dict={a: 6}))
       self.assertEqual([10], sess.run(sum_a, feed_dict={a: 4}))
 
+  def testAsyncCheckpointSaverHook(self):
+    checkpoint_dir = os.path.join(self.get_temp_dir(), "async_checkpoint")
+    global_step = tf.train.get_or_create_global_step()
+    variable = tf.Variable(0.0)
+    train_op = tf.group(
+        tf.assign_add(variable, 1.0),
+        tf.assign_add(global_step, 1))
+    hook = hooks.AsyncCheckpointSaverHook(
+        checkpoint_dir, save_steps=2, keep_checkpoint_max=2)
+    with tf.train.MonitoredSession(hooks=[hook]) as sess:
+      for _ in range(5):
+        sess.run(train_op)
+
+    checkpoint_state = tf.train.get_checkpoint_state(checkpoint_dir)
+    self.assertEqual(2, len(checkpoint_state.all_model_checkpoint_paths))
+    self.assertTrue(checkpoint_state.model_checkpoint_path.endswith("model.ckpt-5"))
+    reader = tf.train.load_checkpoint(checkpoint_state.model_checkpoint_path)
+    self.assertEqual(5, reader.get_tensor(global_step.op.name))
+    self.assertEqual(5.0, reader.get_tensor(variable.op.name))
+
+  def _countStallWarnings(self, save_steps, num_steps, step_time=0):
+    """Runs the asynchronous saver with slow writes and returns the number of
+    logged training stalls.
+    """
+
+    class _SlowCheckpointSaverHook(hooks.AsyncCheckpointSaverHook):
+
+      def _write(self, save_path, values, start):
+        time.sleep(0.2)
+        super(_SlowCheckpointSaverHook, self)._write(save_path, values, start)
+
+    warnings = []
+    def _warning(msg, *args, **kwargs):
+      _ = kwargs
+      warnings.append(msg % args)
+
+    checkpoint_dir = os.path.join(self.get_temp_dir(), "slow_checkpoint_%d" % save_steps)
+    with tf.Graph().as_default():
+      global_step = tf.train.get_or_create_global_step()
+      train_op = tf.assign_add(global_step, 1)
+      hook = _SlowCheckpointSaverHook(checkpoint_dir, save_steps=save_steps)
+      warning = tf.logging.warning
+      tf.logging.warning = _warning
+      try:
+        with tf.train.MonitoredSession(hooks=[hook]) as sess:
+          for _ in range(num_steps):
+            sess.run(train_op)
+            time.sleep(step_time)
+      finally:
+        tf.logging.warning = warning
+    return len([msg for msg in warnings if msg.startswith("Training stalled")])
+
+  def testAsyncCheckpointSaverHookStall(self):
+    # Waiting for the last checkpoint at the end of the training is not a stall.
+    self.assertEqual(0, self._countStallWarnings(100, 3, step_time=0.2))
+    # Requesting a checkpoint while the previous one is written stalls the training.
+    self.assertGreater(self._countStallWarnings(1, 3), 0)
+
+  def testSaveBestModel(self):
+    best_models_dir = os.path.join(self.get_temp_dir(), "best_models")
+    os.makedirs(best_models_dir)
+    checkpoint_path = os.path.join(self.get_temp_dir(), "model.ckpt-10")
+    for suffix in (".index", ".data-00000-of-00001"):
+      with open(checkpoint_path + suffix, "w") as checkpoint_file:
+        checkpoint_file.write("10")
+    hook = hooks.SaveEvaluationPredictionHook(
+        None, None, tf.estimator.ModeKeys.TRAIN, best_models_dir=best_models_dir)
+
+    hook.save_best_model(10, checkpoint_path, [30.5, 50.0], ["BLEU", "TER"], [True, False])
+    self.assertTrue(os.path.exists(
+        os.path.join(best_models_dir, "model.ckpt-10.BLEU-30.5.index")))
+    self.assertTrue(os.path.exists(
+        os.path.join(best_models_dir, "model.ckpt-10.TER-50.0.data-00000-of-00001")))
+
 
 if __name__ == "__main__":
   tf.test.main()
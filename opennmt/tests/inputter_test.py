@@ -203,6 +203,23 @@ class InputterTest(tf.test.TestCase):
       self.assertAllEqual([[2, 1, 4]], features["ids"])
       self.assertAllEqual([1, 3, 10], transformed.shape)
 
+  def testWordEmbedderSparseGradients(self):
+    vocab_file = os.path.join(self.get_temp_dir(), "vocab.txt")
+    with io.open(vocab_file, encoding="utf-8", mode="w") as vocab:
+      vocab.write(u"the\n"
+                  u"world\n"
+                  u"hello\n"
+                  u"toto\n")
+
+    embedder = text_inputter.WordEmbedder("vocabulary_file", embedding_size=10)
+    embedder.initialize({"vocabulary_file": vocab_file})
+    ids = tf.constant([[2, 1, 4]], dtype=tf.int64)
+    outputs = embedder.transform(ids, tf.estimator.ModeKeys.TRAIN)
+    embeddings = tf.trainable_variables()[0]
+    self.assertAllEqual([5, 10], embeddings.get_shape().as_list())
+    gradient = tf.gradients(tf.reduce_sum(outputs), embeddings)[0]
+    self.assertIsInstance(gradient, tf.IndexedSlices)
+
   def testWordEmbedderWithPretrainedEmbeddings(self):
     vocab_file = os.path.join(self.get_temp_dir(), "vocab.txt")
     data_file = os.path.join(self.get_temp_dir(), "data.txt")
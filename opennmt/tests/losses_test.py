@@ -0,0 +1,57 @@
+import tensorflow as tf
+import numpy as np
+
+from opennmt.utils import losses
+
+
+class LossesTest(tf.test.TestCase):
+
+  def testLabelSmoothedCrossEntropy(self):
+    batch_size, max_time, vocab_size = 3, 4, 7
+    label_smoothing = 0.1
+    logits = np.random.randn(batch_size, max_time, vocab_size).astype(np.float32)
+    labels = np.random.randint(vocab_size, size=(batch_size, max_time))
+
+    smoothed_labels = np.full(
+        logits.shape, label_smoothing / (vocab_size - 1), dtype=np.float32)
+    for b in range(batch_size):
+      for t in range(max_time):
+        smoothed_labels[b, t, labels[b, t]] = 1.0 - label_smoothing
+    expected = tf.nn.softmax_cross_entropy_with_logits(
+        logits=tf.constant(logits), labels=tf.constant(smoothed_labels))
+
+    cross_entropy = losses._softmax_cross_entropy(  # pylint: disable=protected-access
+        tf.constant(logits),
+        tf.constant(labels),
+        label_smoothing,
+        tf.estimator.ModeKeys.TRAIN)
+
+    with self.test_session() as sess:
+      expected, cross_entropy = sess.run([expected, cross_entropy])
+      self.assertAllEqual([batch_size, max_time], cross_entropy.shape)
+      self.assertAllClose(expected, cross_entropy, atol=1e-5)
+
+  def testSampledSoftmaxSequenceLoss(self):
+    batch_size, max_time, depth, vocab_size = 3, 4, 5, 20
+    sequence_length = [4, 2, 3]
+    outputs = tf.constant(np.random.randn(batch_size, max_time, depth).astype(np.float32))
+    weights = tf.constant(np.random.randn(vocab_size, depth).astype(np.float32))
+    biases = tf.zeros([vocab_size])
+    labels = tf.constant(np.random.randint(vocab_size, size=(batch_size, max_time)))
+
+    loss, loss_normalizer, loss_token_normalizer = losses.sampled_softmax_sequence_loss(
+        outputs, weights, biases, labels, tf.constant(sequence_length), 5)
+    gradients = tf.gradients(loss, [outputs, weights])
+
+    with self.test_session() as sess:
+      loss, loss_normalizer, loss_token_normalizer, gradients = sess.run(
+          [loss, loss_normalizer, loss_token_normalizer, gradients])
+      self.assertGreater(loss, 0)
+      self.assertEqual(batch_size, loss_normalizer)
+      self.assertEqual(sum(sequence_length), loss_token_normalizer)
+      # Padded positions do not contribute to the gradients.
+      self.assertAllEqual(np.zeros(depth), gradients[0][1][3])
+
+
+if __name__ == "__main__":
+  tf.test.main()
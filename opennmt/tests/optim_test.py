@@ -0,0 +1,212 @@
+import os
+
+import numpy as np
+import tensorflow as tf
+
+from opennmt.utils import optim
+from opennmt.utils import adafactor
+
+
+class _RecordingOptimizer(tf.train.GradientDescentOptimizer):
+  """Gradient descent optimizer that records the applied gradients."""
+
+  def apply_gradients(self, grads_and_vars, global_step=None, name=None):
+    self.gradients = [grad for grad, _ in grads_and_vars]
+    return super(_RecordingOptimizer, self).apply_gradients(
+        grads_and_vars, global_step=global_step, name=name)
+
+
+class OptimTest(tf.test.TestCase):
+
+  def testDelayedUpdate(self):
+    global_step = tf.Variable(0, trainable=False, dtype=tf.int64)
+    optimizer = tf.train.GradientDescentOptimizer(1.0)
+    gradient = tf.placeholder(tf.float32, shape=[2])
+    variable = tf.Variable([1.0, 2.0])
+    train_op, _ = optim.delayed_update(
+        optimizer, [(gradient, variable)], global_step, accum_count=3)
+
+    with self.test_session() as sess:
+      sess.run(tf.global_variables_initializer())
+
+      def _check_step(grad, expected_variable, expected_step):
+        sess.run(train_op, feed_dict={gradient: grad})
+        self.assertAllClose(expected_variable, sess.run(variable))
+        self.assertEqual(expected_step, sess.run(global_step))
+
+      _check_step([3.0, 3.0], [1.0, 2.0], 0)
+      _check_step([4.0, 1.0], [1.0, 2.0], 0)
+      _check_step([-1.0, 0.0], [-1.0, 2.0 - 4.0 / 3.0], 1)
+      _check_step([-3.0, 0.0], [-1.0, 2.0 - 4.0 / 3.0], 1)
+      _check_step([0.0, 0.0], [-1.0, 2.0 - 4.0 / 3.0], 1)
+      _check_step([0.0, 3.0], [0.0, 1.0 - 4.0 / 3.0], 2)
+
+  def testDelayedUpdateSparse(self):
+    global_step = tf.Variable(0, trainable=False, dtype=tf.int64)
+    optimizer = _RecordingOptimizer(1.0)
+    ids = tf.placeholder(tf.int32, shape=[None])
+    variable = tf.Variable(tf.ones([4, 3]))
+    loss = tf.reduce_sum(tf.nn.embedding_lookup(variable, ids))
+    gradients = optimizer.compute_gradients(loss, var_list=[variable])
+    train_op, applied = optim.delayed_update(
+        optimizer, gradients, global_step, accum_count=2)
+    # The accumulated gradient is still applied row-wise.
+    self.assertIsInstance(optimizer.gradients[0], tf.IndexedSlices)
+
+    with self.test_session() as sess:
+      sess.run(tf.global_variables_initializer())
+      _, is_applied = sess.run([train_op, applied], feed_dict={ids: [1]})
+      self.assertFalse(is_applied)
+      self.assertAllEqual(sess.run(tf.ones([4, 3])), sess.run(variable))
+      _, is_applied = sess.run([train_op, applied], feed_dict={ids: [3, 3]})
+      self.assertTrue(is_applied)
+      self.assertAllClose(
+          [[1.0] * 3, [0.5] * 3, [1.0] * 3, [0.0] * 3], sess.run(variable))
+      # Rows touched in the previous accumulation are reset.
+      sess.run(train_op, feed_dict={ids: [0]})
+      sess.run(train_op, feed_dict={ids: [0]})
+      self.assertAllClose(
+          [[0.0] * 3, [0.5] * 3, [1.0] * 3, [0.0] * 3], sess.run(variable))
+
+  def testFloat32VariableStorage(self):
+    with tf.variable_scope("model", custom_getter=optim.float32_variable_storage_getter):
+      weight = tf.get_variable("weight", shape=[2], dtype=tf.float16)
+      step = tf.get_variable(
+          "step", shape=[], dtype=tf.float16, trainable=False)
+    self.assertEqual(tf.float16, weight.dtype)
+    self.assertEqual(tf.float32, tf.trainable_variables()[0].dtype.base_dtype)
+    self.assertEqual(tf.float16, step.dtype.base_dtype)
+
+  def testDynamicLossScaling(self):
+    global_step = tf.Variable(0, trainable=False, dtype=tf.int64)
+    optimizer = tf.train.GradientDescentOptimizer(1.0)
+    factor = tf.placeholder(tf.float32, shape=[])
+    variable = tf.Variable([1.0, 2.0])
+    loss = tf.reduce_sum(variable * factor)
+    gradients, skip_update, loss_scale_op = optim.scaled_gradients(
+        optimizer, loss, initial_scale=4, increment_period=2)
+    train_op = tf.group(
+        optim.delayed_update(optimizer, gradients, global_step, skip_update=skip_update)[0],
+        loss_scale_op)
+    with tf.variable_scope(tf.get_variable_scope(), reuse=True):
+      loss_scale = tf.get_variable("loss_scale")
+
+    with self.test_session() as sess:
+      sess.run(tf.global_variables_initializer())
+
+      def _check_step(value, expected_variable, expected_step, expected_scale):
+        sess.run(train_op, feed_dict={factor: value})
+        self.assertAllClose(expected_variable, sess.run(variable))
+        self.assertEqual(expected_step, sess.run(global_step))
+        self.assertEqual(expected_scale, sess.run(loss_scale))
+
+      _check_step(1.0, [0.0, 1.0], 1, 4.0)
+      _check_step(float("inf"), [0.0, 1.0], 1, 2.0)
+      _check_step(1.0, [-1.0, 0.0], 2, 2.0)
+      _check_step(1.0, [-2.0, -1.0], 3, 4.0)
+
+  def _testSparseUpdate(self, optimizer):
+    variable = tf.Variable(tf.ones([4, 3]))
+    outputs = tf.nn.embedding_lookup(variable, [1, 3, 1])
+    gradients = optimizer.compute_gradients(tf.reduce_sum(outputs), var_list=[variable])
+    self.assertIsInstance(gradients[0][0], tf.IndexedSlices)
+    train_op = optimizer.apply_gradients(gradients)
+
+    with self.test_session() as sess:
+      sess.run(tf.global_variables_initializer())
+      sess.run(train_op)
+      value = sess.run(variable)
+      self.assertAllEqual([1.0, 1.0, 1.0], value[0])
+      self.assertAllEqual([1.0, 1.0, 1.0], value[2])
+      self.assertTrue((value[1] < 1.0).all())
+      self.assertTrue((value[3] < 1.0).all())
+
+  def _testSparseUpdateMatchesDense(self, optimizer):
+    initial_value = np.random.uniform(-1.0, 1.0, size=[6, 3]).astype(np.float32)
+    indices = [1, 4]
+    values = np.random.uniform(-1.0, 1.0, size=[2, 3]).astype(np.float32)
+    dense_value = np.zeros_like(initial_value)
+    dense_value[indices] = values
+    sparse_variable = tf.Variable(initial_value)
+    dense_variable = tf.Variable(initial_value)
+    sparse_gradient = tf.IndexedSlices(
+        tf.constant(values), tf.constant(indices), dense_shape=tf.constant([6, 3]))
+    train_op = optimizer.apply_gradients([
+        (sparse_gradient, sparse_variable),
+        (tf.constant(dense_value), dense_variable)])
+
+    with self.test_session() as sess:
+      sess.run(tf.global_variables_initializer())
+      sess.run(train_op)
+      sparse_value, dense_value = sess.run([sparse_variable, dense_variable])
+      self.assertAllClose(dense_value[indices], sparse_value[indices])
+
+  def testAdafactorSparseUpdateMatchesDense(self):
+    self._testSparseUpdateMatchesDense(adafactor.AdafactorOptimizer(
+        learning_rate=0.1, clipping_threshold=0.1))
+
+  def testAdafactorSparseUpdateMatchesDenseNotFactored(self):
+    self._testSparseUpdateMatchesDense(adafactor.AdafactorOptimizer(
+        learning_rate=0.1, clipping_threshold=0.1, factored=False))
+
+  def testMovingAverage(self):
+    params = {
+        "optimizer": "GradientDescentOptimizer",
+        "learning_rate": 1.0,
+        "moving_average_decay": 0.5
+    }
+    checkpoint_path = os.path.join(self.get_temp_dir(), "model.ckpt")
+
+    with tf.Graph().as_default():
+      variable = tf.get_variable("variable", initializer=tf.constant([1.0, 2.0]))
+      train_op = optim.optimize(tf.reduce_sum(variable), params)
+      saver = tf.train.Saver()
+      with self.test_session() as sess:
+        sess.run(tf.global_variables_initializer())
+        sess.run(train_op)
+        self.assertAllClose([0.0, 1.0], sess.run(variable))
+        saver.save(sess, checkpoint_path)
+
+    with tf.Graph().as_default():
+      variable = tf.get_variable("variable", shape=[2])
+      saver = optim.moving_average_saver(params)
+      with self.test_session() as sess:
+        saver.restore(sess, checkpoint_path)
+        # The average is updated after the step increment with the decay
+        # min(0.5, (1 + step) / (10 + step)) = 2 / 11.
+        decay = 2.0 / 11.0
+        self.assertAllClose([decay, 1.0 + decay], sess.run(variable))
+
+  def testMovingAverageDelayedUpdate(self):
+    params = {
+        "optimizer": "GradientDescentOptimizer",
+        "learning_rate": 1.0,
+        "gradients_accum": 2,
+        "moving_average_decay": 0.5
+    }
+    variable = tf.get_variable("variable", initializer=tf.constant([1.0, 2.0]))
+    train_op = optim.optimize(tf.reduce_sum(variable), params)
+    average = [v for v in tf.global_variables()
+               if v.op.name == "variable/ExponentialMovingAverage"][0]
+    with self.test_session() as sess:
+      sess.run(tf.global_variables_initializer())
+      # The average is not updated on the accumulation step.
+      sess.run(train_op)
+      self.assertAllClose([1.0, 2.0], sess.run(variable))
+      self.assertAllClose([1.0, 2.0], sess.run(average))
+      sess.run(train_op)
+      self.assertAllClose([0.0, 1.0], sess.run(variable))
+      decay = 2.0 / 11.0
+      self.assertAllClose([decay, 1.0 + decay], sess.run(average))
+
+  def testAdafactorSparseUpdate(self):
+    self._testSparseUpdate(adafactor.AdafactorOptimizer(
+        learning_rate=0.1, decay_rate=0.8, beta1=0.9))
+
+  def testAdafactorSparseUpdateNotFactored(self):
+    self._testSparseUpdate(adafactor.AdafactorOptimizer(
+        learning_rate=0.1, decay_rate=0.8, factored=False))
+
+
+if __name__ == "__main__":
+  tf.test.main()
@@ -0,0 +1,64 @@
+import tensorflow as tf
+
+from opennmt.utils import parallel
+
+
+class ParallelTest(tf.test.TestCase):
+
+  def _session(self, num_devices):
+    config = tf.ConfigProto(device_count={"CPU": num_devices})
+    return self.test_session(config=config)
+
+  def _testAllReduce(self, algorithm, num_devices):
+    devices = ["/cpu:{}".format(i) for i in range(num_devices)]
+    tensors = []
+    for i, device in enumerate(devices):
+      with tf.device(device):
+        tensors.append(tf.fill([3, 5], float(i + 1)))
+    reduced = parallel.all_reduce(tensors, devices, algorithm=algorithm)
+    self.assertEqual(num_devices, len(reduced))
+    expected = sum(range(1, num_devices + 1))
+    with self._session(num_devices) as sess:
+      for value in sess.run(reduced):
+        self.assertAllEqual([3, 5], value.shape)
+        self.assertAllClose(expected, value[0][0])
+        self.assertAllClose(expected, value[-1][-1])
+
+  def testRingAllReduce(self):
+    self._testAllReduce("ring", 1)
+    self._testAllReduce("ring", 2)
+    self._testAllReduce("ring", 4)
+
+  def testHierarchicalAllReduce(self):
+    self._testAllReduce("hierarchical", 3)
+    self._testAllReduce("hierarchical", 4)
+
+  def testInvalidAllReduce(self):
+    with self.assertRaises(ValueError):
+      parallel.all_reduce([tf.constant(1.0)], ["/cpu:0"], algorithm="foo")
+
+  def testAllReduceGradients(self):
+    devices = ["/cpu:0", "/cpu:1"]
+    replica_gradients = []
+    for i, device in enumerate(devices):
+      with tf.device(device):
+        replica_gradients.append([
+            tf.fill([2, 2], float(i + 1)),
+            None,
+            tf.IndexedSlices(
+                tf.fill([1, 3], float(i + 1)),
+                tf.constant([i]),
+                dense_shape=tf.constant([4, 3])),
+            tf.fill([3], float(i + 1))])
+    summed = parallel.all_reduce_gradients(replica_gradients, devices)
+    self.assertIsNone(summed[1])
+    self.assertIsInstance(summed[2], tf.IndexedSlices)
+    with self._session(2) as sess:
+      dense_a, indices, dense_b = sess.run([summed[0], summed[2].indices, summed[3]])
+      self.assertAllClose([[3.0, 3.0], [3.0, 3.0]], dense_a)
+      self.assertAllEqual([0, 1], indices)
+      self.assertAllClose([3.0, 3.0, 3.0], dense_b)
+
+
+if __name__ == "__main__":
+  tf.test.main()
@@ -0,0 +1,78 @@
+import os
+
+import tensorflow as tf
+
+from opennmt.utils import hooks
+from opennmt.utils import profiler
+
+
+class ProfilerTest(tf.test.TestCase):
+
+  def testStepProfilerHook(self):
+    output_dir = os.path.join(self.get_temp_dir(), "profile")
+    x = tf.random_uniform([8, 16])
+    y = tf.matmul(x, x, transpose_b=True, name="product")
+    hook = hooks.StepProfilerHook(output_dir, [2], use_global_step=False)
+    with tf.train.MonitoredSession(hooks=[hook]) as sess:
+      for _ in range(3):
+        sess.run(y)
+    self.assertTrue(os.path.exists(os.path.join(output_dir, "timeline-2.json")))
+    self.assertFalse(os.path.exists(os.path.join(output_dir, "timeline-1.json")))
+    with open(os.path.join(output_dir, "ops-2.txt")) as report_file:
+      self.assertIn("MatMul", report_file.read())
+
+  def testStepProfilerHookGlobalStep(self):
+    output_dir = os.path.join(self.get_temp_dir(), "profile_global_step")
+    global_step = tf.train.get_or_create_global_step()
+    train_op = tf.assign_add(global_step, 1)
+    hook = hooks.StepProfilerHook(output_dir, [1, 3])
+    with tf.train.MonitoredSession(hooks=[hook]) as sess:
+      for _ in range(3):
+        sess.run(train_op)
+    self.assertTrue(os.path.exists(os.path.join(output_dir, "timeline-1.json")))
+    self.assertFalse(os.path.exists(os.path.join(output_dir, "timeline-2.json")))
+    self.assertTrue(os.path.exists(os.path.join(output_dir, "timeline-3.json")))
+
+  def testAggregateStepStats(self):
+    x = tf.random_uniform([8, 16])
+    y = tf.matmul(x, x, transpose_b=True, name="product")
+    run_metadata = tf.RunMetadata()
+    with self.test_session() as sess:
+      sess.run(
+          y,
+          options=tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE),
+          run_metadata=run_metadata)
+    op_stats = profiler.aggregate_step_stats(run_metadata.step_stats)
+    self.assertIn("product", [op.name for op in op_stats])
+    type_stats = profiler.aggregate_step_stats(run_metadata.step_stats, by_type=True)
+    self.assertIn("MatMul", [op.name for op in type_stats])
+
+  def testGetGraphSection(self):
+    self.assertEqual(
+        "encoder", profiler.get_graph_section("transformer/encoder/layer_0/MatMul"))
+    self.assertEqual(
+        "decoder", profiler.get_graph_section("parallel_0/transformer/decoder/dense/BiasAdd"))
+    self.assertEqual("loss", profiler.get_graph_section("transformer/loss/Sum"))
+    self.assertEqual(
+        "decoder_gradients",
+        profiler.get_graph_section("optim/gradients/transformer/decoder/dense/MatMul_grad/MatMul"))
+    self.assertEqual(
+        "optimizer",
+        profiler.get_graph_section("optim/update_transformer/encoder/w/ApplyAdam"))
+    self.assertEqual("other", profiler.get_graph_section("global_step/add"))
+
+  def testPeakMemoryByDevice(self):
+    x = tf.random_uniform([256, 256])
+    y = tf.reduce_sum(tf.matmul(x, x))
+    run_metadata = tf.RunMetadata()
+    with self.test_session() as sess:
+      sess.run(
+          y,
+          options=tf.RunOptions(trace_level=tf.RunOptions.SOFTWARE_TRACE),
+          run_metadata=run_metadata)
+    peaks = profiler.peak_memory_by_device(run_metadata.step_stats)
+    self.assertGreaterEqual(max(peaks.values()), 256 * 256 * 4)
+
+
+if __name__ == "__main__":
+  tf.test.main()
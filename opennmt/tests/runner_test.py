@@ -0,0 +1,176 @@
+import json
+import os
+
+import tensorflow as tf
+
+from opennmt import runner as runner_module
+from opennmt.runner import Runner
+from opennmt.tests import test_util
+
+
+class RunnerTest(tf.test.TestCase):
+
+  def _makeConfig(self):
+    data_dir = os.path.join(self.get_temp_dir(), "runner_data")
+    data_config = test_util.make_data_config(data_dir, ["a", "b"])
+    features_path = os.path.join(data_dir, "src.txt")
+    labels_path = os.path.join(data_dir, "tgt.txt")
+    with open(features_path, "w") as features_file, open(labels_path, "w") as labels_file:
+      for length in range(1, 26):
+        features_file.write("%s\n" % " ".join(["a"] * length))
+        labels_file.write("%s\n" % " ".join(["b"] * length))
+    return {
+        "model_dir": os.path.join(self.get_temp_dir(), "runner_model"),
+        "data": dict(
+            data_config,
+            train_features_file=features_path,
+            train_labels_file=labels_path),
+        "params": {
+            "optimizer": "GradientDescentOptimizer",
+            "learning_rate": 1.0
+        },
+        "train": {
+            "bucket_width": 5
+        }
+    }
+
+  def _batchTokens(self, runner, batch_size, features_file, labels_file, num_batches):
+    with tf.Graph().as_default():
+      features, labels = runner._dry_run_input_fn(  # pylint: disable=protected-access
+          batch_size, features_file, labels_file)()
+      batch_tokens = runner_module._count_batch_tokens(  # pylint: disable=protected-access
+          features, labels)
+      with self.test_session() as sess:
+        sess.run(tf.tables_initializer())
+        return [sess.run(batch_tokens) for _ in range(num_batches)]
+
+  def testDryRunBatchesAreFull(self):
+    runner = Runner(test_util.make_rnn_model(), self._makeConfig())
+    batch_size = 512
+    output_dir = os.path.join(self.get_temp_dir(), "dry_run")
+    tf.gfile.MakeDirs(output_dir)
+
+    # Without repetitions, the longest examples only form partial batches.
+    features_file, labels_file = runner._write_longest_examples(  # pylint: disable=protected-access
+        output_dir, 0, num_examples=10)
+    tokens = self._batchTokens(runner, batch_size, features_file, labels_file, 1)
+    self.assertLess(tokens[0], batch_size // 2)
+
+    features_file, labels_file = runner._write_longest_examples(  # pylint: disable=protected-access
+        output_dir, batch_size * 3, num_examples=10)
+    for tokens in self._batchTokens(runner, batch_size, features_file, labels_file, 2):
+      self.assertGreaterEqual(tokens, batch_size // 2)
+
+  def testBenchmark(self):
+    config = self._makeConfig()
+    config["model_dir"] = os.path.join(self.get_temp_dir(), "benchmark")
+    config["train"]["batch_size"] = 4
+    runner = Runner(test_util.make_rnn_model(), config, num_devices=2)
+    results = runner.benchmark(num_steps=1, warmup_steps=0)
+    self.assertListEqual([1, 2], [result["num_devices"] for result in results])
+    for result in results:
+      self.assertEqual("config", result["optimizer"])
+      self.assertGreater(result["step_time_sec"], 0)
+      self.assertGreater(result["tokens_per_sec"], 0)
+      self.assertGreater(result["scaling_efficiency"], 0)
+    self.assertEqual(1.0, results[0]["scaling_efficiency"])
+    with self.assertRaises(ValueError):
+      runner.benchmark(num_steps=0)
+
+  def testContinuousEvaluate(self):
+    config = self._makeConfig()
+    config["model_dir"] = os.path.join(self.get_temp_dir(), "continuous_eval")
+    config["data"]["eval_features_file"] = config["data"]["train_features_file"]
+    config["data"]["eval_labels_file"] = config["data"]["train_labels_file"]
+    config["params"] = {"optimizer": "AdamOptimizer", "learning_rate": 0.01}
+    config["train"].update({"batch_size": 8, "train_steps": 1})
+    config["eval"] = {"batch_size": 32, "external_evaluators": "BLEU"}
+    eval_dir = os.path.join(config["model_dir"], "eval")
+    best_dir = os.path.join(eval_dir, "best")
+
+    # Evaluate the first checkpoint and stop when no new checkpoint is saved.
+    Runner(test_util.make_rnn_model(), config).train()
+    config["train"]["train_steps"] = 50
+    best = Runner(test_util.make_rnn_model(), config).continuous_evaluate(timeout=1)
+    self.assertEqual(1, best["step"])
+    self.assertEqual("loss", best["metric"])
+    self.assertEqual(best["metrics"]["loss"], best["value"])
+    self.assertIn("BLEU", best["metrics"])
+    self.assertTrue(os.path.exists(os.path.join(best_dir, "model.ckpt-1.index")))
+
+    # After a restart, the previous best checkpoint is reloaded and replaced by
+    # the better trained checkpoint. The evaluation stops at the last step.
+    Runner(test_util.make_rnn_model(), config).train()
+    new_best = Runner(test_util.make_rnn_model(), config).continuous_evaluate()
+    self.assertEqual(50, new_best["step"])
+    self.assertLess(new_best["value"], best["value"])
+    self.assertFalse(os.path.exists(os.path.join(best_dir, "model.ckpt-1.index")))
+    self.assertTrue(os.path.exists(os.path.join(best_dir, "model.ckpt-50.index")))
+    with open(os.path.join(eval_dir, "best_checkpoint.json")) as metadata_file:
+      self.assertDictEqual(new_best, json.load(metadata_file))
+    self.assertTrue(runner_module._is_better(2, 1, True))  # pylint: disable=protected-access
+    self.assertTrue(runner_module._is_better(1, 2, False))  # pylint: disable=protected-access
+
+  def _makeInferenceConfig(self, name):
+    model_dir = os.path.join(self.get_temp_dir(), name)
+    config = {
+        "model_dir": model_dir,
+        "data": test_util.make_data_config(model_dir, ["a", "b", "c"]),
+        "params": {
+            "beam_width": 2,
+            "maximum_iterations": 5,
+            "moving_average_decay": 0.999
+        },
+        "infer": {
+            "batch_size": 2
+        }
+    }
+    features_path = os.path.join(model_dir, "src.txt")
+    with open(features_path, "w") as features_file:
+      for line in ["a b c", "b", "c a", "a a b"]:
+        features_file.write("%s\n" % line)
+    return config, features_path
+
+  def _readLines(self, path):
+    with open(path) as lines_file:
+      return lines_file.readlines()
+
+  def testInferEnsemble(self):
+    config, features_path = self._makeInferenceConfig("ensemble")
+    checkpoint_path = test_util.save_checkpoint(
+        test_util.make_transformer_model(),
+        config,
+        os.path.join(config["model_dir"], "model.ckpt"))
+
+    single_path = os.path.join(config["model_dir"], "single.txt")
+    runner = Runner(test_util.make_transformer_model(), config)
+    runner.infer(features_path, predictions_file=single_path, checkpoint_path=checkpoint_path)
+
+    # The average of identical members is the single model.
+    ensemble_path = os.path.join(config["model_dir"], "ensemble.txt")
+    runner = Runner(test_util.make_transformer_model(), config)
+    runner.infer(
+        features_path,
+        predictions_file=ensemble_path,
+        checkpoint_path=[checkpoint_path, checkpoint_path])
+
+    single_lines = self._readLines(single_path)
+    self.assertEqual(4, len(single_lines))
+    self.assertListEqual(single_lines, self._readLines(ensemble_path))
+
+  def testInferEnsembleUnsupportedDecoder(self):
+    config, features_path = self._makeInferenceConfig("ensemble_rnn")
+    checkpoint_path = test_util.save_checkpoint(
+        test_util.make_rnn_model(),
+        config,
+        os.path.join(config["model_dir"], "model.ckpt"))
+    runner = Runner(test_util.make_rnn_model(), config)
+    with self.assertRaises(ValueError):
+      runner.infer(
+          features_path,
+          predictions_file=os.path.join(config["model_dir"], "ensemble.txt"),
+          checkpoint_path=[checkpoint_path, checkpoint_path])
+
+
+if __name__ == "__main__":
+  tf.test.main()
@@ -0,0 +1,99 @@
+import json
+import os
+import threading
+
+from six.moves import urllib
+
+import tensorflow as tf
+
+from opennmt.utils import serving
+
+
+class ServingTest(tf.test.TestCase):
+
+  def testDynamicBatcherBuckets(self):
+    batches = []
+    def _translate_fn(texts):
+      batches.append(list(texts))
+      return [text.upper() for text in texts]
+
+    # The clock is frozen so that a bucket is only translated when it is full.
+    batcher = serving.DynamicBatcher(
+        _translate_fn, max_batch_size=3, max_latency=1, bucket_width=2, clock=lambda: 0)
+    texts = ["a b c d e f" if i % 2 else "a" for i in range(6)]
+    results = [None] * len(texts)
+
+    def _request(i):
+      results[i] = batcher.translate([texts[i]])[0]
+
+    threads = [threading.Thread(target=_request, args=(i,)) for i in range(len(texts))]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    batcher.stop()
+
+    self.assertListEqual([text.upper() for text in texts], results)
+    self.assertEqual(2, len(batches))
+    for batch in batches:
+      self.assertEqual(3, len(batch))
+      self.assertEqual(1, len(set(batch)))
+
+  def testDynamicBatcherMaxBatchSize(self):
+    batches = []
+    def _translate_fn(texts):
+      batches.append(len(texts))
+      return texts
+
+    batcher = serving.DynamicBatcher(_translate_fn, max_batch_size=3, max_latency=10)
+    self.assertListEqual(["a"] * 6, batcher.translate(["a"] * 6))
+    batcher.stop()
+    self.assertListEqual([3, 3], batches)
+
+  def testDynamicBatcherError(self):
+    def _translate_fn(texts):
+      raise ValueError("failure")
+
+    batcher = serving.DynamicBatcher(_translate_fn, max_latency=0)
+    with self.assertRaises(ValueError):
+      batcher.translate(["a"])
+    batcher.stop()
+
+  def testServer(self):
+    batcher = serving.DynamicBatcher(lambda texts: [text[::-1] for text in texts])
+    server = serving.make_server(batcher, port=0)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+      request = urllib.request.Request(
+          "http://localhost:{}/translate".format(server.server_address[1]),
+          data=json.dumps({"src": ["a b", "c"]}).encode("utf-8"))
+      response = urllib.request.urlopen(request)
+      body = json.loads(response.read().decode("utf-8"))
+      self.assertListEqual(["b a", "c"], body["tgt"])
+    finally:
+      server.shutdown()
+      server.server_close()
+      thread.join()
+      batcher.stop()
+
+  def testStreamBatches(self):
+    read_fd, write_fd = os.pipe()
+    input_stream = os.fdopen(read_fd, "r")
+    output_stream = os.fdopen(write_fd, "w")
+    batches = serving.stream_batches(input_stream, 3, max_latency=0.05)
+
+    output_stream.write("a\nb\n")
+    output_stream.flush()
+    self.assertListEqual(["a", "b"], next(batches))
+    output_stream.write("c\nd\ne\nf\n")
+    output_stream.close()
+    self.assertListEqual(["c", "d", "e"], next(batches))
+    self.assertListEqual(["f"], next(batches))
+    with self.assertRaises(StopIteration):
+      next(batches)
+    input_stream.close()
+
+
+if __name__ == "__main__":
+  tf.test.main()
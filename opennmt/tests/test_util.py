@@ -0,0 +1,78 @@
+"""Helpers shared by the tests."""
+
+import os
+
+import tensorflow as tf
+
+from opennmt import constants
+from opennmt import decoders
+from opennmt import encoders
+from opennmt import inputters
+from opennmt.layers import bridge
+from opennmt.models.sequence_to_sequence import SequenceToSequence
+from opennmt.models.transformer import Transformer
+
+
+def make_rnn_model():
+  """Returns a small RNN sequence to sequence model."""
+  return SequenceToSequence(
+      inputters.WordEmbedder("source_words_vocabulary", embedding_size=8),
+      inputters.WordEmbedder("target_words_vocabulary", embedding_size=8),
+      encoders.UnidirectionalRNNEncoder(1, 16, dropout=0),
+      decoders.RNNDecoder(1, 16, bridge=bridge.CopyBridge(), dropout=0))
+
+def make_transformer_model():
+  """Returns a small Transformer model."""
+  return Transformer(
+      inputters.WordEmbedder("source_words_vocabulary", embedding_size=8),
+      inputters.WordEmbedder("target_words_vocabulary", embedding_size=8),
+      num_layers=1,
+      num_units=8,
+      num_heads=2,
+      ffn_inner_dim=16,
+      dropout=0,
+      attention_dropout=0,
+      relu_dropout=0)
+
+def make_data_config(directory, tokens):
+  """Writes a vocabulary of :obj:`tokens` in :obj:`directory` and returns the
+  data configuration that uses it on both sides.
+  """
+  tf.gfile.MakeDirs(directory)
+  vocab_path = os.path.join(directory, "vocab.txt")
+  with open(vocab_path, "w") as vocab_file:
+    for token in [constants.PADDING_TOKEN,
+                  constants.START_OF_SENTENCE_TOKEN,
+                  constants.END_OF_SENTENCE_TOKEN] + list(tokens):
+      vocab_file.write("%s\n" % token)
+  return {
+      "source_words_vocabulary": vocab_path,
+      "target_words_vocabulary": vocab_path
+  }
+
+def save_checkpoint(model, config, checkpoint_prefix, global_step=0):
+  """Saves randomly initialized weights of :obj:`model` and returns the
+  checkpoint path.
+
+  If ``moving_average_decay`` is set in the parameters, the moving averages are
+  also saved with values that differ from the weights.
+  """
+  with tf.Graph().as_default():
+    step = tf.train.create_global_step()
+    receiver = model.serving_input_fn(config["data"])()
+    model.model_fn()(
+        receiver.features, None, config["params"], tf.estimator.ModeKeys.PREDICT, None)
+    average_ops = []
+    moving_average_decay = config["params"].get("moving_average_decay")
+    if moving_average_decay is not None:
+      moving_average = tf.train.ExponentialMovingAverage(moving_average_decay)
+      variables = tf.trainable_variables()
+      moving_average.apply(variables)
+      for variable in variables:
+        average = moving_average.average(variable)
+        average_ops.append(tf.assign(average, tf.random_normal(tf.shape(average))))
+    with tf.Session() as sess:
+      sess.run(tf.global_variables_initializer())
+      sess.run(average_ops)
+      sess.run(tf.assign(step, global_step))
+      return tf.train.Saver().save(sess, checkpoint_prefix, global_step=global_step)
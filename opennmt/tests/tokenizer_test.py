@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 import tensorflow as tf
+import numpy as np
 
 from opennmt.tokenizers import SpaceTokenizer, CharacterTokenizer, OpenNMTTokenizer
 
@@ -50,8 +51,15 @@ class TokenizerTest(tf.test.TestCase):
     text = tokenizer.detokenize(tokens)
     self.assertAllEqual(ref_text, text)
 
+  def _testDetokenizerOnBatch(self, tokenizer, tokens, ref_text):
+    ref_text = [tf.compat.as_text(t) for t in ref_text]
+    tokens = [np.array([tf.compat.as_bytes(token) for token in tok]) for tok in tokens]
+    text = tokenizer.detokenize_batch(tokens)
+    self.assertListEqual(ref_text, text)
+
   def _testDetokenizer(self, tokenizer, tokens, ref_text):
     self._testDetokenizerOnBatchTensor(tokenizer, tokens, ref_text)
+    self._testDetokenizerOnBatch(tokenizer, tokens, ref_text)
     for tok, ref in zip(tokens, ref_text):
       self._testDetokenizerOnTensor(tokenizer, tok, ref)
       self._testDetokenizerOnString(tokenizer, tok, ref)
@@ -75,6 +83,16 @@ class TokenizerTest(tf.test.TestCase):
         [["Hello", "world", "￭!"], ["Test"], ["My", "name"]],
         ["Hello world!", "Test", "My name"])
 
+  def testOpenNMTTokenizerDetokenizeBatchWithProcesses(self):
+    tokens = [["Hello", "world", "￭!"], ["Test"], ["My", "name"]] * 4
+    ref_text = ["Hello world!", "Test", "My name"] * 4
+    tokenizer = OpenNMTTokenizer(num_processes=2)
+    self._testDetokenizerOnBatch(tokenizer, tokens, ref_text)
+    tokenizer.close()
+    # The processes are started again on the next batch.
+    self.assertListEqual(ref_text, tokenizer.detokenize_batch(tokens, num_processes=3))
+    tokenizer.close()
+
 
 if __name__ == "__main__":
   tf.test.main()
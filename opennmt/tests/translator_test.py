@@ -0,0 +1,53 @@
+import os
+
+import six
+
+import tensorflow as tf
+
+from opennmt.tests import test_util
+from opennmt.translator import Translator
+
+
+class TranslatorTest(tf.test.TestCase):
+
+  def _makeConfig(self):
+    model_dir = os.path.join(self.get_temp_dir(), "translator")
+    return {
+        "model_dir": model_dir,
+        "data": test_util.make_data_config(model_dir, ["a", "b", "c"]),
+        "params": {
+            "beam_width": 2,
+            "maximum_iterations": 5
+        }
+    }
+
+  def testTranslateBatch(self):
+    model = test_util.make_rnn_model()
+    config = self._makeConfig()
+    test_util.save_checkpoint(model, config, os.path.join(config["model_dir"], "model.ckpt"))
+
+    texts = ["a b c", "b", "c a"]
+    with Translator(model, config) as translator:
+      self.assertListEqual([], translator.predict_batch([]))
+
+      predictions = translator.predict_batch(texts)
+      self.assertEqual(len(texts), len(predictions))
+      for prediction in predictions:
+        # One hypothesis per beam.
+        self.assertEqual(2, prediction["tokens"].shape[0])
+        self.assertLessEqual(prediction["length"][0], config["params"]["maximum_iterations"])
+
+      translations = translator.translate_batch(texts)
+      self.assertEqual(len(texts), len(translations))
+      for translation in translations:
+        self.assertIsInstance(translation, six.string_types)
+
+  def testMissingCheckpoint(self):
+    config = self._makeConfig()
+    config["model_dir"] = os.path.join(self.get_temp_dir(), "empty")
+    with self.assertRaises(ValueError):
+      Translator(test_util.make_rnn_model(), config)
+
+
+if __name__ == "__main__":
+  tf.test.main()
@@ -0,0 +1,55 @@
+from __future__ import print_function
+
+import io
+import os
+
+import tensorflow as tf
+
+from opennmt.utils import writer
+
+
+class _UpperCaseModel(object):
+
+  def print_predictions(self, predictions, params=None, stream=None):
+    # Print each batch on one line to check how the predictions are grouped.
+    print(" ".join(prediction.upper() for prediction in predictions), file=stream)
+
+
+class _FailingModel(object):
+
+  def print_predictions(self, predictions, params=None, stream=None):
+    raise IOError("failure")
+
+
+class WriterTest(tf.test.TestCase):
+
+  def _testPredictionWriter(self, num_processes):
+    predictions = ["a", "b", "c", "d", "e"]
+    output_file = os.path.join(self.get_temp_dir(), "predictions.txt")
+    with io.open(output_file, encoding="utf-8", mode="w") as stream:
+      with writer.PredictionWriter(
+          _UpperCaseModel(), stream, chunk_size=2, num_processes=num_processes) as pred_writer:
+        for prediction in predictions:
+          pred_writer.write(prediction)
+    with io.open(output_file, encoding="utf-8") as stream:
+      self.assertListEqual(["A B", "C D", "E"], stream.read().splitlines())
+
+  def testPredictionWriter(self):
+    self._testPredictionWriter(0)
+
+  def testPredictionWriterWithProcesses(self):
+    self._testPredictionWriter(2)
+
+  def testPredictionWriterError(self):
+    with self.assertRaises(RuntimeError):
+      with writer.PredictionWriter(_FailingModel(), io.StringIO(), chunk_size=1) as pred_writer:
+        pred_writer.write("a")
+    # The error of the writer thread should not replace the error of the block.
+    with self.assertRaises(ValueError):
+      with writer.PredictionWriter(_FailingModel(), io.StringIO(), chunk_size=1) as pred_writer:
+        pred_writer.write("a")
+        raise ValueError("error in block")
+
+
+if __name__ == "__main__":
+  tf.test.main()
@@ -7,6 +7,7 @@ import tensorflow as tf
 import pyonmttok
 
 from opennmt.tokenizers.tokenizer import Tokenizer
+from opennmt.utils.misc import create_process_pool
 
 
 def create_tokenizer(config):
@@ -42,12 +43,42 @@ def create_tokenizer(config):
   return pyonmttok.Tokenizer(config.get("mode", "conservative"), **kwargs)
 
 
+_worker_tokenizer = None
+
+def _init_worker(config):
+  global _worker_tokenizer  # pylint: disable=global-statement
+  _worker_tokenizer = create_tokenizer(config)
+
+def _detokenize_in_worker(tokens_batch):
+  return [
+      tf.compat.as_text(_worker_tokenizer.detokenize(tokens)) for tokens in tokens_batch]
+
+
 class OpenNMTTokenizer(Tokenizer):
   """Uses the OpenNMT tokenizer."""
 
-  def __init__(self, configuration_file_or_key=None):
+  def __init__(self, configuration_file_or_key=None, num_processes=1):
+    """Initializes the tokenizer.
+
+    Args:
+      configuration_file_or_key: The YAML configuration file or a the key to
+        the YAML configuration file.
+      num_processes: The default number of processes used by
+        :meth:`detokenize_batch`. The processes are started on the first large
+        batch and stopped by :meth:`close`.
+    """
     super(OpenNMTTokenizer, self).__init__(configuration_file_or_key=configuration_file_or_key)
+    self._num_processes = num_processes
     self._tokenizer = None
+    self._pool = None
+    self._pool_size = None
+
+  def __getstate__(self):
+    # The underlying tokenizer and the process pool can not be pickled.
+    state = self.__dict__.copy()
+    state["_tokenizer"] = None
+    state["_pool"] = None
+    return state
 
   def _tokenize_string(self, text):
     if self._tokenizer is None:
@@ -61,3 +92,32 @@ class OpenNMTTokenizer(Tokenizer):
       self._tokenizer = create_tokenizer(self._config)
     tokens = [tf.compat.as_bytes(token) for token in tokens]
     return self._tokenizer.detokenize(tokens)
+
+  def detokenize_batch(self, tokens_batch, num_processes=None):
+    if num_processes is None:
+      num_processes = self._num_processes
+    tokens_batch = [[tf.compat.as_bytes(token) for token in tokens] for tokens in tokens_batch]
+    if num_processes <= 1 or len(tokens_batch) < 2 * num_processes:
+      if self._tokenizer is None:
+        self._tokenizer = create_tokenizer(self._config)
+      return [
+          tf.compat.as_text(self._tokenizer.detokenize(tokens)) for tokens in tokens_batch]
+    if self._pool is not None and self._pool_size != num_processes:
+      self.close()
+    if self._pool is None:
+      self._pool = create_process_pool(
+          num_processes, initializer=_init_worker, initargs=(self._config,))
+      self._pool_size = num_processes
+    chunk_size = (len(tokens_batch) + num_processes - 1) // num_processes
+    chunks = [
+        tokens_batch[i:i + chunk_size] for i in range(0, len(tokens_batch), chunk_size)]
+    sentences = []
+    for chunk_sentences in self._pool.map(_detokenize_in_worker, chunks):
+      sentences.extend(chunk_sentences)
+    return sentences
+
+  def close(self):
+    if self._pool is not None:
+      self._pool.close()
+      self._pool.join()
+      self._pool = None
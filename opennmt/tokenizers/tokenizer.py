@@ -135,6 +135,28 @@ class Tokenizer(object):
       tokens = [tf.compat.as_text(token) for token in tokens]
       return self._detokenize_string(tokens)
 
+  def detokenize_batch(self, tokens_batch, num_processes=None):
+    """Detokenizes a batch of tokens.
+
+    Args:
+      tokens_batch: A list of token sequences, each being a list or a 1-D Numpy
+        array of Python strings.
+      num_processes: (optional) For tokenizers that support it, the number of
+        processes used to detokenize the batch.
+
+    Returns:
+      A list of Python unicode strings.
+    """
+    _ = num_processes
+    return [self.detokenize(tokens) for tokens in tokens_batch]
+
+  def close(self):
+    """Releases the resources of the tokenizer (e.g. its worker processes).
+
+    The tokenizer can still be used afterwards.
+    """
+    return
+
   def _tokenize_tensor(self, text):
     """Tokenizes a tensor.
 
@@ -226,6 +248,16 @@ class SpaceTokenizer(Tokenizer):
   def _detokenize_string(self, tokens):
     return " ".join(tokens)
 
+  def detokenize_batch(self, tokens_batch, num_processes=None):
+    # Join the tokens as they are instead of converting each token to unicode.
+    sentences = []
+    for tokens in tokens_batch:
+      if len(tokens) > 0 and isinstance(tokens[0], six.binary_type):
+        sentences.append(tf.compat.as_text(b" ".join(tokens)))
+      else:
+        sentences.append(u" ".join(tokens))
+    return sentences
+
 
 class CharacterTokenizer(Tokenizer):
   """A tokenizer that splits unicode characters."""
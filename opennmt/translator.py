@@ -0,0 +1,116 @@
+"""Persistent translation API."""
+
+import tensorflow as tf
+
+from opennmt import constants
+from opennmt.models.sequence_to_sequence import SequenceToSequence
+from opennmt.utils.misc import extract_batches
+
+
+class Translator(object):
+  """Class for translating batches of sentences with a persistent session.
+
+  Unlike :meth:`opennmt.runner.Runner.infer`, the prediction graph is built
+  once, the lookup tables are initialized once, and the checkpoint is restored
+  once. Each call to :meth:`opennmt.translator.Translator.translate_batch` then
+  only runs the decoding. This makes it suitable for long-running services.
+  """
+
+  def __init__(self, model, config, checkpoint_path=None, session_config=None):
+    """Builds the prediction graph and restores the checkpoint.
+
+    Args:
+      model: A :class:`opennmt.models.sequence_to_sequence.SequenceToSequence`
+        instance.
+      config: The run configuration.
+      checkpoint_path: The checkpoint to restore. If ``None``, the latest
+        checkpoint from ``model_dir`` is used.
+      session_config: (optional) A ``tf.ConfigProto`` for the session.
+
+    Raises:
+      TypeError: if :obj:`model` is not a sequence to sequence model.
+      ValueError: if no checkpoint can be found or if the model inputs can not
+        be fed from text.
+    """
+    if not isinstance(model, SequenceToSequence):
+      raise TypeError("Translator requires a SequenceToSequence model")
+
+    if checkpoint_path is None:
+      checkpoint_path = tf.train.latest_checkpoint(config["model_dir"])
+    elif tf.gfile.IsDirectory(checkpoint_path):
+      checkpoint_path = tf.train.latest_checkpoint(checkpoint_path)
+    if checkpoint_path is None:
+      raise ValueError("No checkpoint found in {}".format(config["model_dir"]))
+
+    self._model = model
+    self._graph = tf.Graph()
+
+    with self._graph.as_default():
+      receiver = model.serving_input_fn(config["data"])()
+      if set(receiver.receiver_tensors.keys()) != set(["tokens", "length"]):
+        raise ValueError("Translator only supports models with a single text input")
+      self._tokens = receiver.receiver_tensors["tokens"]
+      self._length = receiver.receiver_tensors["length"]
+
+      spec = model.model_fn()(
+          receiver.features, None, config["params"], tf.estimator.ModeKeys.PREDICT, None)
+      self._predictions = spec.predictions
+
+      saver = spec.scaffold.saver or tf.train.Saver()
+      self._session = tf.Session(graph=self._graph, config=session_config)
+      self._session.run(tf.tables_initializer())
+      tf.logging.info("Restoring parameters from %s", checkpoint_path)
+      saver.restore(self._session, checkpoint_path)
+
+    self._graph.finalize()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+
+  def close(self):
+    """Releases the session resources."""
+    self._session.close()
+
+  def predict_batch(self, texts):
+    """Runs the model on a batch of sentences.
+
+    Args:
+      texts: A list of Python strings.
+
+    Returns:
+      The list of predictions, as dictionaries of Numpy arrays.
+    """
+    if not texts:
+      return []
+
+    tokenizer = self._model.source_inputter.tokenizer
+    tokens = [tokenizer.tokenize(text) for text in texts]
+    lengths = [len(sentence) for sentence in tokens]
+    max_length = max(lengths)
+    tokens = [
+        sentence + [constants.PADDING_TOKEN] * (max_length - len(sentence))
+        for sentence in tokens]
+
+    predictions = self._session.run(
+        self._predictions, feed_dict={self._tokens: tokens, self._length: lengths})
+    return list(extract_batches(predictions))
+
+  def translate_batch(self, texts):
+    """Translates a batch of sentences.
+
+    Args:
+      texts: A list of Python strings.
+
+    Returns:
+      The list of translations, as Python unicode strings.
+    """
+    target_tokenizer = self._model.target_inputter.tokenizer
+    translations = []
+    for prediction in self.predict_batch(texts):
+      length = prediction["length"][0]
+      hypothesis = prediction["tokens"][0][:length - 1] # Ignore </s>.
+      translations.append(target_tokenizer.detokenize(hypothesis))
+    return translations
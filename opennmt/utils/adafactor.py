@@ -16,7 +16,7 @@
 # Changes:
 # * prefix private functions with _
 # * rename var to handle in _resource_apply_dense
-# * override _resource_apply_sparse method
+# * override _resource_apply_sparse method with row-wise updates
 # * add get_optimizer_from_params function
 
 """Optimization."""
@@ -177,7 +177,7 @@ class AdafactorOptimizer(tf.train.Optimizer):
     return self._resource_apply_dense(grad, var)
 
   def _apply_sparse(self, grad, var):
-    return self._apply_dense(tf.convert_to_tensor(grad), var)
+    return self._resource_apply_sparse(grad.values, var, grad.indices)
 
   def _parameter_scale(self, var):
     """Estimate the scale of the parameters from the current values.
@@ -246,7 +246,60 @@ class AdafactorOptimizer(tf.train.Optimizer):
     return tf.group(*updates)
 
   def _resource_apply_sparse(self, grad, handle, indices):
-    raise NotImplementedError()
+    # Row-wise update: only the slots and parameters rows selected by
+    # indices are updated (indices are already deduplicated). The statistics
+    # over the whole variable (column mean, parameter scale, clipping RMS) are
+    # the ones of the dense update where the other rows have a zero gradient.
+    num_rows = tf.to_float(tf.shape(handle)[0])
+    num_touched_rows = tf.to_float(tf.shape(indices)[0])
+    grad_squared = tf.square(grad) + 1e-30
+    grad_squared_mean = tf.reduce_mean(grad_squared)
+    decay_rate = self._decay_rate
+    update_scale = self._learning_rate
+    if self._multiply_by_parameter_scale:
+      update_scale *= self._parameter_scale(handle)
+    decay_rate += grad_squared_mean * 1e-30
+    update_scale += grad_squared_mean * 1e-30
+    mixing_rate = 1.0 - decay_rate
+    shape = handle.get_shape().as_list()
+    updates = []
+    if self._should_use_factored_second_moment_estimate(shape):
+      grad_squared_row_mean = tf.reduce_mean(grad_squared, 1)
+      grad_squared_col_mean = (
+          (tf.reduce_sum(grad_squared, 0) + (num_rows - num_touched_rows) * 1e-30) / num_rows)
+      vr = self.get_slot(handle, "vr")
+      new_vr_rows = (decay_rate * tf.gather(vr, indices)
+                     + mixing_rate * grad_squared_row_mean)
+      vc = self.get_slot(handle, "vc")
+      new_vc = (decay_rate * vc + mixing_rate * grad_squared_col_mean)
+      vr_update = tf.scatter_update(vr, indices, new_vr_rows, use_locking=self._use_locking)
+      vc_update = tf.assign(vc, new_vc, use_locking=self._use_locking)
+      updates = [vr_update, vc_update]
+      with tf.control_dependencies([vr_update]):
+        long_term_mean = tf.reduce_mean(vr)
+      r_factor = tf.rsqrt(new_vr_rows / long_term_mean)
+      c_factor = tf.rsqrt(new_vc)
+      x = grad * tf.expand_dims(r_factor, 1) * tf.expand_dims(c_factor, 0)
+    else:
+      v = self.get_slot(handle, "v")
+      new_v_rows = decay_rate * tf.gather(v, indices) + mixing_rate * grad_squared
+      v_update = tf.scatter_update(v, indices, new_v_rows, use_locking=self._use_locking)
+      updates = [v_update]
+      x = grad * tf.rsqrt(new_v_rows)
+    if self._clipping_threshold is not None:
+      # The other rows of the dense update are zero.
+      x_rms = _reduce_rms(x) * tf.sqrt(num_touched_rows / num_rows)
+      clipping_denom = tf.maximum(1.0, x_rms / self._clipping_threshold)
+      x /= clipping_denom
+    subtrahend = update_scale * x
+    if self._beta1:
+      m = self.get_slot(handle, "m")
+      new_m_rows = self._beta1 * tf.gather(m, indices) + (1.0 - self._beta1) * subtrahend
+      updates.append(tf.scatter_update(m, indices, new_m_rows, use_locking=self._use_locking))
+      subtrahend = new_m_rows
+    var_update = tf.scatter_sub(handle, indices, subtrahend, use_locking=self._use_locking)
+    updates = [var_update] + updates
+    return tf.group(*updates)
 
   def _decay_rate_default(self):
     return adafactor_decay_rate_pow(0.8)
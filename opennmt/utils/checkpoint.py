@@ -0,0 +1,320 @@
+"""Checkpoint utilities."""
+
+import os
+import shutil
+
+import six
+
+import tensorflow as tf
+import numpy as np
+
+from tensorflow.python.ops import gen_io_ops
+
+
+def get_checkpoint_step(checkpoint_path):
+  """Returns the training step of a checkpoint.
+
+  Args:
+    checkpoint_path: The checkpoint path, e.g. ``model.ckpt-1000``.
+
+  Returns:
+    The step as an integer or ``None`` if it can not be inferred from the path.
+  """
+  try:
+    return int(checkpoint_path.split("-")[-1])
+  except ValueError:
+    return None
+
+def select_checkpoints(model_dir, max_count=None, min_step=None, max_step=None):
+  """Lists the checkpoints of a model directory.
+
+  Args:
+    model_dir: The model directory.
+    max_count: If set, only keep this many latest checkpoints.
+    min_step: If set, ignore checkpoints saved before this step.
+    max_step: If set, ignore checkpoints saved after this step.
+
+  Returns:
+    The list of checkpoint paths, from the oldest to the latest.
+
+  Raises:
+    ValueError: if no checkpoints are found.
+  """
+  checkpoint_state = tf.train.get_checkpoint_state(model_dir)
+  if checkpoint_state is None:
+    raise ValueError("No checkpoints found in {}".format(model_dir))
+  checkpoints_path = []
+  for checkpoint_path in checkpoint_state.all_model_checkpoint_paths:
+    step = get_checkpoint_step(checkpoint_path)
+    if step is not None:
+      if min_step is not None and step < min_step:
+        continue
+      if max_step is not None and step > max_step:
+        continue
+    checkpoints_path.append(checkpoint_path)
+  if max_count is not None and len(checkpoints_path) > max_count:
+    checkpoints_path = checkpoints_path[-max_count:]
+  if not checkpoints_path:
+    raise ValueError("No checkpoints in {} match the selection".format(model_dir))
+  return checkpoints_path
+
+def exponential_weights(num_checkpoints, decay):
+  """Returns the weights of an exponential moving average of checkpoints.
+
+  Args:
+    num_checkpoints: The number of checkpoints, from the oldest to the latest.
+    decay: The decay applied each time a newer checkpoint is averaged.
+
+  Returns:
+    A list of normalized weights, one per checkpoint.
+  """
+  weights = [decay ** (num_checkpoints - 1 - i) for i in range(num_checkpoints)]
+  total = sum(weights)
+  return [weight / total for weight in weights]
+
+def copy_checkpoint(checkpoint_path, output_prefix):
+  """Copies the files of a checkpoint.
+
+  Files are hard linked when possible so that copying a checkpoint is cheap
+  and the copy survives the removal of the original checkpoint.
+
+  Args:
+    checkpoint_path: The checkpoint prefix, e.g. ``model_dir/model.ckpt-1000``.
+    output_prefix: The prefix of the copied checkpoint.
+
+  Returns:
+    :obj:`output_prefix` or ``None`` if no files match :obj:`checkpoint_path`.
+  """
+  filenames = tf.gfile.Glob("{}.*".format(checkpoint_path))
+  if not filenames:
+    return None
+  output_dir = os.path.dirname(output_prefix)
+  if output_dir and not os.path.exists(output_dir):
+    os.makedirs(output_dir)
+  for filename in filenames:
+    destination = output_prefix + filename[len(checkpoint_path):]
+    try:
+      os.link(filename, destination)
+    except (AttributeError, OSError):
+      shutil.copyfile(filename, destination)
+  return output_prefix
+
+def remove_checkpoint(checkpoint_path):
+  """Removes the files of a checkpoint.
+
+  Args:
+    checkpoint_path: The checkpoint prefix.
+  """
+  for filename in tf.gfile.Glob("{}.*".format(checkpoint_path)):
+    tf.gfile.Remove(filename)
+
+def _accumulator_dtype(dtype):
+  if dtype == np.float16:
+    return np.float32
+  return dtype
+
+
+class CheckpointWriter(object):
+  """Writes checkpoints from Numpy values.
+
+  Each variable is saved in its own temporary bundle and the bundles are then
+  merged into the final checkpoint, so values can be written one at a time. The
+  writer graph only contains the save ops: no variables are created,
+  initialized, or assigned.
+  """
+
+  def __init__(self):
+    self._graph = tf.Graph()
+    with self._graph.as_default():
+      self._prefix = tf.placeholder(tf.string, shape=[])
+      self._name = tf.placeholder(tf.string, shape=[])
+      self._prefixes = tf.placeholder(tf.string, shape=[None])
+      self._merge_op = gen_io_ops.merge_v2_checkpoints(
+          self._prefixes, self._prefix, delete_old_dirs=True)
+    self._save_ops = {}
+    self._session = tf.Session(
+        graph=self._graph, config=tf.ConfigProto(device_count={"GPU": 0}))
+
+  def _get_save_op(self, dtype):
+    if dtype not in self._save_ops:
+      with self._graph.as_default():
+        value = tf.placeholder(dtype)
+        save_op = gen_io_ops.save_v2(self._prefix, [self._name], [""], [value])
+      self._save_ops[dtype] = (value, save_op)
+    return self._save_ops[dtype]
+
+  def save(self, output_prefix, values):
+    """Writes a checkpoint.
+
+    Args:
+      output_prefix: The checkpoint prefix, e.g. ``model.ckpt-1000``.
+      values: An iterable of ``(name, value)`` pairs with ``value`` a Numpy
+        array. It is consumed one pair at a time.
+
+    Returns:
+      :obj:`output_prefix`.
+    """
+    tmp_dir = "{}_tmp".format(output_prefix)
+    shards = []
+    for name, value in values:
+      shard = os.path.join(tmp_dir, "part-{:05d}".format(len(shards)))
+      placeholder, save_op = self._get_save_op(tf.as_dtype(value.dtype))
+      self._session.run(
+          save_op, feed_dict={self._prefix: shard, self._name: name, placeholder: value})
+      shards.append(shard)
+    self._session.run(
+        self._merge_op, feed_dict={self._prefixes: shards, self._prefix: output_prefix})
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    return output_prefix
+
+  def close(self):
+    """Releases the writer resources."""
+    self._session.close()
+
+
+def average_checkpoints(checkpoints_path, output_prefix, weights=None):
+  """Averages the variables of several checkpoints.
+
+  Variables are processed one at a time so that the memory usage is bounded by
+  the size of the largest variable. Floating point variables are averaged in
+  their own precision (float32 for float16 variables) and keep their dtype.
+  Other variables (e.g. the global step) are copied from the latest checkpoint.
+
+  Args:
+    checkpoints_path: The list of checkpoints to average, from the oldest to
+      the latest.
+    output_prefix: The prefix of the averaged checkpoint,
+      e.g. ``avg/model.ckpt-1000``.
+    weights: (optional) The weight of each checkpoint. Defaults to a uniform
+      average. Weights are normalized to sum to 1.
+
+  Returns:
+    The path to the averaged checkpoint.
+
+  Raises:
+    ValueError: if the number of weights does not match the number of
+      checkpoints.
+  """
+  num_checkpoints = len(checkpoints_path)
+  if weights is None:
+    weights = [1.0] * num_checkpoints
+  elif len(weights) != num_checkpoints:
+    raise ValueError("Expected {} weights but got {}".format(num_checkpoints, len(weights)))
+  total_weight = float(sum(weights))
+  weights = [weight / total_weight for weight in weights]
+
+  readers = [tf.train.load_checkpoint(path) for path in checkpoints_path]
+  var_list = tf.train.list_variables(checkpoints_path[-1])
+
+  output_dir = os.path.dirname(output_prefix)
+  if output_dir and not tf.gfile.Exists(output_dir):
+    tf.gfile.MakeDirs(output_dir)
+
+  def _averaged_values():
+    for name, _ in var_list:
+      latest_value = readers[-1].get_tensor(name)
+      if not np.issubdtype(latest_value.dtype, np.floating):
+        yield name, latest_value
+        continue
+      dtype = latest_value.dtype
+      value = latest_value.astype(_accumulator_dtype(dtype)) * weights[-1]
+      del latest_value
+      for reader, weight in zip(readers[:-1], weights[:-1]):
+        value += reader.get_tensor(name).astype(value.dtype) * weight
+      yield name, value.astype(dtype)
+
+  writer = CheckpointWriter()
+  try:
+    writer.save(output_prefix, _averaged_values())
+  finally:
+    writer.close()
+
+  tf.train.update_checkpoint_state(output_dir, output_prefix)
+  return output_prefix
+
+def convert_checkpoint(checkpoint_path, output_prefix, variables):
+  """Converts a checkpoint saved by a previous version to the variables layout
+  of a model.
+
+  ``WordEmbedder`` embeddings were stored with the shape
+  ``[embedding_size, vocabulary_size]`` and the bias of an output projection
+  tied to the target embeddings was saved in the embeddings scope. This
+  function:
+
+  * transposes the variables that have the transposed shape of the model
+    variable with the same name, along with their optimizer slots and moving
+    averages (the factored Adafactor statistics are swapped);
+  * renames ``<scope>/bias`` to ``<scope>/projection/bias`` when only the
+    latter is a model variable, along with its slots.
+
+  Other variables are copied unchanged. Square embedding matrices can not be
+  detected and are not transposed.
+
+  Args:
+    checkpoint_path: The checkpoint to convert.
+    output_prefix: The prefix of the converted checkpoint,
+      e.g. ``converted/model.ckpt-1000``.
+    variables: A dictionary mapping the model variables names to their shape.
+
+  Returns:
+    The path to the converted checkpoint.
+  """
+  reader = tf.train.load_checkpoint(checkpoint_path)
+  shapes = dict(tf.train.list_variables(checkpoint_path))
+
+  renamed = {}
+  transposed = set()
+  for name, shape in six.iteritems(variables):
+    shape = list(shape)
+    if name not in shapes:
+      if name.endswith("/projection/bias"):
+        old_name = name[:-len("projection/bias")] + "bias"
+        if old_name in shapes:
+          renamed[old_name] = name
+    elif len(shape) == 2 and shape[0] != shape[1] and shapes[name] == shape[::-1]:
+      transposed.add(name)
+
+  def _owner(name):
+    # Slots and moving averages are named after the variable they track.
+    while name:
+      if name in transposed or name in renamed:
+        return name
+      name = name.rpartition("/")[0]
+    return None
+
+  factored = {}
+  for name, shape in six.iteritems(shapes):
+    owner = _owner(name)
+    if owner in transposed and len(shape) == 1:
+      factored.setdefault(owner, []).append(name)
+  swapped = {}
+  for owner, names in six.iteritems(factored):
+    if len(names) == 2 and sorted(shapes[name][0] for name in names) == sorted(shapes[owner]):
+      swapped[names[0]], swapped[names[1]] = names[1], names[0]
+
+  def _converted_values():
+    for name in sorted(six.iterkeys(shapes)):
+      value = reader.get_tensor(name)
+      owner = _owner(name)
+      new_name = name
+      if owner in transposed:
+        if list(value.shape) == shapes[owner]:
+          value = np.transpose(value)
+        new_name = swapped.get(name, name)
+      elif owner in renamed:
+        new_name = renamed[owner] + name[len(owner):]
+      yield new_name, value
+
+  tf.logging.info("Transposing %d variable(s) and renaming %d variable(s)",
+                  len(transposed), len(renamed))
+  output_dir = os.path.dirname(output_prefix)
+  if output_dir and not tf.gfile.Exists(output_dir):
+    tf.gfile.MakeDirs(output_dir)
+  writer = CheckpointWriter()
+  try:
+    writer.save(output_prefix, _converted_values())
+  finally:
+    writer.close()
+
+  tf.train.update_checkpoint_state(output_dir, output_prefix)
+  return output_prefix
@@ -1,9 +1,45 @@
 """Functions for reading data."""
 
+import threading
+
 import tensorflow as tf
 import numpy as np
 
 
+class StatisticsCounter(object):
+  """A thread-safe counter that can be incremented and read from the graph,
+  e.g. to collect statistics on the input pipeline.
+  """
+
+  def __init__(self):
+    self._value = 0
+    self._lock = threading.Lock()
+
+  def add(self, value):
+    """Adds :obj:`value` to the counter and returns the new count."""
+    with self._lock:
+      self._value += int(value)
+      return np.int64(self._value)
+
+  def read(self, reset=False):
+    """Returns the count and optionally resets it."""
+    with self._lock:
+      value = self._value
+      if reset:
+        self._value = 0
+      return np.int64(value)
+
+  def increment_op(self):
+    """Returns an operation that increments the counter and evaluates to the new
+    count."""
+    return tf.py_func(lambda: self.add(1), [], tf.int64, stateful=True)
+
+  def read_op(self, reset=False):
+    """Returns an operation that evaluates to the count and optionally resets
+    it."""
+    return tf.py_func(lambda: self.read(reset=reset), [], tf.int64, stateful=True)
+
+
 def get_padded_shapes(dataset):
   """Returns the padded shapes for ``tf.data.Dataset.padded_batch``.
 
@@ -39,7 +75,8 @@ def filter_irregular_batches(multiple):
 def filter_examples_by_length(maximum_features_length=None,
                               maximum_labels_length=None,
                               features_length_fn=None,
-                              labels_length_fn=None):
+                              labels_length_fn=None,
+                              dropped_counter=None):
   """Transformation that constrains examples length.
 
   Args:
@@ -49,6 +86,9 @@ def filter_examples_by_length(maximum_features_length=None,
       ``None`` to not constrain the length.
     features_length_fn: A callable mapping features to a sequence length.
     labels_length_fn: A callable mapping labels to a sequence length.
+    dropped_counter: (optional) A :class:`opennmt.utils.data.StatisticsCounter`
+      that counts the filtered out examples. This calls a Python function for
+      each example.
 
   Returns:
     A ``tf.data.Dataset`` transformation.
@@ -79,10 +119,35 @@ def filter_examples_by_length(maximum_features_length=None,
       cond.extend(_length_constraints(features_length, maximum_features_length))
     if labels_length is not None:
       cond.extend(_length_constraints(labels_length, maximum_labels_length))
-    return tf.reduce_all(cond)
+    keep = tf.reduce_all(cond)
+    if dropped_counter is not None:
+      keep = tf.py_func(_count_dropped, [keep], tf.bool, stateful=True)
+      keep.set_shape([])
+    return keep
+
+  def _count_dropped(keep):
+    if not keep:
+      dropped_counter.add(1)
+    return keep
 
   return lambda dataset: dataset.filter(_predicate)
 
+def count_batches(counter):
+  """Transformation that counts the elements going through the dataset.
+
+  Args:
+    counter: The :class:`opennmt.utils.data.StatisticsCounter` to increment.
+
+  Returns:
+    A ``tf.data.Dataset`` transformation.
+  """
+  def _count(*x):
+    x = x[0] if len(x) == 1 else x
+    with tf.control_dependencies([counter.increment_op()]):
+      return tf.contrib.framework.nest.map_structure(tf.identity, x)
+
+  return lambda dataset: dataset.map(_count)
+
 def random_shard(shard_size, dataset_size):
   """Transformation that shards the dataset in a random order.
 
@@ -3,24 +3,30 @@
 import subprocess
 
 import abc
-import io
-import re
 import os
 import six
 
 import tensorflow as tf
 
-from opennmt.utils.misc import get_third_party_dir
+from opennmt.utils import scoring
 
 
 @six.add_metaclass(abc.ABCMeta)
 class ExternalEvaluator(object):
   """Base class for external evaluators."""
 
-  def __init__(self, labels_file=None, output_dir=None, postprocess_script=None):
+  # Whether a higher score means a better model.
+  higher_is_better = True
+
+  def __init__(self,
+               labels_file=None,
+               output_dir=None,
+               postprocess_script=None,
+               num_processes=1):
     self._labels_file = labels_file
     self._summary_writer = None
     self._postprocess_script = postprocess_script
+    self._num_processes = num_processes
 
     if output_dir is not None:
       self._summary_writer = tf.summary.FileWriterCache.get(output_dir)
@@ -62,6 +68,7 @@ class ExternalEvaluator(object):
     summary = tf.Summary(value=[tf.Summary.Value(
         tag="external_evaluation/{}".format(self.name()), simple_value=score)])
     self._summary_writer.add_summary(summary, step)
+    self._summary_writer.flush()
 
   def _log_score(self, score):
     tf.logging.info("%s evaluation score: %f", self.name(), score)
@@ -77,73 +84,80 @@ class ExternalEvaluator(object):
     raise NotImplementedError()
 
 
-class BLEUEvaluator(ExternalEvaluator):
-  """Evaluator calling multi-bleu.perl."""
+class LineEvaluator(ExternalEvaluator):
+  """Base class for evaluators that score in-memory lines."""
+
+  def score(self, labels_file, predictions_path):
+    return self.score_lines(
+        scoring.read_lines(labels_file), scoring.read_lines(predictions_path))
+
+  @abc.abstractmethod
+  def score_lines(self, references, hypotheses):
+    """Scores the hypotheses against the references.
 
-  def _get_bleu_script(self):
-    return "multi-bleu.perl"
+    Args:
+      references: The list of reference lines.
+      hypotheses: The list of predicted lines.
+
+    Returns:
+      The score.
+    """
+    raise NotImplementedError()
+
+
+class BLEUEvaluator(LineEvaluator):
+  """Evaluator computing the BLEU score of tokenized predictions, like
+  ``multi-bleu.perl``.
+  """
 
   def name(self):
     return "BLEU"
 
-  def score(self, labels_file, predictions_path):
-    bleu_script = self._get_bleu_script()
-    try:
-      third_party_dir = get_third_party_dir()
-    except RuntimeError as e:
-      tf.logging.warning("%s", str(e))
-      return None
-    try:
-      with io.open(predictions_path, encoding="utf-8", mode="r") as predictions_file:
-        bleu_out = subprocess.check_output(
-            [os.path.join(third_party_dir, bleu_script), labels_file],
-            stdin=predictions_file,
-            stderr=subprocess.STDOUT)
-        bleu_out = bleu_out.decode("utf-8")
-        bleu_score = re.search(r"BLEU = (.+?),", bleu_out).group(1)
-        return float(bleu_score)
-    except subprocess.CalledProcessError as error:
-      if error.output is not None:
-        msg = error.output.strip()
-        tf.logging.warning(
-            "{} script returned non-zero exit code: {}".format(bleu_script, msg))
-      return None
+  def score_lines(self, references, hypotheses):
+    return scoring.bleu(hypotheses, references, num_processes=self._num_processes)
 
 
 class BLEUDetokEvaluator(BLEUEvaluator):
-  """Evaluator calling multi-bleu-detok.perl."""
-
-  def _get_bleu_script(self):
-    return "multi-bleu-detok.perl"
+  """Evaluator computing the BLEU score of detokenized predictions, like
+  ``multi-bleu-detok.perl``.
+  """
 
   def name(self):
     return "BLEU-detok"
 
-  def score(self, labels_file, predictions_path):
-    bleu_script = self._get_bleu_script()
-    try:
-      third_party_dir = get_third_party_dir()
-    except RuntimeError as e:
-      tf.logging.warning("%s", str(e))
-      return None
-    try:
-      with open(predictions_path, "r") as predictions_file:
-        bleu_out = subprocess.check_output(
-            [os.path.join(third_party_dir, bleu_script), labels_file],
-            stdin=predictions_file,
-            stderr=subprocess.STDOUT)
-        bleu_out = bleu_out.decode("utf-8")
-        bleu_score = re.search(r"BLEU = (.+?),", bleu_out).group(1)
-        return float(bleu_score)
-    except subprocess.CalledProcessError as error:
-      if error.output is not None:
-        msg = error.output.strip()
-        tf.logging.warning(
-            "{} script returned non-zero exit code: {}".format(bleu_script, msg))
-      return None
-
-
-def external_evaluation_fn(evaluators_name, labels_file, output_dir=None, postprocess_script=None):
+  def score_lines(self, references, hypotheses):
+    return super(BLEUDetokEvaluator, self).score_lines(
+        [scoring.tokenize_13a(line) for line in references],
+        [scoring.tokenize_13a(line) for line in hypotheses])
+
+
+class ChrFEvaluator(LineEvaluator):
+  """Evaluator computing the chrF score."""
+
+  def name(self):
+    return "chrF"
+
+  def score_lines(self, references, hypotheses):
+    return scoring.chrf(hypotheses, references, num_processes=self._num_processes)
+
+
+class TEREvaluator(LineEvaluator):
+  """Evaluator computing the Translation Edit Rate."""
+
+  higher_is_better = False
+
+  def name(self):
+    return "TER"
+
+  def score_lines(self, references, hypotheses):
+    return scoring.ter(hypotheses, references, num_processes=self._num_processes)
+
+
+def external_evaluation_fn(evaluators_name,
+                           labels_file,
+                           output_dir=None,
+                           postprocess_script=None,
+                           num_processes=1):
   """Returns a callable to be used in
   :class:`opennmt.utils.hooks.SaveEvaluationPredictionHook` that calls one or
   more external evaluators.
@@ -152,12 +166,17 @@ def external_evaluation_fn(evaluators_name, labels_file, output_dir=None, postpr
     evaluators_name: An evaluator name or a list of evaluators name.
     labels_file: The true output labels.
     output_dir: The run directory.
+    postprocess_script: (optional) A script to apply on the predictions before
+      scoring.
+    num_processes: The number of processes used to compute each score.
 
   Returns:
-    A callable or ``None`` if :obj:`evaluators_name` is ``None`` or empty.
+    A callable returning the tuple ``(scores, names, higher_is_better)`` or
+    ``None`` if :obj:`evaluators_name` is ``None`` or empty.
 
   Raises:
     ValueError: if an evaluator name is invalid.
+    IOError: if :obj:`postprocess_script` does not exist.
   """
   if evaluators_name is None:
     return None
@@ -165,27 +184,39 @@ def external_evaluation_fn(evaluators_name, labels_file, output_dir=None, postpr
     evaluators_name = [evaluators_name]
   if not evaluators_name:
     return None
-  if not os.path.isfile(postprocess_script):
+  if postprocess_script is not None and not os.path.isfile(postprocess_script):
     raise IOError("Post process script {} not found.".format(postprocess_script))
 
+  evaluators_class = {
+      "bleu": BLEUEvaluator,
+      "bleu-detok": BLEUDetokEvaluator,
+      "chrf": ChrFEvaluator,
+      "ter": TEREvaluator
+  }
+
   evaluators = []
   for name in evaluators_name:
-    name = name.lower()
-    if name == "bleu":
-      evaluator = BLEUEvaluator(labels_file=labels_file, output_dir=output_dir, postprocess_script=postprocess_script)
-    elif name == "bleu-detok":
-      evaluator = BLEUDetokEvaluator(labels_file=labels_file, output_dir=output_dir, postprocess_script=postprocess_script)
-    else:
+    evaluator_class = evaluators_class.get(name.lower())
+    if evaluator_class is None:
       raise ValueError("No evaluator associated with the name: {}".format(name))
-    evaluators.append(evaluator)
+    evaluators.append(evaluator_class(
+        labels_file=labels_file,
+        output_dir=output_dir,
+        postprocess_script=postprocess_script,
+        num_processes=num_processes))
 
   def _post_evaluation_fn(step, predictions_path):
     scores = []
     names = []
+    higher_is_better = []
     for evaluator in evaluators:
-      score, name = evaluator(step, predictions_path)
+      result = evaluator(step, predictions_path)
+      if result is None:
+        continue
+      score, name = result
       scores.append(score)
       names.append(name)
-    return scores, names
+      higher_is_better.append(evaluator.higher_is_better)
+    return scores, names, higher_is_better
 
   return _post_evaluation_fn
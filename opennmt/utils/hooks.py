@@ -1,13 +1,24 @@
 """Custom hooks."""
 
 from __future__ import print_function
+import atexit
+import collections
 import io
+import threading
+import time
+import traceback
 
 import os
 
+from multiprocessing.pool import ThreadPool
+
+import six
 import tensorflow as tf
 
 from opennmt.utils import misc
+from opennmt.utils import checkpoint
+from opennmt.utils import profiler
+from opennmt.utils.checkpoint import CheckpointWriter
 
 
 class LogParametersCountHook(tf.train.SessionRunHook):
@@ -43,6 +54,25 @@ def add_counter(name, tensor):
       name=name)
   tf.add_to_collection(_DEFAULT_COUNTERS_COLLECTION, total_count)
 
+def get_counters():
+  """Returns the counters registered with :meth:`opennmt.utils.hooks.add_counter`."""
+  return tf.get_collection(_DEFAULT_COUNTERS_COLLECTION)
+
+
+_DEFAULT_PROFILING_COLLECTION = "profiling"
+
+
+def add_profiling_tensor(name, tensor):
+  """Registers a scalar tensor to be reported by
+  :class:`opennmt.utils.hooks.ThroughputProfilerHook`.
+
+  Args:
+    name: The name of the value.
+    tensor: The scalar ``tf.Tensor`` to report. Its value is averaged over the
+      reporting period.
+  """
+  misc.add_dict_to_collection(_DEFAULT_PROFILING_COLLECTION, {name: tensor})
+
 
 class CountersHook(tf.train.SessionRunHook):
   """Hook that summarizes counters.
@@ -65,7 +95,7 @@ class CountersHook(tf.train.SessionRunHook):
     self._output_dir = output_dir
 
   def begin(self):
-    self._counters = tf.get_collection(_DEFAULT_COUNTERS_COLLECTION)
+    self._counters = get_counters()
     if not self._counters:
       return
 
@@ -101,64 +131,597 @@ class CountersHook(tf.train.SessionRunHook):
           self._last_count[i] = counters[i]
 
 
+class ScalingEfficiencyHook(tf.train.SessionRunHook):
+  """Hook that summarizes the throughput of replicated training.
+
+  It reports the throughput per replica of a counter registered with
+  :meth:`opennmt.utils.hooks.add_counter` and, when the throughput of a single
+  device is known, the scaling efficiency defined as
+  ``throughput / (num_replicas * single_device_throughput)``.
+  """
+
+  def __init__(self,
+               num_replicas,
+               counter_name="words_per_sec/features",
+               single_device_throughput=None,
+               every_n_steps=100,
+               output_dir=None,
+               summary_writer=None):
+    """Initializes the hook.
+
+    Args:
+      num_replicas: The number of model replicas.
+      counter_name: The name of the counter to measure the throughput with.
+      single_device_throughput: (optional) The throughput of the same model
+        trained on a single device, in counter units per second.
+      every_n_steps: Report the metrics every this many steps.
+      output_dir: The directory to write the summaries to.
+      summary_writer: (optional) The summary writer to use.
+    """
+    self._num_replicas = num_replicas
+    self._counter_name = counter_name
+    self._single_device_throughput = single_device_throughput
+    self._timer = tf.train.SecondOrStepTimer(every_steps=every_n_steps)
+    self._output_dir = output_dir
+    self._summary_writer = summary_writer
+
+  def begin(self):
+    self._counter = None
+    for counter in get_counters():
+      if counter.op.name == self._counter_name:
+        self._counter = counter
+        break
+    if self._counter is None:
+      tf.logging.warn("Counter %s not found, the scaling efficiency will not be reported",
+                      self._counter_name)
+      return
+    if self._summary_writer is None and self._output_dir:
+      self._summary_writer = tf.summary.FileWriterCache.get(self._output_dir)
+    self._last_count = None
+    self._global_step = tf.train.get_global_step()
+    if self._global_step is None:
+      raise RuntimeError("Global step should be created to use ScalingEfficiencyHook.")
+
+  def before_run(self, run_context):  # pylint: disable=unused-argument
+    if self._counter is None:
+      return None
+    return tf.train.SessionRunArgs([self._counter, self._global_step])
+
+  def after_run(self, run_context, run_values):  # pylint: disable=unused-argument
+    if self._counter is None:
+      return
+
+    count, step = run_values.results
+    if self._timer.should_trigger_for_step(step):
+      elapsed_time, _ = self._timer.update_last_triggered_step(step)
+      if elapsed_time is not None and self._last_count is not None:
+        throughput = (count - self._last_count) / elapsed_time
+        values = [("parallel/throughput_per_replica", throughput / self._num_replicas)]
+        if self._single_device_throughput:
+          values.append((
+              "parallel/scaling_efficiency",
+              throughput / (self._num_replicas * self._single_device_throughput)))
+        for name, value in values:
+          if self._summary_writer is not None:
+            summary = tf.Summary(value=[tf.Summary.Value(tag=name, simple_value=value)])
+            self._summary_writer.add_summary(summary, step)
+          tf.logging.info("%s: %g", name, value)
+      self._last_count = count
+
+
+class ThroughputProfilerHook(tf.train.SessionRunHook):
+  """Hook that reports where the training time is spent.
+
+  The time of each step is split into:
+
+  * the input wait: the time the session waited for the next batch;
+  * the compute: the rest of the ``session.run`` call;
+  * the hooks: the time spent outside ``session.run``, mostly in other hooks.
+
+  The values registered with :meth:`opennmt.utils.hooks.add_profiling_tensor`
+  (e.g. the padding ratio of the batches) are also averaged and reported. All
+  values are logged and written to TensorBoard under ``profiling/``.
+  """
+
+  def __init__(self, every_n_steps=100, output_dir=None, summary_writer=None):
+    """Initializes the hook.
+
+    Args:
+      every_n_steps: Report the metrics every this many steps.
+      output_dir: The directory to write the summaries to.
+      summary_writer: (optional) The summary writer to use.
+    """
+    self._timer = tf.train.SecondOrStepTimer(every_steps=every_n_steps)
+    self._output_dir = output_dir
+    self._summary_writer = summary_writer
+
+  def begin(self):
+    if self._summary_writer is None and self._output_dir:
+      self._summary_writer = tf.summary.FileWriterCache.get(self._output_dir)
+    self._tensors = misc.get_dict_from_collection(_DEFAULT_PROFILING_COLLECTION)
+    self._global_step = tf.train.get_global_step()
+    if self._global_step is None:
+      raise RuntimeError("Global step should be created to use ThroughputProfilerHook.")
+    self._last_run_end = None
+    self._reset()
+
+  def _reset(self):
+    self._num_steps = 0
+    self._totals = collections.defaultdict(float)
+
+  def before_run(self, run_context):  # pylint: disable=unused-argument
+    self._run_start = time.time()
+    if self._last_run_end is not None:
+      self._totals["hooks_time"] += self._run_start - self._last_run_end
+    return tf.train.SessionRunArgs([self._tensors, self._global_step])
+
+  def after_run(self, run_context, run_values):  # pylint: disable=unused-argument
+    self._last_run_end = time.time()
+    values, step = run_values.results
+    run_time = self._last_run_end - self._run_start
+    input_wait_time = min(max(float(values.get("input_wait_time", 0)), 0), run_time)
+    self._totals["compute_time"] += run_time - input_wait_time
+    for name, value in six.iteritems(values):
+      self._totals[name] += float(value)
+    self._num_steps += 1
+
+    if self._timer.should_trigger_for_step(step):
+      elapsed_time, _ = self._timer.update_last_triggered_step(step)
+      if elapsed_time is not None:
+        self._report(step, elapsed_time)
+      self._reset()
+
+  def _report(self, step, elapsed_time):
+    averages = {
+        name: total / self._num_steps for name, total in six.iteritems(self._totals)}
+    averages["step_time"] = elapsed_time / self._num_steps
+    averages["input_bound_ratio"] = averages.get("input_wait_time", 0) / averages["step_time"]
+    for name in sorted(six.iterkeys(averages)):
+      tag = "profiling/{}".format(name)
+      value = averages[name]
+      if self._summary_writer is not None:
+        summary = tf.Summary(value=[tf.Summary.Value(tag=tag, simple_value=value)])
+        self._summary_writer.add_summary(summary, step)
+      tf.logging.info("%s: %g", tag, value)
+
+
+class StepProfilerHook(tf.train.SessionRunHook):
+  """Hook that traces selected steps.
+
+  For each selected step, the Chrome trace and the most expensive operations by
+  time and memory are written in the output directory (see
+  :meth:`opennmt.utils.profiler.write_step_profile`).
+  """
+
+  def __init__(self, output_dir, steps, use_global_step=True, top_k=20):
+    """Initializes the hook.
+
+    Args:
+      output_dir: The directory where to write the profiles.
+      steps: The list of steps to trace.
+      use_global_step: If ``True``, :obj:`steps` are global steps. Otherwise,
+        they are the 1-based indices of the session runs, e.g. in evaluation
+        or inference.
+      top_k: The number of operations to report.
+    """
+    self._output_dir = output_dir
+    self._steps = set(steps)
+    self._use_global_step = use_global_step
+    self._top_k = top_k
+
+  def begin(self):
+    self._global_step = None
+    self._next_step = None
+    if self._use_global_step:
+      self._global_step = tf.train.get_global_step()
+      if self._global_step is None:
+        raise RuntimeError("Global step should be created to use StepProfilerHook.")
+    else:
+      self._next_step = 1
+
+  def after_create_session(self, session, coord):  # pylint: disable=unused-argument
+    if self._global_step is not None:
+      # The first run is traced as the step following the restored global step.
+      self._next_step = session.run(self._global_step) + 1
+
+  def before_run(self, run_context):  # pylint: disable=unused-argument
+    self._trace = self._next_step in self._steps
+    options = None
+    if self._trace:
+      options = tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE)
+    fetches = self._global_step if self._global_step is not None else []
+    return tf.train.SessionRunArgs(fetches, options=options)
+
+  def after_run(self, run_context, run_values):  # pylint: disable=unused-argument
+    if self._global_step is not None:
+      # The fetched global step may be read before its increment.
+      step = run_values.results + 1
+    else:
+      step = self._next_step
+    if self._trace:
+      trace_path, report_path = profiler.write_step_profile(
+          run_values.run_metadata, self._output_dir, self._next_step, top_k=self._top_k)
+      tf.logging.info("Saved the trace of step %d in %s and %s",
+                      self._next_step, trace_path, report_path)
+    self._next_step = step + 1
+
+
+class MemoryReportHook(tf.train.SessionRunHook):
+  """Hook that reports the peak memory usage of each allocator and the memory
+  allocated by each graph section (see
+  :meth:`opennmt.utils.profiler.get_graph_section`) on periodic steps.
+
+  The reported steps are run with a software trace.
+  """
+
+  def __init__(self,
+               every_n_steps=100,
+               use_global_step=True,
+               output_dir=None,
+               summary_writer=None):
+    """Initializes the hook.
+
+    Args:
+      every_n_steps: Report the memory every this many steps.
+      use_global_step: If ``True``, steps are global steps. Otherwise, they
+        are the 1-based indices of the session runs, e.g. in evaluation or
+        inference.
+      output_dir: The directory to write the summaries to. Summaries are only
+        written when :obj:`use_global_step` is ``True``.
+      summary_writer: (optional) The summary writer to use.
+    """
+    self._every_n_steps = every_n_steps
+    self._use_global_step = use_global_step
+    self._output_dir = output_dir
+    self._summary_writer = summary_writer
+
+  def begin(self):
+    self._global_step = None
+    self._next_step = None
+    if self._use_global_step:
+      self._global_step = tf.train.get_global_step()
+      if self._global_step is None:
+        raise RuntimeError("Global step should be created to use MemoryReportHook.")
+      if self._summary_writer is None and self._output_dir:
+        self._summary_writer = tf.summary.FileWriterCache.get(self._output_dir)
+    else:
+      self._next_step = 1
+
+  def after_create_session(self, session, coord):  # pylint: disable=unused-argument
+    if self._global_step is not None:
+      self._next_step = session.run(self._global_step) + 1
+
+  def before_run(self, run_context):  # pylint: disable=unused-argument
+    self._trace = self._next_step is not None and self._next_step % self._every_n_steps == 0
+    options = None
+    if self._trace:
+      options = tf.RunOptions(trace_level=tf.RunOptions.SOFTWARE_TRACE)
+    fetches = self._global_step if self._global_step is not None else []
+    return tf.train.SessionRunArgs(fetches, options=options)
+
+  def after_run(self, run_context, run_values):  # pylint: disable=unused-argument
+    if self._global_step is not None:
+      # The fetched global step may be read before its increment.
+      step = run_values.results + 1
+    else:
+      step = self._next_step
+    if self._trace:
+      self._report(self._next_step, run_values.run_metadata.step_stats)
+    self._next_step = step + 1
+
+  def _report(self, step, step_stats):
+    values = []
+    for name, peak_bytes in six.iteritems(profiler.peak_memory_by_device(step_stats)):
+      values.append(("memory/peak/{}".format(name), peak_bytes))
+    for name, allocated_bytes in six.iteritems(profiler.allocated_memory_by_section(step_stats)):
+      values.append(("memory/allocated/{}".format(name), allocated_bytes))
+    for tag, value in sorted(values):
+      value /= 1024.0 * 1024.0
+      if self._summary_writer is not None:
+        summary = tf.Summary(value=[tf.Summary.Value(tag=tag, simple_value=value)])
+        self._summary_writer.add_summary(summary, step)
+      tf.logging.info("Step %d %s: %.2f MB", step, tag, value)
+
+
+class AsyncCheckpointSaverHook(tf.train.CheckpointSaverHook):
+  """Checkpoint saver that writes the checkpoints from a background thread.
+
+  The variables are first copied to host memory and then written while the
+  training continues. If a checkpoint is requested while the previous one is
+  still being written, the training waits for it to complete. The snapshot
+  time, the time to checkpoint, and the training stall time are logged.
+
+  As it is a ``tf.train.CheckpointSaverHook``, the Estimator does not add its
+  own synchronous saver when this hook is passed to the training.
+  """
+
+  def __init__(self,
+               checkpoint_dir,
+               save_secs=None,
+               save_steps=None,
+               keep_checkpoint_max=5,
+               checkpoint_basename="model.ckpt",
+               listeners=None):
+    """Initializes this hook.
+
+    Args:
+      checkpoint_dir: The directory to save the checkpoints to.
+      save_secs: Save a checkpoint every this many seconds.
+      save_steps: Save a checkpoint every this many steps.
+      keep_checkpoint_max: The maximum number of checkpoints to keep. If
+        ``None`` or 0, all checkpoints are kept.
+      checkpoint_basename: The checkpoint file base name.
+      listeners: A list of ``tf.train.CheckpointSaverListener`` to notify. The
+        ``after_save`` callbacks are invoked from the training thread once the
+        checkpoint is written.
+    """
+    super(AsyncCheckpointSaverHook, self).__init__(
+        checkpoint_dir,
+        save_secs=save_secs,
+        save_steps=save_steps,
+        checkpoint_basename=checkpoint_basename,
+        listeners=listeners)
+    self._checkpoint_dir = checkpoint_dir
+    self._keep_checkpoint_max = keep_checkpoint_max
+    self._thread = None
+    self._pending_step = None
+    self._error = None
+
+  def begin(self):
+    super(AsyncCheckpointSaverHook, self).begin()
+    self._variables = tf.global_variables()
+    self._names = [variable.op.name for variable in self._variables]
+    checkpoint_state = tf.train.get_checkpoint_state(self._checkpoint_dir)
+    if checkpoint_state is not None:
+      self._checkpoints = list(checkpoint_state.all_model_checkpoint_paths)
+    else:
+      self._checkpoints = []
+    self._writer = CheckpointWriter()
+
+  def after_run(self, run_context, run_values):
+    self._complete_save(run_context.session, block=False)
+    return super(AsyncCheckpointSaverHook, self).after_run(run_context, run_values)
+
+  def end(self, session):
+    last_step = session.run(self._global_step_tensor)
+    if last_step != self._timer.last_triggered_step():
+      self._save(session, last_step)
+    self._complete_save(session, block=True)
+    self._writer.close()
+    for listener in self._listeners:
+      listener.end(session, last_step)
+
+  def _save(self, session, step):
+    for listener in self._listeners:
+      listener.before_save(session, step)
+    # Back-pressure: only one checkpoint is written at a time.
+    self._complete_save(session, block=True, warn_on_wait=True)
+
+    start = time.time()
+    values = session.run(self._variables)
+    tf.logging.info(
+        "Copied variables of step %d to host memory in %.2f seconds", step, time.time() - start)
+
+    save_path = "{}-{}".format(self._save_path, step)
+    self._pending_step = step
+    self._thread = threading.Thread(target=self._write, args=(save_path, values, start))
+    self._thread.start()
+    return False
+
+  def _write(self, save_path, values, start):
+    """Writes the checkpoint and removes the oldest ones."""
+    try:
+      self._writer.save(save_path, zip(self._names, values))
+      self._checkpoints = [path for path in self._checkpoints if path != save_path]
+      self._checkpoints.append(save_path)
+      if self._keep_checkpoint_max:
+        while len(self._checkpoints) > self._keep_checkpoint_max:
+          checkpoint.remove_checkpoint(self._checkpoints.pop(0))
+      tf.train.update_checkpoint_state(
+          self._checkpoint_dir, save_path, all_model_checkpoint_paths=self._checkpoints)
+      tf.logging.info(
+          "Saved checkpoint %s in %.2f seconds", save_path, time.time() - start)
+    except Exception as e:  # pylint: disable=broad-except
+      self._error = e
+
+  def _complete_save(self, session, block=True, warn_on_wait=False):
+    """Notifies the listeners once the pending checkpoint is written.
+
+    Args:
+      session: The training session.
+      block: If ``True``, wait for the pending checkpoint to be written.
+      warn_on_wait: If ``True``, log the time the training waited for the
+        pending checkpoint.
+    """
+    if self._thread is None:
+      return
+    if self._thread.is_alive():
+      if not block:
+        return
+      start = time.time()
+      self._thread.join()
+      if warn_on_wait:
+        tf.logging.warning(
+            "Training stalled %.2f seconds waiting for the previous checkpoint to be written",
+            time.time() - start)
+    self._thread = None
+    if self._error is not None:
+      error, self._error = self._error, None
+      raise error
+    step, self._pending_step = self._pending_step, None
+    self._summary_writer.add_session_log(
+        tf.SessionLog(status=tf.SessionLog.CHECKPOINT, checkpoint_path=self._save_path),
+        step)
+    for listener in self._listeners:
+      listener.after_save(session, step)
+
+
 class SaveEvaluationPredictionHook(tf.train.SessionRunHook):
-  """Hook that saves the evaluation predictions."""
+  """Hook that saves the evaluation predictions.
+
+  When the evaluation runs during the training, the post evaluation function
+  (e.g. the external evaluators) is called from a background worker so that
+  the training is not blocked while the predictions are scored.
+  """
 
-  def __init__(self, model, output_file, mode, post_evaluation_fn=None, best_models_dir=None):
+  def __init__(self,
+               model,
+               output_file,
+               mode,
+               post_evaluation_fn=None,
+               best_models_dir=None,
+               checkpoint_dir=None,
+               num_workers=1,
+               params=None):
     """Initializes this hook.
 
     Args:
       model: The model for which to save the evaluation predictions.
       output_file: The output filename which will be suffixed by the current
         training step.
+      mode: The run mode. The post evaluation is asynchronous when it is
+        ``tf.estimator.ModeKeys.TRAIN``.
       post_evaluation_fn: (optional) A callable that takes as argument the
-        current step and the file with the saved predictions.
+        current step and the file with the saved predictions, and returns the
+        tuple ``(scores, names, higher_is_better)``.
+      best_models_dir: (optional) The directory where to copy the evaluated
+        checkpoints that obtain the best scores.
+      checkpoint_dir: The directory containing the evaluated checkpoints.
+        Required when :obj:`best_models_dir` is set.
+      num_workers: The number of background workers calling
+        :obj:`post_evaluation_fn`.
+      params: (optional) Dictionary of formatting parameters passed to the
+        model, e.g. ``detokenization_processes``.
     """
     self._model = model
     self._output_file = output_file
     self._post_evaluation_fn = post_evaluation_fn
-    self._best_external_scores = [[0, -1]]  # list initialization to record external scores
     self._best_models_dir = best_models_dir
+    self._checkpoint_dir = checkpoint_dir
     self._mode = mode
-
+    self._num_workers = num_workers
+    self._params = params
+    self._best_external_scores = {}
+    self._latest_scores = {}
+    self._lock = threading.Lock()
+    self._pool = None
+    self._output_stream = None
 
   def begin(self):
     self._predictions = misc.get_dict_from_collection("predictions")
-    self._saver = tf.train.Saver()
     if not self._predictions:
       raise RuntimeError("The model did not define any predictions.")
     self._global_step = tf.train.get_global_step()
     if self._global_step is None:
       raise RuntimeError("Global step should be created to use SaveEvaluationPredictionHook.")
     if self._best_models_dir is not None:
-        if not os.path.exists(self._best_models_dir):
-            os.makedirs(self._best_models_dir)
-
+      if not os.path.exists(self._best_models_dir):
+        os.makedirs(self._best_models_dir)
 
   def before_run(self, run_context):  # pylint: disable=unused-argument
     return tf.train.SessionRunArgs([self._predictions, self._global_step])
 
   def after_run(self, run_context, run_values):  # pylint: disable=unused-argument
-    predictions, self._current_step= run_values.results
-    self._output_path = "{}.{}".format(self._output_file, self._current_step)
-    with io.open(self._output_path, encoding="utf-8", mode="a") as output_file:
-      for prediction in misc.extract_batches(predictions):
-        self._model.print_prediction(prediction, stream=output_file)
+    predictions, self._current_step = run_values.results
+    if self._output_stream is None:
+      # The predictions file stays open for the whole evaluation.
+      self._output_path = "{}.{}".format(self._output_file, self._current_step)
+      self._output_stream = io.open(self._output_path, encoding="utf-8", mode="w")
+    self._model.print_predictions(
+        misc.extract_batches(predictions), params=self._params, stream=self._output_stream)
 
   def end(self, session):
+    if self._output_stream is None:
+      return
+    self._output_stream.close()
+    self._output_stream = None
+    self._model.close()
     tf.logging.info("Evaluation predictions saved to %s", self._output_path)
-    if self._post_evaluation_fn is not None:
-      external_evaluator_scores, external_evaluator_names = self._post_evaluation_fn(self._current_step, self._output_path)
-      if self._best_models_dir and external_evaluator_scores and self._mode == tf.estimator.ModeKeys.TRAIN:
-        self.save_best_model(external_evaluator_scores, external_evaluator_names, session)
-
-  def save_best_model(self, new_scores, evaluator_names, session):
-    for new_score, new_evaluator_name in zip(new_scores, evaluator_names):
-      if any(x[1] < new_score for x in self._best_external_scores):
-        self._best_external_scores.append([self._global_step.eval(session), new_score])
-        self._best_external_scores = sorted(self._best_external_scores, key=lambda k: k[1])[:10]
-        save_name = "model.ckpt-{}.{}-{}".format(self._global_step.eval(session), new_evaluator_name, new_score)
-        save_path = os.path.join(self._best_models_dir, save_name)
-        tf.logging.info("Saving new best external evaluator model in {}".format(save_path))
-        tf.logging.info(self._best_external_scores)
-        self._saver.save(session, save_path)
\ No newline at end of file
+    if self._post_evaluation_fn is None:
+      return
+    checkpoint_path = None
+    if self._best_models_dir is not None:
+      # Keep the evaluated checkpoint until it is scored as it could be
+      # removed by the training in the meantime.
+      checkpoint_path = self._pin_checkpoint(self._current_step)
+    args = (self._current_step, self._output_path, checkpoint_path)
+    if self._mode == tf.estimator.ModeKeys.TRAIN:
+      if self._pool is None:
+        self._pool = ThreadPool(self._num_workers)
+        atexit.register(self.wait)
+      self._pool.apply_async(self._post_evaluation, args)
+    else:
+      self._post_evaluation(*args)
+
+  def wait(self):
+    """Waits for the pending post evaluations to complete."""
+    if self._pool is not None:
+      self._pool.close()
+      self._pool.join()
+      self._pool = None
+
+  def _pin_checkpoint(self, step):
+    """Links the files of the checkpoint of :obj:`step` in a pending directory."""
+    checkpoint_path = os.path.join(self._checkpoint_dir, "model.ckpt-{}".format(step))
+    pinned_path = checkpoint.copy_checkpoint(
+        checkpoint_path,
+        os.path.join(self._best_models_dir, "pending", os.path.basename(checkpoint_path)))
+    if pinned_path is None:
+      tf.logging.warning("Evaluated checkpoint %s not found", checkpoint_path)
+    return pinned_path
+
+  def _post_evaluation(self, step, predictions_path, checkpoint_path):
+    try:
+      results = self._post_evaluation_fn(step, predictions_path)
+      if results is not None:
+        with self._lock:
+          self._latest_scores = {
+              name: (score, higher)
+              for score, name, higher in zip(*results)}
+        if checkpoint_path is not None:
+          self.save_best_model(step, checkpoint_path, *results)
+    except Exception:  # pylint: disable=broad-except
+      tf.logging.error(
+          "Post evaluation of step %d failed:\n%s", step, traceback.format_exc())
+    finally:
+      if checkpoint_path is not None:
+        checkpoint.remove_checkpoint(checkpoint_path)
+
+  @property
+  def latest_scores(self):
+    """The scores returned by the latest post evaluation, as a dictionary
+    mapping evaluator names to ``(score, higher_is_better)`` tuples.
+    """
+    with self._lock:
+      return dict(self._latest_scores)
+
+  def save_best_model(self, step, checkpoint_path, scores, names, higher_is_better=None):
+    """Copies the evaluated checkpoint in the best models directory if it
+    improved one of the 10 best scores of an evaluator.
+
+    Args:
+      step: The evaluated step.
+      checkpoint_path: The path to the evaluated checkpoint.
+      scores: The list of scores.
+      names: The list of evaluators name.
+      higher_is_better: The list of booleans defining if higher scores are
+        better for each evaluator. By default, all evaluators are assumed to
+        be maximized.
+    """
+    if higher_is_better is None:
+      higher_is_better = [True] * len(scores)
+    for score, name, higher in zip(scores, names, higher_is_better):
+      if score is None:
+        continue
+      key = score if higher else -score
+      with self._lock:
+        best_scores = self._best_external_scores.setdefault(name, [])
+        if len(best_scores) >= 10 and all(key <= best[1] for best in best_scores):
+          continue
+        best_scores.append([step, key])
+        best_scores.sort(key=lambda best: best[1], reverse=True)
+        del best_scores[10:]
+      save_path = os.path.join(
+          self._best_models_dir, "model.ckpt-{}.{}-{}".format(step, name, score))
+      tf.logging.info("Saving new best external evaluator model in {}".format(save_path))
+      checkpoint.copy_checkpoint(checkpoint_path, save_path)
@@ -3,25 +3,40 @@
 import tensorflow as tf
 
 
-def _smooth_one_hot_labels(logits, labels, label_smoothing):
-  label_smoothing = tf.constant(label_smoothing, dtype=logits.dtype)
-  num_classes = tf.shape(logits)[-1]
-  return tf.one_hot(
-      tf.cast(labels, tf.int32),
-      num_classes,
-      on_value=1.0 - label_smoothing,
-      off_value=label_smoothing / tf.cast(num_classes - 1, label_smoothing.dtype),
-      dtype=logits.dtype)
+def _gather_last_dim(params, indices):
+  """Gathers ``params[..., indices]`` along the last dimension."""
+  depth = tf.shape(params)[-1]
+  flat_params = tf.reshape(params, [-1, depth])
+  flat_indices = tf.reshape(tf.cast(indices, tf.int32), [-1])
+  rows = tf.range(tf.shape(flat_indices)[0])
+  values = tf.gather_nd(flat_params, tf.stack([rows, flat_indices], axis=1))
+  return tf.reshape(values, tf.shape(indices))
+
+def _smoothed_softmax_cross_entropy(logits, labels, label_smoothing):
+  """Computes the label smoothed cross entropy without building the smoothed
+  one-hot labels.
+
+  The gold class has the probability ``1 - label_smoothing`` and the other
+  classes ``label_smoothing / (num_classes - 1)``, so the loss only depends on
+  the gold log probability and on the sum of the log probabilities.
+  """
+  dtype = logits.dtype
+  if dtype == tf.float16:
+    # The sum of the log probabilities can overflow in half precision.
+    logits = tf.cast(logits, tf.float32)
+  num_classes = tf.cast(tf.shape(logits)[-1], logits.dtype)
+  on_value = 1.0 - label_smoothing
+  off_value = label_smoothing / (num_classes - 1)
+
+  log_probs = tf.nn.log_softmax(logits)
+  gold_log_probs = _gather_last_dim(log_probs, labels)
+  sum_log_probs = tf.reduce_sum(log_probs, axis=-1)
+  cross_entropy = -((on_value - off_value) * gold_log_probs + off_value * sum_log_probs)
+  return tf.cast(cross_entropy, dtype)
 
 def _softmax_cross_entropy(logits, labels, label_smoothing, mode):
   if mode == tf.estimator.ModeKeys.TRAIN and label_smoothing > 0.0:
-    smoothed_labels = _smooth_one_hot_labels(logits, labels, label_smoothing)
-    if hasattr(tf.nn, "softmax_cross_entropy_with_logits_v2"):
-      cross_entropy_fn = tf.nn.softmax_cross_entropy_with_logits_v2
-    else:
-      cross_entropy_fn = tf.nn.softmax_cross_entropy_with_logits
-    return cross_entropy_fn(
-        logits=logits, labels=smoothed_labels)
+    return _smoothed_softmax_cross_entropy(logits, labels, label_smoothing)
   else:
     return tf.nn.sparse_softmax_cross_entropy_with_logits(
         logits=logits, labels=labels)
@@ -61,6 +76,62 @@ def cross_entropy_sequence_loss(logits,
 
   return loss, loss_normalizer, loss_token_normalizer
 
+def sampled_softmax_sequence_loss(outputs,
+                                  weights,
+                                  biases,
+                                  labels,
+                                  sequence_length,
+                                  num_samples,
+                                  average_in_time=False):
+  """Computes the sampled softmax loss of sequences as described in
+  https://arxiv.org/abs/1412.2007.
+
+  The logits are only computed for the true labels and a set of sampled
+  classes so that the :math:`[B, T, V]` logits tensor is never built. This loss
+  should only be used for training.
+
+  Args:
+    outputs: The decoder outputs of shape :math:`[B, T, D]`.
+    weights: The output projection weights of shape :math:`[V, D]`. The
+      vocabulary size :math:`V` must be statically known.
+    biases: The output projection biases of shape :math:`[V]`.
+    labels: The true labels.
+    sequence_length: The length of each sequence.
+    num_samples: The number of classes to sample per batch.
+    average_in_time: If ``True``, also average the loss in the time dimension.
+
+  Returns:
+    A tuple (cumulated loss, loss normalizer, token-level normalizer).
+  """
+  batch_size = tf.shape(outputs)[0]
+  max_time = tf.shape(outputs)[1]
+  depth = tf.shape(outputs)[-1]
+  dtype = outputs.dtype
+  if dtype == tf.float16:
+    outputs = tf.cast(outputs, tf.float32)
+    weights = tf.cast(weights, tf.float32)
+    biases = tf.cast(biases, tf.float32)
+
+  cross_entropy = tf.nn.sampled_softmax_loss(
+      weights,
+      biases,
+      tf.reshape(tf.cast(labels, tf.int64), [-1, 1]),
+      tf.reshape(outputs, [-1, depth]),
+      num_samples,
+      weights.get_shape()[0].value)
+  cross_entropy = tf.cast(tf.reshape(cross_entropy, [batch_size, max_time]), dtype)
+
+  mask = tf.sequence_mask(sequence_length, maxlen=max_time, dtype=dtype)
+  loss = tf.reduce_sum(cross_entropy * mask)
+  loss_token_normalizer = tf.reduce_sum(mask)
+
+  if average_in_time:
+    loss_normalizer = loss_token_normalizer
+  else:
+    loss_normalizer = tf.cast(batch_size, loss.dtype)
+
+  return loss, loss_normalizer, loss_token_normalizer
+
 def cross_entropy_loss(logits,
                        labels,
                        label_smoothing=0.0,
@@ -2,6 +2,7 @@
 
 from __future__ import print_function
 
+import multiprocessing
 import os
 import sys
 import inspect
@@ -97,6 +98,29 @@ def extract_batches(tensors):
       }
 
 
+def create_process_pool(num_processes, initializer=None, initargs=()):
+  """Creates a pool of processes that can be started from a multithreaded
+  process.
+
+  Forking a process that runs TensorFlow threads is unsafe, so the workers are
+  started with the ``spawn`` method when it is available (Python 3). The
+  :obj:`initializer` and the submitted functions should be defined at the top
+  level of a module and their arguments should be picklable.
+
+  Args:
+    num_processes: The number of worker processes.
+    initializer: (optional) A callable run by each worker when it starts.
+    initargs: The arguments of :obj:`initializer`.
+
+  Returns:
+    A ``multiprocessing.Pool``.
+  """
+  if hasattr(multiprocessing, "get_context"):
+    context = multiprocessing.get_context("spawn")
+  else:
+    context = multiprocessing
+  return context.Pool(num_processes, initializer=initializer, initargs=initargs)
+
 # The next 2 functions come with the following license and copyright:
 
 # Copyright 2017 Google Inc.
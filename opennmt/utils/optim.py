@@ -4,6 +4,7 @@ import tensorflow as tf
 
 from opennmt.utils import decay
 from opennmt.utils import adafactor
+from opennmt.utils.parallel import all_reduce_gradients
 
 
 def learning_rate_decay_fn(decay_type,
@@ -84,12 +85,55 @@ def get_optimizer_class(classname):
 
   return optimizer_class
 
-def optimize(loss, params):
+def float32_variable_storage_getter(getter,
+                                    name,
+                                    shape=None,
+                                    dtype=None,
+                                    initializer=None,
+                                    regularizer=None,
+                                    trainable=True,
+                                    *args,
+                                    **kwargs):
+  """Custom variable getter that stores trainable variables in float32.
+
+  Trainable variables requested with a lower precision are created in float32
+  and cast to the requested type when read. The optimizer then updates the
+  float32 master copies so that small updates are not lost to rounding.
+
+  See ``tf.variable_scope`` 's ``custom_getter`` argument.
+  """
+  storage_dtype = tf.float32 if trainable else dtype
+  variable = getter(
+      name,
+      shape,
+      dtype=storage_dtype,
+      initializer=initializer,
+      regularizer=regularizer,
+      trainable=trainable,
+      *args,
+      **kwargs)
+  if trainable and dtype is not None and dtype != tf.float32:
+    variable = tf.cast(variable, dtype)
+  return variable
+
+def optimize(loss,
+             params,
+             mixed_precision=False,
+             replica_losses=None,
+             devices=None,
+             all_reduce="ring"):
   """Minimizes the loss.
 
   Args:
     loss: The loss to minimize.
     params: A dictionary of hyperparameters.
+    mixed_precision: If ``True``, the model is computed in float16 and dynamic
+      loss scaling is enabled by default.
+    replica_losses: (optional) The list of losses computed on each device.
+      They should sum to :obj:`loss`. If set, the gradients are computed on
+      each device and summed with :obj:`all_reduce`.
+    devices: The devices that computed :obj:`replica_losses`.
+    all_reduce: The all-reduce algorithm used to sum the replicas gradients.
 
   Returns:
     The loss minimization op.
@@ -122,16 +166,385 @@ def optimize(loss, params):
   else:
     optimizer = lambda lr: optimizer_class(lr, **optimizer_params)
 
-  return tf.contrib.layers.optimize_loss(
-      loss,
-      global_step,
-      learning_rate,
-      optimizer,
-      clip_gradients=clip_gradients,
-      learning_rate_decay_fn=decay_fn,
-      name="optim",
-      summaries=[
-          "learning_rate",
-          "global_gradient_norm",
-      ],
-      colocate_gradients_with_ops=True)
+  loss_scale = params.get("loss_scale", "dynamic" if mixed_precision else None)
+
+  accum_count = params.get("gradients_accum", 1)
+  if accum_count < 1:
+    raise ValueError("gradients_accum must be a positive integer, saw {}".format(accum_count))
+
+  # This follows tf.contrib.layers.optimize_loss to keep variables and summaries
+  # names unchanged, but allows to delay the parameters update.
+  with tf.variable_scope("optim"):
+    learning_rate = tf.get_variable(
+        "learning_rate",
+        [],
+        trainable=False,
+        initializer=tf.constant_initializer(learning_rate))
+    if decay_fn is not None:
+      learning_rate = decay_fn(learning_rate, global_step)
+    tf.summary.scalar("learning_rate", learning_rate)
+
+    update_ops = tf.get_collection(tf.GraphKeys.UPDATE_OPS)
+    if update_ops:
+      with tf.control_dependencies(update_ops):
+        loss = tf.identity(loss)
+        if replica_losses is not None:
+          replica_losses = [tf.identity(replica_loss) for replica_loss in replica_losses]
+
+    optimizer = optimizer(learning_rate)
+    objective = loss if replica_losses is None else replica_losses
+    if loss_scale is not None:
+      gradients, skip_update, loss_scale_op = scaled_gradients(
+          optimizer, objective, loss_scale=loss_scale, devices=devices, all_reduce=all_reduce)
+    else:
+      gradients = compute_gradients(
+          optimizer, objective, devices=devices, all_reduce=all_reduce)
+      skip_update, loss_scale_op = None, None
+    if not gradients:
+      raise ValueError("No gradients provided for any variable")
+    tf.summary.scalar(
+        "global_norm/gradient_norm",
+        tf.global_norm([grad for grad, _ in gradients]))
+
+    train_op, applied = delayed_update(
+        optimizer,
+        gradients,
+        global_step,
+        accum_count=accum_count,
+        clip_gradients=clip_gradients,
+        skip_update=skip_update)
+    if loss_scale_op is not None:
+      train_op = tf.group(train_op, loss_scale_op)
+
+  moving_average_decay = params.get("moving_average_decay")
+  if moving_average_decay is not None:
+    train_op = update_moving_averages(
+        train_op, moving_average_decay, global_step, applied=applied)
+
+  with tf.control_dependencies([train_op]):
+    return tf.identity(loss)
+
+def update_moving_averages(train_op, decay, global_step, applied=None):
+  """Maintains an exponential moving average of the trainable variables.
+
+  The shadow variables are named ``<variable>/ExponentialMovingAverage`` and
+  are saved in the checkpoints alongside the model variables. As with the
+  ``num_updates`` argument of ``tf.train.ExponentialMovingAverage``, the decay
+  is lowered to ``(1 + step) / (10 + step)`` during the first updates.
+
+  Args:
+    train_op: The training op.
+    decay: The decay of the moving average.
+    global_step: The training step, used to lower the decay during the first
+      updates.
+    applied: (optional) A boolean ``tf.Tensor`` that is ``True`` when
+      :obj:`train_op` updated the parameters, as returned by
+      :func:`opennmt.utils.optim.delayed_update`. When ``False``, the moving
+      averages are left unchanged (e.g. on gradient accumulation steps or
+      skipped updates).
+
+  Returns:
+    An op that runs :obj:`train_op` and then updates the moving averages.
+  """
+  with tf.control_dependencies([train_op]):
+    # The step is read after the parameters update.
+    step = tf.to_float(tf.identity(global_step))
+    decay = tf.minimum(tf.constant(decay, dtype=tf.float32), (1.0 + step) / (10.0 + step))
+    if applied is not None:
+      decay = tf.where(applied, decay, tf.ones_like(decay))
+    moving_average = tf.train.ExponentialMovingAverage(decay)
+    return moving_average.apply(tf.trainable_variables())
+
+def moving_average_saver(params):
+  """Returns a saver that restores the moving averages of the trainable
+  variables in place of their values.
+
+  Args:
+    params: A dictionary of hyperparameters.
+
+  Returns:
+    A ``tf.train.Saver`` or ``None`` if ``moving_average_decay`` is not set in
+    :obj:`params`.
+  """
+  decay = params.get("moving_average_decay")
+  if decay is None:
+    return None
+  moving_average = tf.train.ExponentialMovingAverage(decay)
+  return tf.train.Saver(var_list=moving_average.variables_to_restore())
+
+def compute_gradients(optimizer, loss, devices=None, all_reduce="ring"):
+  """Computes the gradients of the loss.
+
+  Args:
+    optimizer: The ``tf.train.Optimizer`` instance.
+    loss: The loss or a list of losses computed on each device of
+      :obj:`devices`. In the latter case, the gradients of each loss are
+      computed on its device and summed with an all-reduce.
+    devices: The devices that computed the losses.
+    all_reduce: The all-reduce algorithm: ``"ring"`` or ``"hierarchical"``.
+
+  Returns:
+    The list of (gradient, variable) pairs, without variables that have no
+    gradient.
+  """
+  if not isinstance(loss, list):
+    gradients = optimizer.compute_gradients(loss, colocate_gradients_with_ops=True)
+    return [(grad, var) for grad, var in gradients if grad is not None]
+
+  replica_gradients = []
+  variables = None
+  for replica_loss, device in zip(loss, devices):
+    with tf.device(device):
+      gradients = optimizer.compute_gradients(
+          replica_loss, colocate_gradients_with_ops=True)
+    replica_gradients.append([grad for grad, _ in gradients])
+    variables = [var for _, var in gradients]
+  with tf.name_scope("all_reduce"):
+    gradients = all_reduce_gradients(replica_gradients, devices, algorithm=all_reduce)
+  return [(grad, var) for grad, var in zip(gradients, variables) if grad is not None]
+
+def _clip_gradients_by_norm(grads_and_vars, clip_gradients):
+  """Clips gradients by their global norm."""
+  gradients, variables = zip(*grads_and_vars)
+  clipped_gradients, _ = tf.clip_by_global_norm(gradients, clip_gradients)
+  return list(zip(clipped_gradients, variables))
+
+def _scale_gradient(grad, scale):
+  """Multiplies a dense or sparse gradient by a scalar."""
+  if isinstance(grad, tf.IndexedSlices):
+    return tf.IndexedSlices(grad.values * scale, grad.indices, dense_shape=grad.dense_shape)
+  return grad * scale
+
+def _all_finite(gradients):
+  """Returns a boolean ``tf.Tensor`` that is ``True`` if all gradients are finite."""
+  checks = []
+  for grad in gradients:
+    if isinstance(grad, tf.IndexedSlices):
+      grad = grad.values
+    checks.append(tf.reduce_all(tf.is_finite(grad)))
+  return tf.reduce_all(tf.stack(checks))
+
+def scaled_gradients(optimizer,
+                     loss,
+                     loss_scale="dynamic",
+                     initial_scale=2**15,
+                     increment_period=2000,
+                     multiplier=2.0,
+                     devices=None,
+                     all_reduce="ring"):
+  """Computes the gradients of a scaled loss to avoid float16 underflows.
+
+  The loss is multiplied by a scale before the backward pass and the gradients
+  are divided by the same scale. With dynamic loss scaling, the scale is
+  divided by :obj:`multiplier` when a gradient overflows and multiplied by
+  :obj:`multiplier` after :obj:`increment_period` steps without overflow.
+
+  The loss scale and the number of skipped steps are summarized in TensorBoard.
+
+  Args:
+    optimizer: The ``tf.train.Optimizer`` instance.
+    loss: The loss to minimize or a list of losses computed on each device.
+    loss_scale: ``"dynamic"`` or a constant scale.
+    initial_scale: The initial dynamic loss scale.
+    increment_period: The number of steps without overflow after which the
+      dynamic loss scale is increased.
+    multiplier: The factor to increase or decrease the dynamic loss scale by.
+    devices: The devices that computed the losses, if :obj:`loss` is a list.
+    all_reduce: The all-reduce algorithm, if :obj:`loss` is a list.
+
+  Returns:
+    A tuple ``(grads_and_vars, skip_update, loss_scale_op)`` with the list of
+    (gradient, variable) pairs, a boolean ``tf.Tensor`` that is ``True`` when
+    a gradient is not finite and the update should be skipped, and an operation
+    updating the loss scale state.
+  """
+  dynamic = loss_scale == "dynamic"
+  if dynamic:
+    scale_var = tf.get_variable(
+        "loss_scale",
+        initializer=tf.constant(float(initial_scale)),
+        trainable=False)
+    scale = tf.identity(scale_var)
+  else:
+    scale = tf.constant(float(loss_scale))
+
+  if isinstance(loss, list):
+    scaled_loss = [replica_loss * tf.cast(scale, replica_loss.dtype) for replica_loss in loss]
+  else:
+    scaled_loss = loss * tf.cast(scale, loss.dtype)
+  gradients = compute_gradients(
+      optimizer, scaled_loss, devices=devices, all_reduce=all_reduce)
+  gradients = [
+      (_scale_gradient(grad, tf.cast(1.0 / scale, grad.dtype)), var)
+      for grad, var in gradients]
+  if not gradients:
+    return gradients, None, None
+
+  is_finite = _all_finite([grad for grad, _ in gradients])
+  skip_update = tf.logical_not(is_finite)
+
+  skipped_steps = tf.get_variable(
+      "skipped_steps",
+      initializer=tf.constant(0, dtype=tf.int64),
+      trainable=False)
+  update_ops = [tf.assign_add(skipped_steps, tf.cast(skip_update, tf.int64))]
+
+  if dynamic:
+    good_steps = tf.get_variable(
+        "loss_scale_good_steps",
+        initializer=tf.constant(0, dtype=tf.int64),
+        trainable=False)
+
+    def _increase_or_keep():
+      return tf.cond(
+          good_steps + 1 >= increment_period,
+          true_fn=lambda: tf.group(
+              tf.assign(scale_var, scale * multiplier),
+              tf.assign(good_steps, 0)),
+          false_fn=lambda: tf.group(tf.assign_add(good_steps, 1)))
+
+    def _decrease():
+      return tf.group(
+          tf.assign(scale_var, tf.maximum(scale / multiplier, 1.0)),
+          tf.assign(good_steps, 0))
+
+    update_ops.append(tf.cond(is_finite, true_fn=_increase_or_keep, false_fn=_decrease))
+
+  tf.summary.scalar("loss_scale", scale)
+  tf.summary.scalar("skipped_steps", skipped_steps)
+  return gradients, skip_update, tf.group(*update_ops)
+
+def delayed_update(optimizer,
+                   grads_and_vars,
+                   global_step,
+                   accum_count=1,
+                   clip_gradients=None,
+                   skip_update=None):
+  """Possibly delays the parameters update by first accumulating gradients.
+
+  When :obj:`accum_count` is greater than 1, the gradients are averaged in
+  non trainable variables over :obj:`accum_count` training steps and the
+  parameters are only updated on the last step. The global step is incremented
+  on each parameters update so that the learning rate schedule is unchanged.
+
+  Sparse gradients (e.g. of embeddings) are accumulated in a dense buffer with
+  the same shape as the variable, but only the rows touched during the
+  accumulation are passed to the optimizer as ``tf.IndexedSlices``. The
+  optimizer can then still update the parameters row-wise.
+
+  ``optimizer.apply_gradients`` is called once, in a ``tf.cond`` on the
+  returned predicate. It creates the optimizer slots outside of the
+  conditional context.
+
+  Args:
+    optimizer: The ``tf.train.Optimizer`` instance.
+    grads_and_vars: List of (gradient, variable) pairs.
+    global_step: The training step that will be incremented on update.
+    accum_count: The number of steps to accumulate gradients over.
+    clip_gradients: Maximum global norm of the applied gradients.
+    skip_update: (optional) A boolean ``tf.Tensor``. When ``True``, the
+      gradients of the current step are discarded (e.g. on overflow).
+
+  Returns:
+    A tuple ``(train_op, applied)`` with the operation that accumulates and
+    conditionally applies the gradients, and a boolean ``tf.Tensor`` that is
+    ``True`` when the parameters are updated by this step.
+  """
+  if accum_count == 1:
+    if clip_gradients is not None:
+      grads_and_vars = _clip_gradients_by_norm(grads_and_vars, clip_gradients)
+      tf.summary.scalar(
+          "global_norm/clipped_gradient_norm",
+          tf.global_norm([grad for grad, _ in grads_and_vars]))
+    if skip_update is None:
+      train_op = optimizer.apply_gradients(grads_and_vars, global_step=global_step, name="train")
+      return train_op, tf.constant(True)
+    applied = tf.logical_not(skip_update)
+    train_op = tf.cond(
+        applied,
+        true_fn=lambda: tf.group(
+            optimizer.apply_gradients(grads_and_vars, global_step=global_step)),
+        false_fn=tf.no_op,
+        name="train")
+    return train_op, applied
+
+  accum_step = tf.get_variable(
+      "gradients_accum_step",
+      initializer=tf.constant(0, dtype=tf.int64),
+      trainable=False)
+  accum_grads = []
+  touched_rows = []
+  for grad, var in grads_and_vars:
+    with tf.colocate_with(var):
+      accum_grads.append(tf.get_variable(
+          var.op.name + "/accum",
+          shape=var.get_shape(),
+          dtype=var.dtype.base_dtype,
+          initializer=tf.zeros_initializer(),
+          trainable=False))
+      if isinstance(grad, tf.IndexedSlices):
+        touched_rows.append(tf.get_variable(
+            var.op.name + "/accum_rows",
+            shape=var.get_shape()[:1],
+            dtype=tf.bool,
+            initializer=tf.zeros_initializer(),
+            trainable=False))
+      else:
+        touched_rows.append(None)
+
+  reset = tf.equal(accum_step % accum_count, 0)
+  applied = tf.equal((accum_step + 1) % accum_count, 0)
+  if skip_update is not None:
+    applied = tf.logical_and(applied, tf.logical_not(skip_update))
+
+  def _accumulate(reset):
+    update_ops = [tf.assign_add(accum_step, 1)]
+    for accum_grad, rows, (grad, _) in zip(accum_grads, touched_rows, grads_and_vars):
+      grad = _scale_gradient(grad, 1.0 / accum_count)
+      if isinstance(grad, tf.IndexedSlices):
+        reset_ops = []
+        if reset:
+          reset_ops.append(tf.assign(accum_grad, tf.zeros_like(accum_grad)))
+          reset_ops.append(tf.assign(rows, tf.zeros_like(rows)))
+        with tf.control_dependencies(reset_ops):
+          update_ops.append(tf.scatter_add(
+              accum_grad, grad.indices, grad.values, use_locking=True))
+          update_ops.append(tf.scatter_update(
+              rows, grad.indices, tf.ones_like(grad.indices, dtype=tf.bool)))
+      elif reset:
+        update_ops.append(tf.assign(accum_grad, grad, use_locking=True))
+      else:
+        update_ops.append(tf.assign_add(accum_grad, grad, use_locking=True))
+    return tf.group(*update_ops)
+
+  def _accumulate_step():
+    return tf.cond(
+        reset,
+        true_fn=lambda: _accumulate(True),
+        false_fn=lambda: _accumulate(False))
+
+  # The update conditions are read before the accumulation step is incremented.
+  with tf.control_dependencies([reset, applied]):
+    if skip_update is None:
+      accumulate_op = _accumulate_step()
+    else:
+      accumulate_op = tf.cond(skip_update, true_fn=tf.no_op, false_fn=_accumulate_step)
+
+  def _apply_gradients():
+    accum_grads_and_vars = []
+    for accum_grad, rows, (_, var) in zip(accum_grads, touched_rows, grads_and_vars):
+      if rows is not None:
+        indices = tf.reshape(tf.where(rows), [-1])
+        accum_grad = tf.IndexedSlices(
+            tf.gather(accum_grad, indices), indices, dense_shape=tf.shape(accum_grad))
+      else:
+        accum_grad = tf.identity(accum_grad)
+      accum_grads_and_vars.append((accum_grad, var))
+    if clip_gradients is not None:
+      accum_grads_and_vars = _clip_gradients_by_norm(accum_grads_and_vars, clip_gradients)
+    return tf.group(optimizer.apply_gradients(accum_grads_and_vars, global_step=global_step))
+
+  with tf.control_dependencies([accumulate_op]):
+    applied = tf.identity(applied)
+  train_op = tf.cond(applied, true_fn=_apply_gradients, false_fn=tf.no_op, name="train")
+  return train_op, applied
@@ -1,5 +1,6 @@
 """Utilities to run execution in parallel."""
 
+import math
 import six
 
 import tensorflow as tf
@@ -12,13 +13,16 @@ class GraphDispatcher(object):
   sharded batches.
   """
 
-  def __init__(self, num_devices, daisy_chain_variables=True):
+  def __init__(self, num_devices, daisy_chain_variables=True, cpu_fallback=False):
     """Initializes the dispatcher.
 
     Args:
       num_devices: The number of devices to dispatch on.
       daisy_chain_variables: If ``True``, variables are copied in a daisy chain
         fashion between devices (credits to Tensor2Tensor).
+      cpu_fallback: If ``True`` and no GPU is visible, dispatch on
+        :obj:`num_devices` CPU devices (see the ``device_count`` field of
+        ``tf.ConfigProto``).
 
     Raises:
       ValueError: if the number of visible devices is lower than
@@ -27,16 +31,24 @@ class GraphDispatcher(object):
     devices = [x.name for x in device_lib.list_local_devices() if x.device_type == "GPU"]
     self._daisy_chain_variables = daisy_chain_variables
 
-    if not devices:
+    if not devices and cpu_fallback and num_devices > 1:
+      self._n = num_devices
+      self._devices = ["/cpu:{}".format(i) for i in range(num_devices)]
+    elif not devices:
       self._n = 1
       self._devices = [None]
     elif len(devices) < num_devices:
       raise ValueError("Only %d devices are visible but %d were requested"
-                       % (len(devices), num_replicas))
+                       % (len(devices), num_devices))
     else:
       self._n = num_devices
       self._devices = devices[:self._n]
 
+  @property
+  def devices(self):
+    """The list of devices to dispatch on (``None`` for the default device)."""
+    return self._devices
+
   def shard(self, data):
     """Shards a structure of ``tf.Tensor`` for dispatching.
 
@@ -121,12 +133,17 @@ class GraphDispatcher(object):
           v = tf.identity(last_device_v)
         else:
           var = getter(name, *args, **kwargs)
-          v = tf.identity(var._ref())  # pylint: disable=protected-access
+          if isinstance(var, tf.Variable):
+            v = tf.identity(var._ref())  # pylint: disable=protected-access
+          else:
+            # The getter can return a tensor (e.g. a variable cast to float16).
+            v = tf.identity(var)
 
         # keep track of the original variable
         tensor_to_var[v] = var
         v.read_value = lambda: tf.identity(v)
-        v.assign_sub = var.assign_sub
+        if hasattr(var, "assign_sub"):
+          v.assign_sub = var.assign_sub
         # update the cache
         cache[name] = v
         cache[device_var_key] = v
@@ -178,3 +195,158 @@ def split_batch(data, num_shards):
       data_shards = tf.split(data, num_shards)
 
   return data_shards
+
+
+def _ring_all_reduce(tensors, devices):
+  """Sums tensors with a ring all-reduce.
+
+  Each tensor is split in as many chunks as devices. Chunks are first summed
+  while being passed around the ring (reduce-scatter) and the reduced chunks
+  are then passed around the ring again (all-gather), so that each device only
+  communicates with its neighbor.
+  """
+  num_devices = len(tensors)
+  if num_devices == 1:
+    return list(tensors)
+
+  chunks = []
+  for tensor, device in zip(tensors, devices):
+    with tf.device(device):
+      flat = tf.reshape(tensor, [-1])
+      padding = (num_devices - tf.size(flat) % num_devices) % num_devices
+      flat = tf.pad(flat, [[0, padding]])
+      chunks.append(tf.split(flat, num_devices))
+
+  # Reduce-scatter: after this loop, device i holds the sum of chunk (i + 1) % n.
+  for step in range(num_devices - 1):
+    new_chunks = [list(device_chunks) for device_chunks in chunks]
+    for i in range(num_devices):
+      j = (i + 1) % num_devices
+      k = (i - step) % num_devices
+      with tf.device(devices[j]):
+        new_chunks[j][k] = chunks[j][k] + chunks[i][k]
+    chunks = new_chunks
+
+  # All-gather.
+  for step in range(num_devices - 1):
+    new_chunks = [list(device_chunks) for device_chunks in chunks]
+    for i in range(num_devices):
+      j = (i + 1) % num_devices
+      k = (i + 1 - step) % num_devices
+      with tf.device(devices[j]):
+        new_chunks[j][k] = tf.identity(chunks[i][k])
+    chunks = new_chunks
+
+  outputs = []
+  for tensor, device, device_chunks in zip(tensors, devices, chunks):
+    with tf.device(device):
+      flat = tf.concat(device_chunks, 0)[:tf.size(tensor)]
+      output = tf.reshape(flat, tf.shape(tensor))
+      output.set_shape(tensor.get_shape())
+      outputs.append(output)
+  return outputs
+
+def _hierarchical_all_reduce(tensors, devices, group_size=None):
+  """Sums tensors with a hierarchical all-reduce.
+
+  Devices are partitioned in groups of :obj:`group_size` devices. Tensors are
+  first summed on the first device of each group, these partial sums are
+  reduced with a ring all-reduce between the groups, and the result is finally
+  broadcasted to each device of the group.
+  """
+  num_devices = len(tensors)
+  if group_size is None:
+    group_size = int(math.ceil(math.sqrt(num_devices)))
+  groups = [
+      list(range(start, min(start + group_size, num_devices)))
+      for start in range(0, num_devices, group_size)]
+
+  group_sums = []
+  for group in groups:
+    with tf.device(devices[group[0]]):
+      group_sums.append(tf.add_n([tensors[i] for i in group]))
+  reduced = _ring_all_reduce(group_sums, [devices[group[0]] for group in groups])
+
+  outputs = [None for _ in range(num_devices)]
+  for group, value in zip(groups, reduced):
+    for i in group:
+      with tf.device(devices[i]):
+        outputs[i] = tf.identity(value)
+  return outputs
+
+def all_reduce(tensors, devices, algorithm="ring"):
+  """Sums tensors located on different devices.
+
+  Args:
+    tensors: A list of ``tf.Tensor`` with the same shape and type, one per
+      device.
+    devices: The list of devices holding :obj:`tensors`.
+    algorithm: The all-reduce algorithm: ``"ring"`` or ``"hierarchical"``.
+
+  Returns:
+    A list of ``tf.Tensor`` containing the sum, one per device.
+
+  Raises:
+    ValueError: if :obj:`algorithm` is invalid or if the number of tensors and
+      devices do not match.
+  """
+  if len(tensors) != len(devices):
+    raise ValueError("Expected one tensor per device, saw %d tensors for %d devices"
+                     % (len(tensors), len(devices)))
+  if algorithm == "ring":
+    return _ring_all_reduce(tensors, devices)
+  elif algorithm == "hierarchical":
+    return _hierarchical_all_reduce(tensors, devices)
+  else:
+    raise ValueError("Invalid all-reduce algorithm: {}".format(algorithm))
+
+def all_reduce_gradients(replica_gradients, devices, algorithm="ring"):
+  """Sums gradients computed on several devices.
+
+  Dense gradients of the same type are packed in a single buffer per device
+  before being all-reduced, which reduces the number of transfers. Sparse
+  gradients (``tf.IndexedSlices``) are gathered on the first device.
+
+  Args:
+    replica_gradients: A list with, for each device, the list of gradients
+      (``tf.Tensor``, ``tf.IndexedSlices`` or ``None``) of the same variables.
+    devices: The list of devices that computed the gradients.
+    algorithm: The all-reduce algorithm: ``"ring"`` or ``"hierarchical"``.
+
+  Returns:
+    The list of summed gradients, located on the first device.
+  """
+  num_variables = len(replica_gradients[0])
+  summed = [None for _ in range(num_variables)]
+  dense_indices = {}
+
+  for v in range(num_variables):
+    gradients = [device_gradients[v] for device_gradients in replica_gradients]
+    if gradients[0] is None:
+      continue
+    if isinstance(gradients[0], tf.IndexedSlices):
+      with tf.device(devices[0]):
+        summed[v] = tf.IndexedSlices(
+            tf.concat([gradient.values for gradient in gradients], 0),
+            tf.concat([gradient.indices for gradient in gradients], 0),
+            dense_shape=gradients[0].dense_shape)
+    else:
+      dense_indices.setdefault(gradients[0].dtype.base_dtype, []).append(v)
+
+  for dtype in sorted(six.iterkeys(dense_indices), key=lambda dtype: dtype.name):
+    indices = dense_indices[dtype]
+    packed = []
+    for device_gradients, device in zip(replica_gradients, devices):
+      with tf.device(device):
+        packed.append(tf.concat(
+            [tf.reshape(device_gradients[v], [-1]) for v in indices], 0))
+    reduced = all_reduce(packed, devices, algorithm=algorithm)[0]
+    with tf.device(devices[0]):
+      sizes = tf.stack([tf.size(replica_gradients[0][v]) for v in indices])
+      splits = tf.split(reduced, sizes, num=len(indices))
+      for v, split in zip(indices, splits):
+        gradient = replica_gradients[0][v]
+        summed[v] = tf.reshape(split, tf.shape(gradient))
+        summed[v].set_shape(gradient.get_shape())
+
+  return summed
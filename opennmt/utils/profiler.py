@@ -0,0 +1,198 @@
+"""Functions to analyze the execution of traced steps."""
+
+import collections
+import os
+import re
+
+import six
+import tensorflow as tf
+
+from tensorflow.python.client import timeline
+
+
+OpStats = collections.namedtuple(
+    "OpStats", ["name", "device", "count", "time_micros", "bytes"])
+
+_TIMELINE_LABEL_RE = re.compile(r"^[^=]+ = ([^(]+)\(")
+
+
+def _get_op_type(node_stats):
+  """Returns the operation type of a traced node."""
+  match = _TIMELINE_LABEL_RE.match(node_stats.timeline_label)
+  if match is not None:
+    return match.group(1)
+  return node_stats.node_name.split(":")[0]
+
+def _get_allocated_bytes(node_stats):
+  """Returns the number of bytes allocated by a traced node."""
+  allocated_bytes = sum(memory.total_bytes for memory in node_stats.memory)
+  if allocated_bytes == 0:
+    allocated_bytes = sum(
+        output.tensor_description.allocation_description.allocated_bytes
+        for output in node_stats.output)
+  return allocated_bytes
+
+def aggregate_step_stats(step_stats, by_type=False):
+  """Aggregates the execution time and the allocated memory of the traced
+  operations.
+
+  Operations that run several times in a step (e.g. within a
+  ``tf.while_loop``) are accumulated. Each device is aggregated separately.
+
+  Args:
+    step_stats: The ``StepStats`` of a ``tf.RunMetadata`` collected with
+      ``tf.RunOptions.FULL_TRACE``.
+    by_type: If ``True``, aggregate by operation type instead of operation name.
+
+  Returns:
+    A list of :class:`opennmt.utils.profiler.OpStats` sorted by decreasing
+    execution time.
+  """
+  stats = {}
+  for dev_stats in step_stats.dev_stats:
+    for node_stats in dev_stats.node_stats:
+      name = _get_op_type(node_stats) if by_type else node_stats.node_name
+      key = (name, dev_stats.device)
+      count, time_micros, allocated_bytes = stats.get(key, (0, 0, 0))
+      stats[key] = (
+          count + 1,
+          time_micros + node_stats.all_end_rel_micros,
+          allocated_bytes + _get_allocated_bytes(node_stats))
+  op_stats = [
+      OpStats(name, device, count, time_micros, allocated_bytes)
+      for (name, device), (count, time_micros, allocated_bytes) in six.iteritems(stats)]
+  op_stats.sort(key=lambda op: op.time_micros, reverse=True)
+  return op_stats
+
+def peak_memory_by_device(step_stats):
+  """Returns the peak memory usage of each allocator during a traced step.
+
+  The peak is the largest ``allocator_bytes_in_use`` value recorded after each
+  operation, i.e. the memory in use by the whole allocator including the
+  memory allocated before the step (e.g. the variables). Allocators that do
+  not report their usage (e.g. with older TensorFlow versions) are omitted.
+
+  Args:
+    step_stats: The ``StepStats`` of a ``tf.RunMetadata`` collected with a
+      trace level of at least ``tf.RunOptions.SOFTWARE_TRACE``.
+
+  Returns:
+    A dictionary mapping allocator names (e.g. ``cpu`` or ``GPU_0_bfc``) to
+    peak bytes.
+  """
+  peaks = {}
+  for dev_stats in step_stats.dev_stats:
+    for node_stats in dev_stats.node_stats:
+      for memory in node_stats.memory:
+        bytes_in_use = getattr(memory, "allocator_bytes_in_use", 0)
+        if bytes_in_use > 0:
+          name = memory.allocator_name
+          peaks[name] = max(peaks.get(name, 0), bytes_in_use)
+  return peaks
+
+GRAPH_SECTIONS = [
+    ("optimizer", re.compile(r"^optim(_\d+)?/")),
+    ("encoder", re.compile(r"(^|/)encoder(_\d+)?/")),
+    ("decoder", re.compile(r"(^|/)decoder(_\d+)?/")),
+    ("loss", re.compile(r"(^|/)loss(_\d+)?/"))
+]
+
+_GRADIENTS_RE = re.compile(r"(^|/)gradients(_\d+)?/")
+
+def get_graph_section(node_name):
+  """Returns the graph section of an operation.
+
+  Args:
+    node_name: The operation name.
+
+  Returns:
+    The first section of :obj:`opennmt.utils.profiler.GRAPH_SECTIONS` that
+    matches :obj:`node_name`, suffixed by ``_gradients`` for operations of the
+    backward pass, or ``other``.
+  """
+  gradients = _GRADIENTS_RE.search(node_name)
+  if gradients is not None:
+    forward_name = node_name[gradients.end():]
+    for section, pattern in GRAPH_SECTIONS:
+      if pattern.search(forward_name):
+        return "{}_gradients".format(section)
+    return "other_gradients"
+  for section, pattern in GRAPH_SECTIONS:
+    if pattern.search(node_name):
+      return section
+  return "other"
+
+def allocated_memory_by_section(step_stats):
+  """Returns the memory allocated by each graph section during a traced step.
+
+  Args:
+    step_stats: The ``StepStats`` of a ``tf.RunMetadata`` collected with a
+      trace level of at least ``tf.RunOptions.SOFTWARE_TRACE``.
+
+  Returns:
+    A dictionary mapping the sections defined by
+    :meth:`opennmt.utils.profiler.get_graph_section` to allocated bytes.
+  """
+  sections = collections.defaultdict(int)
+  for dev_stats in step_stats.dev_stats:
+    for node_stats in dev_stats.node_stats:
+      allocated_bytes = _get_allocated_bytes(node_stats)
+      if allocated_bytes > 0:
+        sections[get_graph_section(node_stats.node_name)] += allocated_bytes
+  return dict(sections)
+
+def format_op_stats(op_stats, title, top_k=20):
+  """Formats the :obj:`top_k` first entries of :obj:`op_stats` as a table.
+
+  Args:
+    op_stats: A list of :class:`opennmt.utils.profiler.OpStats`.
+    title: The title of the table.
+    top_k: The maximum number of rows.
+
+  Returns:
+    The formatted table.
+  """
+  lines = [title, "{:>12} {:>8} {:>12}  {}".format("time (ms)", "calls", "memory (MB)", "name")]
+  for op in op_stats[:top_k]:
+    lines.append("{:12.3f} {:8d} {:12.3f}  {} ({})".format(
+        op.time_micros / 1000.0, op.count, op.bytes / (1024.0 * 1024.0), op.name, op.device))
+  return "\n".join(lines) + "\n"
+
+def write_step_profile(run_metadata, output_dir, step, top_k=20):
+  """Writes the Chrome trace and the most expensive operations of a traced step.
+
+  The trace ``timeline-<step>.json`` can be opened at ``chrome://tracing``.
+  The top operations by time and memory are written in ``ops-<step>.txt``.
+
+  Args:
+    run_metadata: The ``tf.RunMetadata`` collected with
+      ``tf.RunOptions.FULL_TRACE``.
+    output_dir: The directory where to write the files.
+    step: The traced step.
+    top_k: The number of operations to report.
+
+  Returns:
+    A tuple with the paths to the trace and the report.
+  """
+  if not tf.gfile.Exists(output_dir):
+    tf.gfile.MakeDirs(output_dir)
+  step_stats = run_metadata.step_stats
+
+  trace_path = os.path.join(output_dir, "timeline-{}.json".format(step))
+  trace = timeline.Timeline(step_stats).generate_chrome_trace_format(show_memory=True)
+  with tf.gfile.Open(trace_path, "w") as trace_file:
+    trace_file.write(trace)
+
+  op_stats = aggregate_step_stats(step_stats)
+  type_stats = aggregate_step_stats(step_stats, by_type=True)
+  report = "\n".join([
+      format_op_stats(op_stats, "Top operations by time:", top_k=top_k),
+      format_op_stats(type_stats, "Top operation types by time:", top_k=top_k),
+      format_op_stats(
+          sorted(op_stats, key=lambda op: op.bytes, reverse=True),
+          "Top operations by memory:",
+          top_k=top_k)])
+  report_path = os.path.join(output_dir, "ops-{}.txt".format(step))
+  with tf.gfile.Open(report_path, "w") as report_file:
+    report_file.write(report)
+  return trace_path, report_path
@@ -0,0 +1,321 @@
+"""Native implementations of translation metrics.
+
+The corpus level scores are computed from sufficient statistics that are
+collected per sentence and summed, so the collection can be distributed over
+several processes.
+"""
+
+import collections
+import io
+import math
+import re
+
+from opennmt.utils.misc import create_process_pool
+
+
+def _map_reduce(stats_fn, hypotheses, references, num_processes=1, chunk_size=1000):
+  """Sums the statistics returned by :obj:`stats_fn` over all sentence pairs.
+
+  Raises:
+    ValueError: if the number of hypotheses and references are different.
+  """
+  if len(hypotheses) != len(references):
+    raise ValueError("Expected as many hypotheses as references but got {} and {}".format(
+        len(hypotheses), len(references)))
+  pairs = list(zip(hypotheses, references))
+  if num_processes is not None and num_processes > 1 and len(pairs) > chunk_size:
+    chunks = [pairs[i:i + chunk_size] for i in range(0, len(pairs), chunk_size)]
+    pool = create_process_pool(num_processes)
+    try:
+      chunk_stats = pool.map(stats_fn, chunks)
+    finally:
+      pool.close()
+      pool.join()
+  else:
+    chunk_stats = [stats_fn(pairs)]
+  total = None
+  for stats in chunk_stats:
+    total = stats if total is None else [a + b for a, b in zip(total, stats)]
+  return total
+
+
+def _ngrams(sequence, order):
+  """Returns the counts of the n-grams of :obj:`sequence` of length :obj:`order`."""
+  return collections.Counter(zip(*[sequence[i:] for i in range(order)]))
+
+
+def tokenize_13a(line):
+  """Tokenizes a detokenized line like the ``mteval-v13a`` script, which is also
+  used by ``multi-bleu-detok.perl``.
+
+  Args:
+    line: The line to tokenize.
+
+  Returns:
+    The tokenized line.
+  """
+  line = line.replace("<skipped>", "").replace("-\n", "").replace("\n", " ")
+  if "&" in line:
+    line = line.replace("&quot;", "\"").replace("&amp;", "&")
+    line = line.replace("&lt;", "<").replace("&gt;", ">")
+  line = " {} ".format(line)
+  line = re.sub(r"([\{-\~\[-\` -\&\(-\+\:-\@\/])", r" \1 ", line)
+  line = re.sub(r"([^0-9])([\.,])", r"\1 \2 ", line)
+  line = re.sub(r"([\.,])([^0-9])", r" \1 \2", line)
+  line = re.sub(r"([0-9])(-)", r"\1 \2 ", line)
+  return " ".join(line.split())
+
+
+_BLEU_MAX_ORDER = 4
+
+def _bleu_stats(pairs):
+  # [hypothesis length, reference length, matches per order, totals per order]
+  stats = [0] * (2 + 2 * _BLEU_MAX_ORDER)
+  for hypothesis, reference in pairs:
+    hypothesis = hypothesis.split()
+    reference = reference.split()
+    stats[0] += len(hypothesis)
+    stats[1] += len(reference)
+    for order in range(1, _BLEU_MAX_ORDER + 1):
+      hypothesis_ngrams = _ngrams(hypothesis, order)
+      reference_ngrams = _ngrams(reference, order)
+      stats[1 + order] += sum((hypothesis_ngrams & reference_ngrams).values())
+      stats[1 + _BLEU_MAX_ORDER + order] += max(len(hypothesis) - order + 1, 0)
+  return stats
+
+def bleu(hypotheses, references, num_processes=1):
+  """Computes the corpus BLEU score like ``multi-bleu.perl``: case-sensitive,
+  on tokenized text, and without smoothing.
+
+  Args:
+    hypotheses: The list of tokenized hypotheses.
+    references: The list of tokenized references.
+    num_processes: The number of processes used to collect the statistics.
+
+  Returns:
+    The BLEU score between 0 and 100.
+  """
+  stats = _map_reduce(_bleu_stats, hypotheses, references, num_processes=num_processes)
+  hypothesis_length, reference_length = stats[0], stats[1]
+  matches = stats[2:2 + _BLEU_MAX_ORDER]
+  totals = stats[2 + _BLEU_MAX_ORDER:]
+  if hypothesis_length == 0 or min(matches) == 0:
+    return 0.0
+  log_precision = sum(
+      math.log(float(match) / total) for match, total in zip(matches, totals)) / _BLEU_MAX_ORDER
+  if hypothesis_length < reference_length:
+    brevity_penalty = math.exp(1 - float(reference_length) / hypothesis_length)
+  else:
+    brevity_penalty = 1.0
+  return round(100 * brevity_penalty * math.exp(log_precision), 2)
+
+
+_CHRF_MAX_ORDER = 6
+_CHRF_BETA = 2
+
+def _chrf_stats(pairs):
+  # [matches, hypothesis n-grams, reference n-grams] per order.
+  stats = [0] * (3 * _CHRF_MAX_ORDER)
+  for hypothesis, reference in pairs:
+    hypothesis = "".join(hypothesis.split())
+    reference = "".join(reference.split())
+    for order in range(1, _CHRF_MAX_ORDER + 1):
+      hypothesis_ngrams = _ngrams(hypothesis, order)
+      reference_ngrams = _ngrams(reference, order)
+      offset = 3 * (order - 1)
+      stats[offset] += sum((hypothesis_ngrams & reference_ngrams).values())
+      stats[offset + 1] += max(len(hypothesis) - order + 1, 0)
+      stats[offset + 2] += max(len(reference) - order + 1, 0)
+  return stats
+
+def chrf(hypotheses, references, num_processes=1):
+  """Computes the corpus chrF score (https://www.aclweb.org/anthology/W15-3049)
+  with character n-grams up to 6 and beta 2. Whitespaces are ignored.
+
+  Args:
+    hypotheses: The list of hypotheses.
+    references: The list of references.
+    num_processes: The number of processes used to collect the statistics.
+
+  Returns:
+    The chrF score between 0 and 100.
+  """
+  stats = _map_reduce(_chrf_stats, hypotheses, references, num_processes=num_processes)
+  precision = 0.0
+  recall = 0.0
+  for order in range(_CHRF_MAX_ORDER):
+    matches, hypothesis_count, reference_count = stats[3 * order:3 * order + 3]
+    if hypothesis_count > 0:
+      precision += float(matches) / hypothesis_count
+    if reference_count > 0:
+      recall += float(matches) / reference_count
+  precision /= _CHRF_MAX_ORDER
+  recall /= _CHRF_MAX_ORDER
+  beta2 = _CHRF_BETA ** 2
+  if precision + recall == 0:
+    return 0.0
+  score = (1 + beta2) * precision * recall / (beta2 * precision + recall)
+  return round(100 * score, 2)
+
+
+_TER_MAX_SHIFT_SIZE = 10
+_TER_MAX_SHIFT_DISTANCE = 50
+_TER_BEAM_WIDTH = 20
+
+def _edit_distance(hypothesis, reference):
+  """Returns the word edit distance and the reference position aligned to each
+  hypothesis position (or -1 for insertions)."""
+  num_rows, num_cols = len(hypothesis) + 1, len(reference) + 1
+  costs = [[0] * num_cols for _ in range(num_rows)]
+  for i in range(num_rows):
+    costs[i][0] = i
+  for j in range(num_cols):
+    costs[0][j] = j
+  for i in range(1, num_rows):
+    for j in range(1, num_cols):
+      substitution = 0 if hypothesis[i - 1] == reference[j - 1] else 1
+      costs[i][j] = min(
+          costs[i - 1][j - 1] + substitution,
+          costs[i - 1][j] + 1,
+          costs[i][j - 1] + 1)
+
+  alignment = [-1] * len(hypothesis)
+  i, j = num_rows - 1, num_cols - 1
+  while i > 0 and j > 0:
+    substitution = 0 if hypothesis[i - 1] == reference[j - 1] else 1
+    if costs[i][j] == costs[i - 1][j - 1] + substitution:
+      alignment[i - 1] = j - 1
+      i, j = i - 1, j - 1
+    elif costs[i][j] == costs[i - 1][j] + 1:
+      i -= 1
+    else:
+      j -= 1
+  return costs[-1][-1], alignment
+
+def _edit_distance_only(hypothesis, reference, max_distance=None):
+  """Returns the word edit distance, without the alignment.
+
+  Like tercom, only the alignments within a beam around the diagonal are
+  searched, so the result is an upper bound of the edit distance. If
+  :obj:`max_distance` is set, the search stops and returns
+  :obj:`max_distance` as soon as the distance can not be lower.
+  """
+  num_cols = len(reference) + 1
+  ratio = float(len(reference)) / max(len(hypothesis), 1)
+  infinity = len(hypothesis) + num_cols
+  previous = list(range(num_cols))
+  previous_high = num_cols - 1
+  for i, hypothesis_word in enumerate(hypothesis, 1):
+    center = int(round(i * ratio))
+    # The band of each row starts before the end of the previous one.
+    low = max(0, min(center - _TER_BEAM_WIDTH, previous_high))
+    high = min(num_cols - 1, max(center + _TER_BEAM_WIDTH, low))
+    current = [infinity] * num_cols
+    if low == 0:
+      current[0] = i
+    for j in range(max(low, 1), high + 1):
+      current[j] = min(
+          previous[j - 1] + (hypothesis_word != reference[j - 1]),
+          previous[j] + 1,
+          current[j - 1] + 1)
+    # The minimum cost of a row can only increase in the next rows.
+    if max_distance is not None and min(current[low:high + 1]) >= max_distance:
+      return max_distance
+    previous = current
+    previous_high = high
+  return previous[-1]
+
+def _best_shift(hypothesis, reference, distance, alignment):
+  """Returns the shifted hypothesis that most reduces the edit distance, or
+  ``None`` if no shift improves it."""
+  # Like tercom, only shift words that are not already matched to reference
+  # words that are not already matched.
+  matched_hypothesis = set()
+  matched_reference = set()
+  for i, j in enumerate(alignment):
+    if j >= 0 and hypothesis[i] == reference[j]:
+      matched_hypothesis.add(i)
+      matched_reference.add(j)
+  reference_positions = collections.defaultdict(list)
+  for j, word in enumerate(reference):
+    if j not in matched_reference:
+      reference_positions[word].append(j)
+
+  best = None
+  best_distance = distance
+  for start in range(len(hypothesis)):
+    if start in matched_hypothesis:
+      continue
+    for j in reference_positions[hypothesis[start]]:
+      # Move the span before the hypothesis word aligned with reference[j].
+      target = next(
+          (i for i, aligned in enumerate(alignment) if aligned >= j), len(hypothesis))
+      if abs(target - start) > _TER_MAX_SHIFT_DISTANCE:
+        continue
+      for size in range(1, _TER_MAX_SHIFT_SIZE + 1):
+        end = start + size
+        if end > len(hypothesis) or j + size > len(reference):
+          break
+        if hypothesis[end - 1] != reference[j + size - 1]:
+          break
+        if start <= target <= end:
+          continue
+        remaining = hypothesis[:start] + hypothesis[end:]
+        position = target - size if target > end else target
+        shifted = remaining[:position] + hypothesis[start:end] + remaining[position:]
+        # A shift costs one edit.
+        shifted_distance = _edit_distance_only(
+            shifted, reference, max_distance=best_distance - 1)
+        if shifted_distance + 1 < best_distance:
+          best = shifted
+          best_distance = shifted_distance + 1
+  return best
+
+def _ter_stats(pairs):
+  # [number of edits, reference length]
+  stats = [0, 0]
+  for hypothesis, reference in pairs:
+    hypothesis = hypothesis.split()
+    reference = reference.split()
+    num_shifts = 0
+    distance, alignment = _edit_distance(hypothesis, reference)
+    while True:
+      shifted = _best_shift(hypothesis, reference, distance, alignment)
+      if shifted is None:
+        break
+      hypothesis = shifted
+      num_shifts += 1
+      distance, alignment = _edit_distance(hypothesis, reference)
+    stats[0] += distance + num_shifts
+    stats[1] += len(reference)
+  return stats
+
+def ter(hypotheses, references, num_processes=1):
+  """Computes the corpus Translation Edit Rate
+  (http://www.cs.umd.edu/~snover/pub/amta06/ter_amta.pdf).
+
+  Like tercom, block shifts of up to 10 words are greedily applied while they
+  reduce the number of edits, each shift counting as one edit. The candidate
+  shifts are scored with an edit distance restricted to a beam of 20 words
+  around the diagonal, and their scoring stops as soon as they can not
+  improve the best shift.
+
+  Args:
+    hypotheses: The list of tokenized hypotheses.
+    references: The list of tokenized references.
+    num_processes: The number of processes used to collect the statistics.
+
+  Returns:
+    The TER score in percent (lower is better).
+  """
+  stats = _map_reduce(_ter_stats, hypotheses, references, num_processes=num_processes)
+  num_edits, reference_length = stats
+  if reference_length == 0:
+    return 0.0 if num_edits == 0 else 100.0
+  return round(100 * float(num_edits) / reference_length, 2)
+
+
+def read_lines(path):
+  """Reads the lines of a UTF-8 file without the line breaks."""
+  with io.open(path, encoding="utf-8") as text_file:
+    return [line.rstrip("\n") for line in text_file]
@@ -0,0 +1,273 @@
+"""Local translation server with dynamic batching."""
+
+import json
+import threading
+import time
+
+from six.moves import BaseHTTPServer
+from six.moves import queue
+from six.moves import socketserver
+
+import tensorflow as tf
+
+
+class _PendingRequest(object):
+  """A sentence waiting to be batched."""
+
+  def __init__(self, text, length, arrival):
+    self.text = text
+    self.length = length
+    self.arrival = arrival
+    self.result = None
+    self.error = None
+    self.done = threading.Event()
+
+
+class DynamicBatcher(object):
+  """Coalesces concurrent translation requests into batches.
+
+  Pending sentences are grouped by length buckets. A bucket is sent for
+  translation as soon as it contains :obj:`max_batch_size` sentences or when
+  its oldest sentence has been waiting for :obj:`max_latency` seconds.
+  """
+
+  def __init__(self,
+               translate_fn,
+               max_batch_size=32,
+               max_latency=0.01,
+               bucket_width=10,
+               length_fn=None,
+               clock=None):
+    """Initializes the batcher and starts the batching thread.
+
+    Args:
+      translate_fn: A callable mapping a list of sentences to the list of their
+        translations.
+      max_batch_size: The maximum number of sentences in a batch.
+      max_latency: The maximum time in seconds a sentence waits for other
+        sentences before being translated.
+      bucket_width: The width of the length buckets. Only sentences from the
+        same bucket are batched together. ``None`` to disable bucketing.
+      length_fn: A callable returning the length of a sentence (default: the
+        number of space separated tokens).
+      clock: A callable returning the current time in seconds (default:
+        ``time.time``).
+    """
+    self._translate_fn = translate_fn
+    self._max_batch_size = max_batch_size
+    self._max_latency = max_latency
+    self._bucket_width = bucket_width
+    self._length_fn = length_fn or (lambda text: len(text.split()))
+    self._clock = clock or time.time
+    self._buckets = {}
+    self._condition = threading.Condition()
+    self._stopped = False
+    self._thread = threading.Thread(target=self._run)
+    self._thread.daemon = True
+    self._thread.start()
+
+  def stop(self):
+    """Stops the batching thread once all pending sentences are translated."""
+    with self._condition:
+      self._stopped = True
+      self._condition.notify()
+    self._thread.join()
+
+  def translate(self, texts):
+    """Translates sentences, possibly batched with other concurrent requests.
+
+    This call blocks until all sentences are translated.
+
+    Args:
+      texts: A list of Python strings.
+
+    Returns:
+      The list of translations.
+
+    Raises:
+      RuntimeError: if the batcher is stopped.
+    """
+    arrival = self._clock()
+    requests = [_PendingRequest(text, self._length_fn(text), arrival) for text in texts]
+    with self._condition:
+      if self._stopped:
+        raise RuntimeError("The batcher is stopped")
+      for request in requests:
+        self._buckets.setdefault(self._bucket_id(request.length), []).append(request)
+      self._condition.notify()
+    for request in requests:
+      request.done.wait()
+      if request.error is not None:
+        raise request.error
+    return [request.result for request in requests]
+
+  def _bucket_id(self, length):
+    if self._bucket_width is None:
+      return 0
+    return length // self._bucket_width
+
+  def _next_batch(self):
+    """Returns the next batch to translate or ``None`` if nothing is ready.
+
+    Must be called with the condition lock held.
+    """
+    ready_key = None
+    oldest_key = None
+    oldest_arrival = None
+    for key, requests in self._buckets.items():
+      if len(requests) >= self._max_batch_size:
+        ready_key = key
+        break
+      if oldest_arrival is None or requests[0].arrival < oldest_arrival:
+        oldest_key = key
+        oldest_arrival = requests[0].arrival
+    if ready_key is None and oldest_key is not None:
+      if self._stopped or self._clock() - oldest_arrival >= self._max_latency:
+        ready_key = oldest_key
+    if ready_key is None:
+      return None
+    requests = self._buckets[ready_key]
+    batch = requests[:self._max_batch_size]
+    if len(requests) > self._max_batch_size:
+      self._buckets[ready_key] = requests[self._max_batch_size:]
+    else:
+      del self._buckets[ready_key]
+    return batch
+
+  def _wait_time(self):
+    """Returns the time to wait before the next deadline or ``None``."""
+    if not self._buckets:
+      return None
+    oldest_arrival = min(requests[0].arrival for requests in self._buckets.values())
+    return max(oldest_arrival + self._max_latency - self._clock(), 0)
+
+  def _run(self):
+    while True:
+      with self._condition:
+        batch = self._next_batch()
+        while batch is None:
+          if self._stopped and not self._buckets:
+            return
+          self._condition.wait(self._wait_time())
+          batch = self._next_batch()
+      try:
+        results = self._translate_fn([request.text for request in batch])
+        for request, result in zip(batch, results):
+          request.result = result
+      except Exception as e:  # pylint: disable=broad-except
+        tf.logging.error("Translation failed: %s", str(e))
+        for request in batch:
+          request.error = e
+      for request in batch:
+        request.done.set()
+
+
+class _ThreadedHTTPServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+  daemon_threads = True
+
+
+def _make_request_handler(batcher):
+  """Returns a HTTP request handler class that translates with :obj:`batcher`."""
+
+  class _RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Handles ``POST /translate`` requests.
+
+    The request body is a JSON object ``{"src": [sentences...]}`` and the
+    response is ``{"tgt": [translations...]}``.
+    """
+
+    def _send_json(self, code, body):
+      data = json.dumps(body).encode("utf-8")
+      self.send_response(code)
+      self.send_header("Content-Type", "application/json")
+      self.send_header("Content-Length", str(len(data)))
+      self.end_headers()
+      self.wfile.write(data)
+
+    def do_POST(self):  # pylint: disable=invalid-name
+      if self.path.rstrip("/") != "/translate":
+        self._send_json(404, {"error": "unknown path {}".format(self.path)})
+        return
+      try:
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length).decode("utf-8"))
+        texts = body["src"]
+        if not isinstance(texts, list):
+          texts = [texts]
+      except (ValueError, KeyError, TypeError) as e:
+        self._send_json(400, {"error": "invalid request: {}".format(str(e))})
+        return
+      try:
+        translations = batcher.translate(texts)
+      except Exception as e:  # pylint: disable=broad-except
+        self._send_json(500, {"error": str(e)})
+        return
+      self._send_json(200, {"tgt": translations})
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+      tf.logging.debug(format, *args)
+
+  return _RequestHandler
+
+
+def make_server(batcher, host="localhost", port=5000):
+  """Creates a multithreaded HTTP translation server.
+
+  Args:
+    batcher: The :class:`opennmt.utils.serving.DynamicBatcher` to translate
+      with.
+    host: The host to bind.
+    port: The port to bind (0 to select a free port).
+
+  Returns:
+    A ``HTTPServer`` instance. Call ``serve_forever()`` to start serving.
+  """
+  return _ThreadedHTTPServer((host, port), _make_request_handler(batcher))
+
+
+def _read_lines(input_stream, lines):
+  """Pushes each line of :obj:`input_stream` in the :obj:`lines` queue."""
+  for line in iter(input_stream.readline, ""):
+    lines.put(line.rstrip("\r\n"))
+  lines.put(None)
+
+def stream_batches(input_stream, batch_size, max_latency=0.1):
+  """Generates batches of lines as they arrive on a stream.
+
+  A batch is emitted when it contains :obj:`batch_size` lines or when
+  :obj:`max_latency` seconds elapsed since its first line was read, so that
+  lines arriving slowly are not delayed by a partially filled batch.
+
+  Args:
+    input_stream: The text stream to read from (e.g. ``sys.stdin``).
+    batch_size: The maximum number of lines in a batch.
+    max_latency: The maximum time in seconds to wait for a batch to fill.
+
+  Returns:
+    A generator over lists of lines, without the end of line characters.
+  """
+  lines = queue.Queue()
+  reader = threading.Thread(target=_read_lines, args=(input_stream, lines))
+  reader.daemon = True
+  reader.start()
+
+  finished = False
+  while not finished:
+    line = lines.get()
+    if line is None:
+      break
+    batch = [line]
+    deadline = time.time() + max_latency
+    while len(batch) < batch_size:
+      timeout = deadline - time.time()
+      if timeout <= 0:
+        break
+      try:
+        line = lines.get(timeout=timeout)
+      except queue.Empty:
+        break
+      if line is None:
+        finished = True
+        break
+      batch.append(line)
+    yield batch
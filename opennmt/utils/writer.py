@@ -0,0 +1,177 @@
+"""Asynchronous predictions writing."""
+
+import threading
+
+import six
+
+from six.moves import queue
+
+import tensorflow as tf
+
+from opennmt.utils.misc import create_process_pool
+
+
+class _StringBuffer(six.StringIO):
+  """A string buffer exposing the encoding of the stream it stands for."""
+
+  def __init__(self, encoding=None):
+    six.StringIO.__init__(self)
+    self._encoding = encoding
+
+  @property
+  def encoding(self):
+    return self._encoding
+
+
+def format_predictions(model, predictions, params=None, encoding=None):
+  """Formats a batch of predictions as they would be printed by the model.
+
+  Args:
+    model: The :class:`opennmt.models.model.Model` that generated the
+      predictions.
+    predictions: A list of predictions.
+    params: (optional) Dictionary of formatting parameters.
+    encoding: The encoding of the stream the text will be written to.
+
+  Returns:
+    The formatted text.
+  """
+  buffer = _StringBuffer(encoding=encoding)
+  model.print_predictions(predictions, params=params, stream=buffer)
+  return buffer.getvalue()
+
+
+_worker_args = None
+
+def _init_worker(model, params, encoding):
+  global _worker_args  # pylint: disable=global-statement
+  _worker_args = (model, params, encoding)
+
+def _format_in_worker(predictions):
+  model, params, encoding = _worker_args
+  return format_predictions(model, predictions, params=params, encoding=encoding)
+
+
+class PredictionWriter(object):
+  """Writes predictions from a background thread.
+
+  Predictions are grouped in chunks that are formatted (e.g. detokenized) and
+  written by a writer thread, so that the decoding loop does not wait for the
+  output formatting. A bounded queue applies back-pressure when the writer
+  falls behind. Formatting can optionally be distributed over a pool of
+  processes for expensive detokenizers.
+  """
+
+  def __init__(self,
+               model,
+               stream,
+               params=None,
+               chunk_size=32,
+               queue_size=16,
+               num_processes=0):
+    """Initializes the writer and starts the writer thread.
+
+    Args:
+      model: The :class:`opennmt.models.model.Model` that generates the
+        predictions.
+      stream: The stream to write to.
+      params: (optional) Dictionary of formatting parameters.
+      chunk_size: The number of predictions formatted and written together.
+      queue_size: The maximum number of chunks waiting to be written.
+      num_processes: If greater than 0, the number of processes used for
+        formatting the chunks. The model must be picklable and each process
+        detokenizes its chunk sequentially.
+    """
+    self._model = model
+    self._stream = stream
+    self._params = params
+    self._encoding = getattr(stream, "encoding", None)
+    self._chunk_size = max(chunk_size, 1)
+    self._chunk = []
+    self._queue = queue.Queue(maxsize=queue_size)
+    self._error = None
+    self._pool = None
+    if num_processes > 0:
+      # Pool workers can not start the detokenization processes of the tokenizer.
+      worker_params = dict(params or {})
+      worker_params["detokenization_processes"] = 1
+      self._pool = create_process_pool(
+          num_processes,
+          initializer=_init_worker,
+          initargs=(model, worker_params, self._encoding))
+    self._thread = threading.Thread(target=self._run)
+    self._thread.daemon = True
+    self._thread.start()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    if exc_type is None:
+      self.close()
+      return
+    # Do not replace the exception raised in the with block.
+    try:
+      self.close()
+    except Exception as e:  # pylint: disable=broad-except
+      tf.logging.error("Failed to close the prediction writer: %s", str(e))
+
+  def write(self, prediction):
+    """Schedules the writing of a prediction.
+
+    Args:
+      prediction: The prediction to write.
+
+    Raises:
+      RuntimeError: if the writer thread failed.
+    """
+    self._check_error()
+    self._chunk.append(prediction)
+    if len(self._chunk) >= self._chunk_size:
+      self._flush_chunk()
+
+  def close(self):
+    """Writes the remaining predictions and stops the writer thread.
+
+    Raises:
+      RuntimeError: if the writer thread failed.
+    """
+    self._flush_chunk()
+    self._queue.put(None)
+    self._thread.join()
+    if self._pool is not None:
+      self._pool.close()
+      self._pool.join()
+    self._check_error()
+
+  def _check_error(self):
+    if self._error is not None:
+      raise RuntimeError("Failed to write predictions: {}".format(str(self._error)))
+
+  def _flush_chunk(self):
+    if not self._chunk:
+      return
+    if self._pool is not None:
+      item = self._pool.apply_async(_format_in_worker, (self._chunk,))
+    else:
+      item = self._chunk
+    self._chunk = []
+    self._queue.put(item)
+
+  def _run(self):
+    while True:
+      item = self._queue.get()
+      if item is None:
+        break
+      if self._error is not None:
+        continue  # Drain the queue to not block the producer.
+      try:
+        if self._pool is not None:
+          text = item.get()
+        else:
+          text = format_predictions(
+              self._model, item, params=self._params, encoding=self._encoding)
+        self._stream.write(text)
+        self._stream.flush()
+      except Exception as e:  # pylint: disable=broad-except
+        self._error = e
@@ -54,6 +54,7 @@ setup(
             "onmt-detokenize-text=opennmt.bin.detokenize_text:main",
             "onmt-main=opennmt.bin.main:main",
             "onmt-merge-config=opennmt.bin.merge_config:main",
+            "onmt-serve=opennmt.bin.serve:main",
             "onmt-tokenize-text=opennmt.bin.tokenize_text:main",
         ],
     }